@@ -6,31 +6,50 @@ from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.core.security import verify_password, create_access_token, verify_token
+from app.core.rate_limit import charge_user
+from app.core.revocation import revocations
+from app.core.warming import cache_warmer
 from app.db.database import get_db
 from app.db.models import User
-from app.schemas.users import Token, TokenPayload, UserLogin
+from app.schemas.users import RevokeRequest, Token, TokenPayload, UserLogin
+from shared.tracing import span
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 bearer_scheme = HTTPBearer()
 
-async def get_current_user(
+def get_current_user(
     db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
 ) -> User:
     """
     Validate token and return current user
     """
-    try:
-        payload = verify_token(token)  # Use verify_token instead of direct decode
-        token_data = TokenPayload(**payload)
-    except (jwt.ExpiredSignatureError, jwt.JWTError) as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=str(e),
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    user = db.query(User).filter(User.id == token_data.sub).first()
+    return authenticate(db, token)
+
+def authenticate(db: Session, token: str) -> User:
+    """
+    Resolve a bearer token to an active user, outside of dependency injection
+    """
+    with span("auth"):
+        try:
+            payload = verify_token(token)  # Use verify_token instead of direct decode
+            token_data = TokenPayload(**payload)
+        except (jwt.ExpiredSignatureError, jwt.JWTError) as e:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=str(e),
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        # In-memory check, no I/O: see app.core.revocation
+        if revocations.is_revoked(payload):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        user = db.query(User).filter(User.id == token_data.sub).first()
     if not user or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -38,6 +57,21 @@ async def get_current_user(
         )
     return user
 
+def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+    return current_user
+
+async def enforce_rate_limit(current_user: User = Depends(get_current_user)) -> User:
+    """
+    Apply the per-user token bucket to a route
+    """
+    await charge_user(current_user.id)
+    return current_user
+
 @router.post("/login", response_model=Token)
 async def login(
     db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()
@@ -60,12 +94,55 @@ async def login(
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(user.id, expires_delta=access_token_expires)
+
+    # The first screen after login is served from warm caches; never awaited
+    cache_warmer.schedule(user)
     
     return {
         "access_token": access_token,
         "token_type": "bearer",
     }
 
+@router.post("/logout")
+async def logout(
+    token: str = Depends(oauth2_scheme),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Revoke the access token used for this request
+    """
+    payload = verify_token(token)
+    if not payload.get("jti"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Token has no jti and cannot be revoked; it expires on its own",
+        )
+    await revocations.revoke_token(
+        payload["jti"], str(current_user.id), datetime.utcfromtimestamp(payload["exp"])
+    )
+    return {"message": "Logged out"}
+
+@router.post("/revoke")
+async def revoke(
+    revoke_in: RevokeRequest,
+    current_user: User = Depends(require_admin),
+) -> Any:
+    """
+    Revoke a single token by jti, or every token issued to a user so far (admin only)
+    """
+    if bool(revoke_in.jti) == bool(revoke_in.user_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give exactly one of jti or user_id",
+        )
+    if revoke_in.jti:
+        # The token's expiry is unknown here, so keep the entry for a full token lifetime
+        expires_at = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        await revocations.revoke_token(revoke_in.jti, None, expires_at)
+        return {"message": f"Token {revoke_in.jti} revoked"}
+    await revocations.revoke_user(str(revoke_in.user_id))
+    return {"message": f"All tokens of user {revoke_in.user_id} revoked"}
+
 @router.get("/token-status")
 async def check_token_status(token: str = Depends(oauth2_scheme)):
     """
@@ -0,0 +1,242 @@
+import asyncio
+import re
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from app.api import routes
+from app.api.auth import get_current_user
+from app.core.coalescing import coalesced
+from app.core.config import settings
+from app.core.rate_limit import charge_user
+from app.core.response_cache import response_cache
+from app.core.service_registry import forward_request, result_content, upstream_accept
+from app.db.models import User
+from app.schemas.batch import BatchRequest, BatchSubRequest, BatchSubResponse
+from app.schemas.users import User as UserSchema
+from shared.log import get_logger
+from shared.schemas.tasks import TaskWithRecurringCreate, TaskWithRecurringUpdate
+
+router = APIRouter()
+
+logger = get_logger("api_gateway.batch")
+
+LIST_TASK_PARAMS = {
+    "status", "priority", "search", "tags",
+    "deadline_before", "deadline_after", "sort_by", "sort_order", "limit",
+}
+
+# "{<sub-request id>.<field>.<index>...}" placeholders resolved from dependency results
+PLACEHOLDER = re.compile(r"\{([A-Za-z0-9_-]+)((?:\.[A-Za-z0-9_-]+)*)\}")
+
+async def _users_me(user: User, sub: BatchSubRequest, match: re.Match):
+    return 200, jsonable_encoder(UserSchema.from_orm(user))
+
+async def _list_tasks(user: User, sub: BatchSubRequest, match: re.Match):
+    params = {k: v for k, v in (sub.params or {}).items() if k in LIST_TASK_PARAMS}
+    result = await routes.fetch_task_list(user, params)
+    return result["status_code"], result_content(result)
+
+async def _get_task(user: User, sub: BatchSubRequest, match: re.Match):
+    path = f"/tasks/get-task/{match['task_id']}"
+    accept = upstream_accept()
+    result = await response_cache.fetch(
+        user.id, path, None, accept,
+        lambda: coalesced(
+            user.id, "GET", path, None,
+            lambda: forward_request(
+                service_url=settings.TASK_SERVICE_URL,
+                path=path,
+                method="GET",
+                headers={"X-User-ID": str(user.id)},
+                decode=False,
+                accept=accept,
+            )
+        )
+    )
+    return result["status_code"], result_content(result)
+
+async def _write_task(user: User, method: str, path: str, event_type: str, task_id: str = None,
+                      task_data: Any = None):
+    """Forward a task write; only one the task service accepted is announced"""
+    result = await forward_request(
+        service_url=settings.TASK_SERVICE_URL,
+        path=path,
+        method=method,
+        headers={"X-User-ID": str(user.id)},
+        json_data=task_data.dict(exclude_none=True) if task_data is not None else None,
+    )
+    content = result_content(result)
+    if result["status_code"] < 400:
+        task = content if task_data is not None else None
+        await routes.task_changed(user.id, event_type, task_id or content["id"], task)
+    return result["status_code"], content
+
+async def _create_task(user: User, sub: BatchSubRequest, match: re.Match):
+    task_data = TaskWithRecurringCreate(**(sub.body or {}))
+    return await _write_task(user, "POST", "/tasks/create-task", "task.created", task_data=task_data)
+
+async def _update_task(user: User, sub: BatchSubRequest, match: re.Match):
+    task_data = TaskWithRecurringUpdate(**(sub.body or {}))
+    return await _write_task(user, "PUT", f"/tasks/update-task/{match['task_id']}", "task.updated",
+                             match["task_id"], task_data)
+
+async def _delete_task(user: User, sub: BatchSubRequest, match: re.Match):
+    return await _write_task(user, "DELETE", f"/tasks/delete-task/{match['task_id']}", "task.deleted",
+                             match["task_id"])
+
+# Routes that may be used inside a batch, matched against the path relative to /api/v1
+BATCH_ROUTES = [
+    ("GET", re.compile(r"^/users/me$"), _users_me),
+    ("GET", re.compile(r"^/tasks/list$"), _list_tasks),
+    ("POST", re.compile(r"^/tasks/create$"), _create_task),
+    ("GET", re.compile(r"^/tasks/(?P<task_id>[^/]+)$"), _get_task),
+    ("PUT", re.compile(r"^/tasks/(?P<task_id>[^/]+)/update-task$"), _update_task),
+    ("DELETE", re.compile(r"^/tasks/(?P<task_id>[^/]+)/delete-task$"), _delete_task),
+]
+
+def _lookup(value: Any, fields: List[str]) -> Any:
+    for field in fields:
+        if isinstance(value, list):
+            value = value[int(field)]
+        else:
+            value = value[field]
+    return value
+
+def _substitute(value: Any, results: Dict[str, BatchSubResponse]) -> Any:
+    """
+    Replace placeholders in strings (recursively) with values from
+    dependency results; a string that is one placeholder becomes the value.
+    """
+    if isinstance(value, str):
+        whole = PLACEHOLDER.fullmatch(value)
+        if whole and whole.group(1) in results:
+            # The value itself, keeping its type, when the placeholder is the whole string
+            return _lookup(results[whole.group(1)].body, [f for f in whole.group(2).split(".") if f])
+
+        def replace(m: re.Match) -> str:
+            ref, fields = m.group(1), [f for f in m.group(2).split(".") if f]
+            if ref not in results:
+                return m.group(0)
+            return str(_lookup(results[ref].body, fields))
+        return PLACEHOLDER.sub(replace, value)
+    if isinstance(value, dict):
+        return {k: _substitute(v, results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_substitute(v, results) for v in value]
+    return value
+
+async def _dispatch(user: User, sub: BatchSubRequest) -> BatchSubResponse:
+    path = sub.path
+    if path.startswith(settings.API_V1_STR):
+        path = path[len(settings.API_V1_STR):]
+    path = path.split("?", 1)[0].rstrip("/") or "/"
+
+    for method, pattern, handler in BATCH_ROUTES:
+        match = pattern.match(path)
+        if match and method == sub.method:
+            try:
+                status_code, body = await handler(user, sub, match)
+            except HTTPException as e:
+                status_code, body = e.status_code, {"detail": e.detail}
+            except ValidationError as e:
+                status_code, body = status.HTTP_422_UNPROCESSABLE_ENTITY, {"detail": e.errors()}
+            except Exception as e:
+                logger.error("Error in batch sub-request %s: %s", sub.id, e)
+                status_code, body = status.HTTP_500_INTERNAL_SERVER_ERROR, {"detail": str(e)}
+            return BatchSubResponse(id=sub.id, status_code=status_code, body=jsonable_encoder(body))
+
+    return BatchSubResponse(
+        id=sub.id,
+        status_code=status.HTTP_404_NOT_FOUND,
+        body={"detail": f"{sub.method} {sub.path} is not available in a batch"},
+    )
+
+@router.post("/batch", response_model=List[BatchSubResponse], tags=["batch"])
+async def batch(
+    batch_in: BatchRequest,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Run several API calls in one round-trip.
+
+    The caller is authenticated once for the whole batch. Sub-requests run
+    concurrently unless they list earlier sub-requests in depends_on, in which
+    case they start after those finish and may reference their results with
+    "{id.field}" placeholders in path, params or body.
+    """
+    subs = batch_in.requests
+    if len(subs) > settings.BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can contain at most {settings.BATCH_MAX_REQUESTS} requests",
+        )
+
+    # Dependencies may only point backwards, which rules out cycles
+    seen = set()
+    for sub in subs:
+        if sub.id in seen:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Duplicate sub-request id '{sub.id}'",
+            )
+        missing = [dep for dep in sub.depends_on if dep not in seen]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Sub-request '{sub.id}' depends on unknown or later requests: {missing}",
+            )
+        seen.add(sub.id)
+
+    # Every sub-request costs a token, as it would as a separate call; a rejected batch costs none
+    await charge_user(current_user.id, cost=len(subs))
+
+    results: Dict[str, BatchSubResponse] = {}
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(sub: BatchSubRequest) -> BatchSubResponse:
+        if sub.depends_on:
+            await asyncio.gather(*(tasks[dep] for dep in sub.depends_on))
+            failed = [dep for dep in sub.depends_on if results[dep].status_code >= 400]
+            if failed:
+                response = BatchSubResponse(
+                    id=sub.id,
+                    status_code=status.HTTP_424_FAILED_DEPENDENCY,
+                    body={"detail": f"Dependencies failed: {failed}"},
+                )
+                results[sub.id] = response
+                return response
+            try:
+                sub = sub.copy(update={
+                    "path": str(_substitute(sub.path, results)),
+                    "params": _substitute(sub.params, results),
+                    "body": _substitute(sub.body, results),
+                })
+            except (KeyError, IndexError, ValueError, TypeError) as e:
+                response = BatchSubResponse(
+                    id=sub.id,
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    body={"detail": f"Could not resolve placeholder: {e}"},
+                )
+                results[sub.id] = response
+                return response
+        response = await _dispatch(current_user, sub)
+        results[sub.id] = response
+        return response
+
+    for sub in subs:
+        tasks[sub.id] = asyncio.create_task(run(sub))
+
+    # Whatever has not finished within the batch budget is cancelled and reported as 504
+    _, pending = await asyncio.wait(tasks.values(), timeout=settings.BATCH_TIMEOUT_SECONDS)
+    for task in pending:
+        task.cancel()
+
+    return [
+        results.get(sub.id) or BatchSubResponse(
+            id=sub.id,
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            body={"detail": "Batch time budget exceeded"},
+        )
+        for sub in subs
+    ]
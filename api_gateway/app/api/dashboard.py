@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict
+from fastapi import APIRouter, Depends
+from app.api import routes
+from app.api.auth import enforce_rate_limit
+from app.core.coalescing import coalesced
+from app.core.config import settings
+from app.core.service_registry import forward_request, result_content
+from app.core.ttl_cache import TTLCache
+from app.db.models import User
+from app.schemas.dashboard import Dashboard
+from app.schemas.users import User as UserSchema
+from shared.log import get_logger
+
+router = APIRouter()
+
+logger = get_logger("api_gateway.dashboard")
+
+OPEN_STATUSES = "pending,in_progress"
+
+# Each section is cached on its own, keyed by (user id, section name)
+section_cache = TTLCache(ttl=settings.DASHBOARD_CACHE_TTL)
+
+class SectionError(Exception):
+    pass
+
+def _content(result: dict) -> Any:
+    content = result_content(result)
+    if result["status_code"] >= 400:
+        detail = content.get("detail") if isinstance(content, dict) else None
+        raise SectionError(f"task service returned {result['status_code']}: {detail}")
+    return content
+
+async def _upcoming(user: User, now: str) -> Any:
+    params = {
+        "status": OPEN_STATUSES,
+        "deadline_after": now,
+        "sort_by": "deadline",
+        "sort_order": "asc",
+        "limit": settings.DASHBOARD_UPCOMING_LIMIT,
+    }
+    return _content(await routes.fetch_task_list(user, params))
+
+async def _in_progress(user: User, now: str) -> Any:
+    params = {
+        "status": "in_progress",
+        "sort_by": "updated_at",
+        "sort_order": "desc",
+        "limit": settings.DASHBOARD_IN_PROGRESS_LIMIT,
+    }
+    return _content(await routes.fetch_task_list(user, params))
+
+async def _overdue_count(user: User, now: str) -> Any:
+    params = {"status": OPEN_STATUSES, "deadline_before": now}
+    result = await coalesced(
+        user.id, "GET", "/tasks/count-tasks", params,
+        lambda: forward_request(
+            service_url=settings.TASK_SERVICE_URL,
+            path="/tasks/count-tasks",
+            method="GET",
+            headers={"X-User-ID": str(user.id)},
+            params=params,
+        )
+    )
+    return _content(result)["count"]
+
+SECTIONS: Dict[str, Callable[[User, str], Awaitable[Any]]] = {
+    "upcoming": _upcoming,
+    "overdue_count": _overdue_count,
+    "in_progress": _in_progress,
+}
+
+async def _load_section(user: User, name: str, now: str) -> Any:
+    key = (str(user.id), name)
+    value = section_cache.get(key)
+    if value is None:
+        value = await asyncio.wait_for(SECTIONS[name](user, now), settings.DASHBOARD_SECTION_TIMEOUT)
+        section_cache.set(key, value)
+    return value
+
+@router.get("/dashboard", response_model=Dashboard, tags=["dashboard"])
+async def dashboard(current_user: User = Depends(enforce_rate_limit)) -> Any:
+    """
+    Everything the home screen needs in one call.
+
+    The profile comes from the gateway database (already loaded during
+    authentication); the task sections are fetched from the task service
+    concurrently, so the latency is that of the slowest section rather than
+    their sum. A section that fails or times out is left empty and reported
+    in "errors" while the others are still returned.
+    """
+    # Second resolution keeps the upstream queries identical (and coalescable) within a second
+    now = datetime.utcnow().replace(microsecond=0).isoformat()
+    names = list(SECTIONS)
+    results = await asyncio.gather(
+        *(_load_section(current_user, name, now) for name in names),
+        return_exceptions=True,
+    )
+
+    response: Dict[str, Any] = {"profile": UserSchema.from_orm(current_user), "errors": {}}
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            if isinstance(result, asyncio.TimeoutError):
+                reason = "timed out"
+            else:
+                reason = str(getattr(result, "detail", None) or result) or type(result).__name__
+            logger.warning("Dashboard section %s failed for user %s: %s", name, current_user.id, reason)
+            response["errors"][name] = reason
+        else:
+            response[name] = result
+    return response
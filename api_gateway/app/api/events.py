@@ -0,0 +1,130 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, WebSocket, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.api.auth import authenticate
+from app.core.rate_limit import charge_user
+from app.db.database import SessionLocal
+from app.db.models import User
+from shared.events import HEARTBEAT, RESET, task_events
+from shared.log import get_logger
+
+router = APIRouter()
+
+logger = get_logger("api_gateway.events")
+
+SSE_PREAMBLE = b"retry: 3000\n: connected\n\n"
+SSE_HEARTBEAT = b": heartbeat\n\n"
+SSE_RESET = b"event: reset\ndata: {}\n\n"
+WS_HEARTBEAT = '{"type":"heartbeat"}'
+WS_RESET = '{"type":"reset"}'
+
+def _stream_user(authorization: Optional[str], access_token: Optional[str]) -> User:
+    """
+    Authenticate a long-lived stream.
+
+    EventSource and browser WebSockets cannot set headers, so the token may
+    also come as ?access_token=. A session is opened only for the lookup:
+    holding one (and a pooled connection) for the life of every stream would
+    exhaust the pool long before 10k connections.
+    """
+    token = access_token
+    if authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    db = SessionLocal()
+    try:
+        return authenticate(db, token)
+    finally:
+        db.close()
+
+@router.get("/stream", tags=["tasks"])
+async def stream_tasks(
+    request: Request,
+    access_token: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+):
+    """
+    Server-Sent Events feed of the user's task changes.
+
+    Events are task.created, task.updated and task.deleted, each with an id;
+    reconnecting with Last-Event-ID (or ?last_event_id=) replays what was
+    missed. A "reset" event means events were lost and the client should
+    refetch its task list. Comment lines are sent as heartbeats.
+    """
+    user = await run_in_threadpool(_stream_user, request.headers.get("authorization"), access_token)
+    await charge_user(user.id)
+    user_id = str(user.id)
+    last_event_id = request.headers.get("last-event-id") or last_event_id
+
+    async def events():
+        subscription = task_events.hub.subscribe(user_id, last_event_id)
+        try:
+            yield SSE_PREAMBLE
+            while True:
+                item = await subscription.next()
+                if item is HEARTBEAT:
+                    yield SSE_HEARTBEAT
+                elif item is RESET:
+                    yield SSE_RESET
+                else:
+                    yield item.sse
+        finally:
+            task_events.hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _send_events(websocket: WebSocket, subscription) -> None:
+    try:
+        while True:
+            item = await subscription.next()
+            if item is HEARTBEAT:
+                await websocket.send_text(WS_HEARTBEAT)
+            elif item is RESET:
+                await websocket.send_text(WS_RESET)
+            else:
+                await websocket.send_text(item.data)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.debug("Task event WebSocket send failed: %s", e)
+
+@router.websocket("/ws")
+async def tasks_websocket(
+    websocket: WebSocket,
+    access_token: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+):
+    """
+    WebSocket equivalent of /tasks/stream: one JSON message per event
+    """
+    try:
+        user = await run_in_threadpool(_stream_user, websocket.headers.get("authorization"), access_token)
+        await charge_user(user.id)
+    except HTTPException as e:
+        code = 1013 if e.status_code == status.HTTP_429_TOO_MANY_REQUESTS else 1008
+        await websocket.close(code=code)
+        return
+
+    await websocket.accept()
+    subscription = task_events.hub.subscribe(str(user.id), last_event_id)
+    sender = asyncio.create_task(_send_events(websocket, subscription))
+    try:
+        # Nothing is expected from the client; this just notices the disconnect
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    finally:
+        sender.cancel()
+        task_events.hub.unsubscribe(subscription)
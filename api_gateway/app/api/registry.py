@@ -0,0 +1,31 @@
+from typing import Any
+from fastapi import APIRouter, Depends, HTTPException, status
+from app.api.auth import require_admin
+from app.core.service_registry import registry
+from app.db.models import User
+
+router = APIRouter()
+
+@router.get("/")
+def list_instances(current_user: User = Depends(require_admin)) -> Any:
+    """
+    List upstream instances with their load and health state
+    """
+    return registry.snapshot()
+
+@router.post("/{service}/drain")
+def drain_instance(
+    service: str,
+    url: str,
+    current_user: User = Depends(require_admin),
+) -> Any:
+    """
+    Stop routing new requests to an instance; it is removed once idle
+    """
+    instance = registry.drain(service, url)
+    if instance is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Instance not found",
+        )
+    return instance.snapshot()
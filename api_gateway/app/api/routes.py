@@ -1,9 +1,15 @@
 from fastapi import APIRouter, Depends, Request, Response, HTTPException, status, Body
-from fastapi.responses import JSONResponse
-from app.api import users, auth
+from app.api import users, auth, registry, stats, events
 from app.core.config import settings
-from app.core.service_registry import forward_request
-from app.api.auth import get_current_user
+from app.core.service_registry import forward_request, result_content, upstream_accept
+from shared.compression import accepts, decompress
+from shared.deadline import DEADLINE_HEADER
+from shared.tracing import TRACE_HEADER, span
+from shared.wire import JSON_MEDIA_TYPE, accepts_msgpack, dumps_json, is_msgpack, unpackb
+from app.core.coalescing import coalesced
+from app.core.response_cache import response_cache
+from shared.events import task_events
+from app.api.auth import enforce_rate_limit
 from app.db.models import User
 # Import Task Service schemas to reuse them
 from shared.schemas.tasks import (
@@ -11,11 +17,16 @@ from shared.schemas.tasks import (
     TaskResponse
 )
 from typing import Dict, Any, Optional, List
-from datetime import datetime, date, time
-import json
+from shared.log import get_logger
 
 router = APIRouter(prefix=settings.API_V1_STR)  # This prefixes all routes with /api/v1
 
+logger = get_logger("api_gateway.routes")
+
+# Set by the gateway for the task service; a client's own copies are not passed on
+HOP_HEADERS = {"x-user-id", TRACE_HEADER.lower(), DEADLINE_HEADER.lower()}
+
+
 # Include authentication routes
 router.include_router(
     auth.router,
@@ -30,30 +41,54 @@ router.include_router(
     tags=["users"],
 )
 
-def parse_datetime(dt_str: str) -> datetime:
-    """Parse datetime string with optional timezone"""
-    if dt_str.endswith('Z'):
-        dt_str = dt_str[:-1]  # Remove 'Z' suffix
-    return datetime.fromisoformat(dt_str)
+# Include service registry admin routes
+router.include_router(
+    registry.router,
+    prefix="/registry",
+    tags=["registry"],
+)
+
+# Include gateway statistics routes
+router.include_router(
+    stats.router,
+    prefix="/stats",
+    tags=["stats"],
+)
+
+# Task change streams; included before /tasks/{task_id} so "stream" is not taken for an id
+router.include_router(
+    events.router,
+    prefix="/tasks",
+    tags=["events"],
+)
+
+async def task_changed(user_id, event_type: str, task_id, task: Optional[dict] = None) -> None:
+    """Invalidate the user's cached reads and tell their open streams"""
+    await response_cache.invalidate_user(user_id)
+    # With the redis backend the task service publishes from its own write paths
+    if task_events.local_only:
+        await task_events.publish(user_id, event_type, task_id, task)
+
+def upstream_content(result: dict) -> Any:
+    """The task service's answer, with its errors passed on to the client"""
+    content = result_content(result)
+    if result["status_code"] >= 400:
+        detail = content.get("detail") if isinstance(content, dict) else None
+        raise HTTPException(status_code=result["status_code"], detail=detail or "Task service error")
+    return content
 
 # Task management endpoints under /task-management
 # Task service proxy routes with explicit endpoints
 @router.post("/tasks/create", response_model=TaskResponse)
 async def create_task(
     task_data: TaskWithRecurringCreate,  # Use Task Service schema
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(enforce_rate_limit),
 ):
     """Create a new task"""
     headers = {"X-User-ID": str(current_user.id)}
     
-    # Convert Pydantic model to dict and handle datetime serialization
-    task_dict = json.loads(
-        task_data.json(exclude_none=True),
-        object_hook=lambda d: {
-            k: parse_datetime(v) if isinstance(v, str) and "T" in v else v
-            for k, v in d.items()
-        }
-    )
+    # Datetimes stay native; forward_request encodes them for the wire
+    task_dict = task_data.dict(exclude_none=True)
     
     result = await forward_request(
         service_url=settings.TASK_SERVICE_URL,
@@ -62,11 +97,14 @@ async def create_task(
         headers=headers,
         json_data=task_dict  # Changed from json to json_data
     )
+    task = upstream_content(result)
+    await task_changed(current_user.id, "task.created", task["id"], task)
     
-    return result["content"]
+    return task
 
 @router.get("/tasks/list", response_model=List[TaskResponse])
 async def list_tasks(
+    request: Request,
     status: Optional[str] = None,
     priority: Optional[str] = None,
     search: Optional[str] = None,
@@ -75,63 +113,100 @@ async def list_tasks(
     deadline_after: Optional[str] = None,   # Changed from datetime to str
     sort_by: str = "created_at",
     sort_order: str = "desc",
-    current_user: User = Depends(get_current_user),
+    limit: Optional[int] = None,
+    current_user: User = Depends(enforce_rate_limit),
 ):
     """List all tasks with filtering"""
-    headers = {"X-User-ID": str(current_user.id)}
-    
     # Clean up None values and empty strings from params
     params = {
         k: v for k, v in locals().items() 
-        if v is not None and v != "" and k not in ['current_user', 'headers']
+        if v is not None and v != "" and k not in ['current_user', 'request']
     }
     
-    result = await forward_request(
-        service_url=settings.TASK_SERVICE_URL,
-        path="/tasks/list-tasks",
-        method="GET",
-        headers=headers,
-        params=params
+    result = await fetch_task_list(
+        current_user, params, decode=False, accept=request.headers.get("accept", JSON_MEDIA_TYPE)
+    )
+
+    # The task service already validated the listing against TaskResponse,
+    # so relay its (possibly compressed) body instead of re-encoding it
+    return relay_response(request, result)
+
+async def fetch_task_list(current_user: User, params: dict, decode: bool = True,
+                          accept: Optional[str] = None) -> dict:
+    """Fetch a task listing from the task service"""
+    headers = {"X-User-ID": str(current_user.id)}
+    accept = accept or upstream_accept()
+
+    # Served from the response cache when possible; otherwise identical
+    # concurrent listings for this user share one upstream call
+    result = await response_cache.fetch(
+        current_user.id, "/tasks/list-tasks", params, accept,
+        lambda: coalesced(
+            current_user.id, "GET", "/tasks/list-tasks", params,
+            lambda: forward_request(
+                service_url=settings.TASK_SERVICE_URL,
+                path="/tasks/list-tasks",
+                method="GET",
+                headers=headers,
+                params=params,
+                decode=False,
+                accept=accept
+            )
+        )
+    )
+    if decode:
+        result_content(result)
+    return result
+
+def relay_response(request: Request, result: dict) -> Response:
+    """
+    Send an upstream body on unchanged when the client accepts its format and encoding.
+
+    msgpack bodies are converted to JSON here, at the edge, for clients that
+    did not ask for msgpack (e.g. when they shared a coalesced call with one
+    that did).
+    """
+    body, encoding = result["raw"], result["encoding"]
+    media_type = result["headers"].get("content-type", JSON_MEDIA_TYPE)
+    if is_msgpack(media_type) and not accepts_msgpack(request.headers.get("accept")):
+        with span("transcode"):
+            body = dumps_json(unpackb(decompress(body, encoding)))
+        encoding, media_type = None, JSON_MEDIA_TYPE
+    elif not accepts(request.headers.get("accept-encoding"), encoding):
+        body, encoding = decompress(body, encoding), None
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=body,
+        status_code=result["status_code"],
+        media_type=media_type,
+        headers=headers
     )
-    
-    # Ensure we return a list
-    content = result.get("content", [])
-    if not isinstance(content, list):
-        content = []
-    
-    return content
 
 @router.get("/tasks/{task_id}", tags=["tasks"])
 async def get_task(
     request: Request,
     task_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(enforce_rate_limit),
 ):
-    # Add debug logging
-    print(f"Getting task with ID: {task_id}")
+    logger.debug("Getting task with ID: %s", task_id)
     return await forward_task_request(request, f"/get-task/{task_id}", current_user)
 
 @router.put("/tasks/{task_id}/update-task", response_model=TaskResponse, tags=["tasks"])
 async def update_task(
     task_id: str,
     task_data: TaskWithRecurringUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(enforce_rate_limit),
 ):
     """Update a task with optional recurring pattern"""
     try:
         headers = {"X-User-ID": str(current_user.id)}
         
-        # Convert task data to dict and handle datetime serialization
-        task_dict = json.loads(
-            task_data.json(exclude_none=True),
-            object_hook=lambda d: {
-                k: parse_datetime(v) if isinstance(v, str) and "T" in v else v
-                for k, v in d.items()
-            }
-        )
+        # Datetimes stay native; forward_request encodes them for the wire
+        task_dict = task_data.dict(exclude_none=True)
         
-        print(f"Updating task {task_id}")
-        print(f"Update data: {task_dict}")
+        logger.debug("Updating task %s", task_id)
         
         result = await forward_request(
             service_url=settings.TASK_SERVICE_URL,
@@ -146,11 +221,15 @@ async def update_task(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="No response from task service"
             )
+        task = upstream_content(result)
+        await task_changed(current_user.id, "task.updated", task_id, task)
             
-        return result["content"]
+        return task
         
+    except HTTPException:
+        raise  # Shed, rate limited or upstream unavailable: keep its status and headers
     except Exception as e:
-        print(f"Error updating task: {str(e)}")
+        logger.error("Error updating task %s: %s", task_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error updating task: {str(e)}"
@@ -159,7 +238,7 @@ async def update_task(
 @router.delete("/tasks/{task_id}/delete-task", tags=["tasks"])
 async def delete_task(
     task_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(enforce_rate_limit),
 ):
     """Delete a task"""
     try:
@@ -171,11 +250,15 @@ async def delete_task(
             method="DELETE",
             headers=headers
         )
+        content = upstream_content(result)
+        await task_changed(current_user.id, "task.deleted", task_id)
         
-        return result["content"]  # This will contain the success message
+        return content  # This will contain the success message
         
+    except HTTPException:
+        raise  # Shed, rate limited or upstream unavailable: keep its status and headers
     except Exception as e:
-        print(f"Error deleting task: {str(e)}")
+        logger.error("Error deleting task %s: %s", task_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting task: {str(e)}"
@@ -183,27 +266,35 @@ async def delete_task(
 
 async def forward_task_request(request: Request, path: str, current_user: User):
     """Helper function to forward requests to task service"""
-    headers = dict(request.headers)
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
     headers["X-User-ID"] = str(current_user.id)
     
-    # Add debug logging
-    print(f"Forwarding request to path: {path}")
-    print(f"Headers: {headers}")
-    
-    result = await forward_request(
-        service_url=settings.TASK_SERVICE_URL,
-        path=f"/tasks{path}",
-        method=request.method,
-        headers=headers,
-        params=dict(request.query_params),
-        json_data=await request.json() if request.method in ["POST", "PUT", "PATCH"] else None  # Changed from json to json_data
-    )
-    
-    # Add debug logging
-    print(f"Received response: {result}")
-    
-    return JSONResponse(
-        content=result["content"],
-        status_code=result["status_code"],
-        headers=result["headers"]
-    )
\ No newline at end of file
+    logger.debug("Forwarding request to path: %s", path)
+
+    params = dict(request.query_params)
+    json_data = await request.json() if request.method in ["POST", "PUT", "PATCH"] else None
+
+    accept = request.headers.get("accept", JSON_MEDIA_TYPE)
+
+    def fetch():
+        # Reads are coalesced per user; mutating methods always go straight through
+        return coalesced(
+            current_user.id, request.method, f"/tasks{path}", params,
+            lambda: forward_request(
+                service_url=settings.TASK_SERVICE_URL,
+                path=f"/tasks{path}",
+                method=request.method,
+                headers=headers,
+                params=params,
+                json_data=json_data,  # Changed from json to json_data
+                decode=False,
+                accept=accept
+            )
+        )
+
+    if request.method == "GET":
+        result = await response_cache.fetch(current_user.id, f"/tasks{path}", params, accept, fetch)
+    else:
+        result = await fetch()
+
+    return relay_response(request, result)
@@ -0,0 +1,96 @@
+import math
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.api import routes
+from app.api.auth import enforce_rate_limit
+from app.core.config import settings
+from app.core.planner import Planner, PlanTask, WorkingHours
+from app.core.service_registry import result_content
+from app.core.ttl_cache import TTLCache
+from app.db.models import User
+from app.schemas.schedule import Schedule
+from shared.tracing import span
+
+router = APIRouter()
+
+OPEN_STATUSES = "pending,in_progress"
+
+# One planner per user, kept so the next plan only lays out again from the first task that changed
+planners = TTLCache(ttl=settings.SCHEDULE_PLANNER_TTL)
+
+def _epoch(value: Any) -> Optional[float]:
+    """A task service datetime, naive UTC, as epoch seconds"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def _datetime(epoch: float) -> datetime:
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+def _plan_task(task: dict) -> PlanTask:
+    return PlanTask(
+        str(task["id"]),
+        task.get("estimated_duration") or settings.SCHEDULE_DEFAULT_DURATION,
+        _epoch(task.get("deadline")),
+        task.get("priority") or "medium",
+    )
+
+def _planner(user: User) -> Planner:
+    hours = WorkingHours.from_user(user)
+    planner = planners.get(user.id)
+    if planner is None or planner.hours != hours:
+        planner = Planner(hours)
+    # Refreshed on every use, so an active user's planner is not rebuilt
+    planners.set(user.id, planner)
+    return planner
+
+@router.get("/schedule", response_model=Schedule, tags=["schedule"])
+async def schedule(
+    days: int = Query(settings.SCHEDULE_DEFAULT_DAYS, ge=1, le=settings.SCHEDULE_MAX_DAYS),
+    current_user: User = Depends(enforce_rate_limit),
+) -> Any:
+    """
+    A time-blocked plan of the user's open tasks for the next `days` days.
+
+    Tasks are packed into the user's working hours, with their breaks,
+    earliest deadline first (priority breaking ties), each for its
+    estimated duration. The planner is kept between calls, so after one
+    task changes only the tasks planned after it are laid out again.
+    """
+    result = await routes.fetch_task_list(current_user, {"status": OPEN_STATUSES, "sort_by": "deadline"})
+    content = result_content(result)
+    if result["status_code"] >= 400:
+        detail = content.get("detail") if isinstance(content, dict) else None
+        raise HTTPException(status_code=result["status_code"], detail=detail or "Task service error")
+    tasks: Dict[str, dict] = {str(task["id"]): task for task in content}
+
+    # Whole minutes, so calls within the same minute reuse the layout
+    start = math.ceil(time.time() / 60) * 60
+    with span("plan"):
+        planner = _planner(current_user)
+        planner.sync(_plan_task(task) for task in tasks.values())
+        plan = planner.plan(start, days)
+
+    return {
+        "start": _datetime(plan.start),
+        "end": _datetime(plan.end),
+        "tasks": [
+            {
+                "task_id": planned.id,
+                "title": tasks[planned.id]["title"],
+                "priority": tasks[planned.id]["priority"],
+                "deadline": tasks[planned.id].get("deadline"),
+                "blocks": [{"start": _datetime(s), "end": _datetime(e)} for s, e in planned.blocks],
+                "unplanned_minutes": math.ceil(planned.unplanned / 60),
+                "late": planned.late,
+            }
+            for planned in plan.tasks
+        ],
+        "unscheduled": plan.unscheduled,
+    }
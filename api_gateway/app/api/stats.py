@@ -0,0 +1,54 @@
+from typing import Any
+from fastapi import APIRouter, Depends
+from app.api.auth import get_current_user
+from app.core.coalescing import single_flight
+from app.core.rate_limit import concurrency_limiter
+from app.core.response_cache import response_cache
+from app.core.warming import cache_warmer
+from app.db.models import User
+from shared.deadline import deadline_stats
+from shared.events import task_events
+
+router = APIRouter()
+
+@router.get("/coalescing")
+def coalescing_stats(current_user: User = Depends(get_current_user)) -> Any:
+    """
+    Counters for single-flight request coalescing
+    """
+    return single_flight.stats()
+
+@router.get("/concurrency")
+def concurrency_stats(current_user: User = Depends(get_current_user)) -> Any:
+    """
+    Current adaptive concurrency limit and shed count
+    """
+    return concurrency_limiter.stats()
+
+@router.get("/response-cache")
+def response_cache_stats(current_user: User = Depends(get_current_user)) -> Any:
+    """
+    Hit rate and memory use of the gateway response cache
+    """
+    return response_cache.stats()
+
+@router.get("/events")
+def event_stats(current_user: User = Depends(get_current_user)) -> Any:
+    """
+    Open task event streams in this worker and events fanned out to them
+    """
+    return task_events.hub.stats()
+
+@router.get("/deadlines")
+def deadline_outcomes(current_user: User = Depends(get_current_user)) -> Any:
+    """
+    Requests answered in time, late, skipped or cancelled, and the share of work wasted
+    """
+    return deadline_stats("api_gateway")
+
+@router.get("/warming")
+def warming_stats(current_user: User = Depends(get_current_user)) -> Any:
+    """
+    Login-time cache warm-ups scheduled, dropped under load, completed and failed
+    """
+    return cache_warmer.stats()
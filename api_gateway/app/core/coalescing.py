@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from app.core.config import settings
+
+SAFE_METHODS = ("GET", "HEAD")
+
+def coalescing_key(user_id: str, method: str, path: str, params: Optional[dict] = None) -> tuple:
+    """Build a key from user, path and normalized query (order and empty values ignored)"""
+    query = tuple(sorted(
+        (str(k), str(v)) for k, v in (params or {}).items()
+        if v is not None and v != ""
+    ))
+    return (str(user_id), method.upper(), path, query)
+
+class SingleFlight:
+    """
+    Share one in-flight upstream call between identical concurrent reads.
+
+    The first caller for a key starts the call as its own task; callers that
+    arrive while it is running await the same task. The task is shielded so a
+    disconnecting caller does not cancel the call for the other waiters.
+    Results are shared, so callers must treat them as read-only. After a
+    write, forget_user() makes later reads start a call of their own rather
+    than join one that may have read the data before the write.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if key[1] not in SAFE_METHODS:
+            raise ValueError("Only safe methods can be coalesced")
+        task = self._inflight.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+
+            def finished(done: asyncio.Future) -> None:
+                # After forget_user() the key may belong to a newer call
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+
+            task.add_done_callback(finished)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def forget_user(self, user_id: str) -> None:
+        """Leave the user's calls in flight to their current waiters only"""
+        user_id = str(user_id)
+        for key in [key for key in self._inflight if key[0] == user_id]:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        total = self.upstream_calls + self.coalesced
+        return {
+            "requests": total,
+            "upstream_calls": self.upstream_calls,
+            "upstream_calls_saved": self.coalesced,
+            "saved_ratio": self.coalesced / total if total else 0.0,
+            "in_flight": len(self._inflight),
+        }
+
+single_flight = SingleFlight()
+
+async def coalesced(user_id: str, method: str, path: str, params: Optional[dict],
+                    fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Run fn through the single-flight group for safe methods, directly otherwise"""
+    if not settings.REQUEST_COALESCING_ENABLED or method.upper() not in SAFE_METHODS:
+        return await fn()
+    return await single_flight.do(coalescing_key(user_id, method, path, params), fn)
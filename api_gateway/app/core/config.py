@@ -14,10 +14,83 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-for-jwt")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+
+    # Token revocation: every worker keeps the revoked set in memory and syncs it
+    REVOCATION_BACKEND: str = "db"  # "db" polls the revoked_tokens table; "redis" also pushes over pub/sub
+    REVOCATION_SYNC_INTERVAL: float = 2.0  # Seconds between polls, 0 disables polling
+    REVOCATION_CHANNEL: str = "api_gateway:revocations"
     
     # Service URLs
     TASK_SERVICE_URL: str = "http://localhost:8001/api/v1"
 
+    # Service registry / load balancing settings
+    TASK_SERVICE_INSTANCES: str = ""  # Comma-separated base URLs; empty means just TASK_SERVICE_URL
+    SERVICE_REGISTRY_FILE: str = ""  # Optional JSON file, reloaded when it changes
+    LOAD_BALANCER_STRATEGY: str = "least_outstanding"  # or "p2c" (power of two choices)
+    HEALTH_CHECK_INTERVAL: float = 5.0  # Seconds, 0 disables active checks
+    HEALTH_CHECK_TIMEOUT: float = 1.0
+    PASSIVE_FAILURE_THRESHOLD: int = 3  # Consecutive failures before ejecting an instance
+    PASSIVE_EJECTION_SECONDS: float = 30.0
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE: int = 20
+    UPSTREAM_COMPRESSION: bool = True  # Ask the task service for gzip/zstd bodies
+    UPSTREAM_MSGPACK: bool = True  # Talk msgpack to the task service when msgpack is installed
+    UPSTREAM_TIMEOUT: float = 10.0  # Cap on any upstream call, shortened to the request's deadline
+
+    # Request deadlines, passed upstream as X-Request-Deadline
+    REQUEST_DEADLINE_DEFAULT: float = 8.0  # Seconds; 0 disables
+    # "path-prefix=seconds,..."; the longest matching prefix wins, 0 means no deadline
+    REQUEST_DEADLINE_BUDGETS: str = (
+        "/api/v1/dashboard=3,/api/v1/tasks/list=5,/api/v1/batch=10,/api/v1/tasks/stream=0"
+    )
+
+    # Share one upstream call between identical concurrent reads of the same user
+    REQUEST_COALESCING_ENABLED: bool = True
+
+    # Per-user cache of task reads, invalidated by the gateway's own writes
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_BACKEND: str = "memory"  # "memory" per worker, "redis" adds a shared second level
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_TTL: float = 30.0  # Seconds; bounds staleness from writes that bypass the gateway
+    RESPONSE_CACHE_CHANNEL: str = "api_gateway:respcache"
+
+    # Prefetch a user's first task page and dashboard right after login; the page is kept in
+    # the response cache, so warming only runs with RESPONSE_CACHE_ENABLED as well
+    LOGIN_WARMING_ENABLED: bool = True
+    LOGIN_WARMING_CONCURRENCY: int = 4  # Warm-ups running at once in this worker
+    LOGIN_WARMING_MAX_PENDING: int = 100  # Logins beyond this are not warmed at all
+    LOGIN_WARMING_TIMEOUT: float = 5.0
+
+    # Batch endpoint limits
+    BATCH_MAX_REQUESTS: int = 20
+    BATCH_TIMEOUT_SECONDS: float = 10.0
+
+    # Dashboard sections are fetched concurrently and cached per user
+    DASHBOARD_UPCOMING_LIMIT: int = 10
+    DASHBOARD_IN_PROGRESS_LIMIT: int = 10
+    DASHBOARD_CACHE_TTL: float = 5.0  # Seconds, 0 disables caching
+    DASHBOARD_SECTION_TIMEOUT: float = 2.0  # A slower section is reported as failed
+
+    # Auto-scheduling of open tasks into working hours
+    SCHEDULE_DEFAULT_DAYS: int = 7
+    SCHEDULE_MAX_DAYS: int = 30
+    SCHEDULE_DEFAULT_DURATION: int = 1800  # Seconds of work planned for tasks without an estimate
+    SCHEDULE_PLANNER_TTL: float = 600.0  # Seconds a user's planner is kept for incremental re-planning
+
+    # Per-user token bucket rate limiting
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" for one worker, "redis" for several
+    RATE_LIMIT_RATE: float = 10.0  # Tokens refilled per second
+    RATE_LIMIT_BURST: float = 20.0  # Bucket size
+
+    # Adaptive (AIMD) concurrency limit on upstream calls
+    CONCURRENCY_LIMIT_INITIAL: int = 20
+    CONCURRENCY_LIMIT_MIN: int = 2
+    CONCURRENCY_LIMIT_MAX: int = 200
+    CONCURRENCY_LATENCY_TOLERANCE: float = 2.0  # Latency above this x its route's baseline counts as overload
+    CONCURRENCY_BACKOFF: float = 0.9  # Multiplicative decrease factor
+    CONCURRENCY_WINDOW_SECONDS: float = 1.0  # At most one decrease per window
+
     # Redis settings
     REDIS_URL: str = "redis://localhost:6379/0"
     
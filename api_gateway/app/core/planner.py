@@ -0,0 +1,210 @@
+import math
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+DAY = 86400
+PRIORITY_RANK = {"low": 0, "medium": 1, "high": 2, "urgent": 3}
+
+class WorkingHours(NamedTuple):
+    """A user's working day, from the gateway User's scheduler preferences, in seconds"""
+    start: int  # After midnight, local time
+    end: int  # Before start when the day runs past midnight
+    break_duration: int
+    break_frequency: int  # Work between breaks; 0 for none
+
+    @classmethod
+    def from_user(cls, user) -> "WorkingHours":
+        start = user.daily_start_time or time(9, 0)
+        end = user.daily_end_time or time(17, 0)
+        return cls(
+            start.hour * 3600 + start.minute * 60 + start.second,
+            end.hour * 3600 + end.minute * 60 + end.second,
+            int(user.break_duration.total_seconds()) if user.break_duration else 0,
+            int(user.break_frequency.total_seconds()) if user.break_frequency else 0,
+        )
+
+class PlanTask(NamedTuple):
+    id: str
+    duration: int  # Seconds of work
+    deadline: Optional[float]  # Epoch seconds
+    priority: str
+
+class PlannedTask(NamedTuple):
+    id: str
+    blocks: List[Tuple[float, float]]  # (start, end) epoch seconds, in order
+    unplanned: int  # Seconds of work past the end of the plan
+    late: bool  # Finishes, or would finish, after its deadline
+
+class Plan(NamedTuple):
+    start: float
+    end: float
+    tasks: List[PlannedTask]  # In the order they are worked on
+    unscheduled: List[str]  # Tasks with no time at all before the end of the plan
+
+def _order(task: PlanTask) -> tuple:
+    # Earliest deadline first, tasks without one last; priority breaks ties, then the id
+    deadline = task.deadline if task.deadline is not None else math.inf
+    return deadline, -PRIORITY_RANK.get(task.priority, 1), task.id
+
+def work_segments(hours: WorkingHours, start: float, days: int) -> List[Tuple[float, float]]:
+    """
+    The stretches of work time between `start` and `days` later: each working
+    day cut into `break_frequency` runs with a break of `break_duration` after
+    each, so breaks fall at the same clock times every day.
+    """
+    end = start + days * DAY
+    length = (hours.end - hours.start) % DAY or DAY
+    begins = time(hours.start // 3600, hours.start // 60 % 60, hours.start % 60)
+    segments = []
+    # From the day before, whose hours may run past midnight into the first day
+    day = date.fromtimestamp(start) - timedelta(days=1)
+    while True:
+        opens = datetime.combine(day, begins).timestamp()
+        if opens >= end:
+            return segments
+        closes = opens + length
+        at = opens
+        while at < closes:
+            until = min(at + hours.break_frequency, closes) if hours.break_frequency else closes
+            if until > start and at < end:
+                segments.append((max(at, start), min(until, end)))
+            at = until + hours.break_duration
+        day += timedelta(days=1)
+
+class Planner:
+    """
+    Packs a user's tasks into their working hours, earliest deadline first.
+
+    Tasks are kept sorted by (deadline, priority) and worked on one after
+    the other, each taking the next free work time and running on across
+    breaks and days when it does not fit in one stretch. Earliest deadline
+    first finishes every task on time whenever any order can, and when
+    none can it keeps the worst lateness as small as possible.
+
+    Planning is incremental: the order is a sorted list updated by binary
+    search, and the blocks of the tasks before the first one added, removed
+    or changed since the last plan are kept, so re-planning after one change
+    only lays out the tasks after it. A plan for a different start or
+    length starts over, which is one pass over the tasks after the sort.
+    """
+
+    def __init__(self, hours: WorkingHours):
+        self.hours = hours
+        self._tasks: Dict[str, PlanTask] = {}
+        self._order: List[tuple] = []
+        self._planned: List[Optional[PlannedTask]] = []  # Matches _order up to _valid
+        self._resume: List[Tuple[float, int]] = [(0, 0)]  # (work done, segment) before each planned task
+        self._valid = 0  # Tasks whose place in the current plan is still known
+        self._window: Optional[Tuple[float, int]] = None
+        self._segments: List[Tuple[float, float]] = []
+        self._worked: List[float] = []  # Work time up to the end of each segment
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._tasks
+
+    def get(self, task_id: str) -> Optional[PlanTask]:
+        return self._tasks.get(task_id)
+
+    def set_tasks(self, tasks: Iterable[PlanTask]) -> None:
+        """Replace every task"""
+        self._tasks = {task.id: task for task in tasks}
+        self._order = sorted(map(_order, self._tasks.values()))
+        self._valid = 0
+
+    def update(self, task: PlanTask) -> None:
+        """Add a task, or change one"""
+        old = self._tasks.get(task.id)
+        if old == task:
+            return
+        if old is not None:
+            self._unplace(old)
+        self._tasks[task.id] = task
+        key = _order(task)
+        position = bisect_left(self._order, key)
+        self._order.insert(position, key)
+        self._valid = min(self._valid, position)
+
+    def sync(self, tasks: Iterable[PlanTask]) -> int:
+        """
+        Bring the tasks in line with `tasks`, the user's current open tasks:
+        one by one when few changed, else replacing them all. Returns how
+        many were added, changed or removed.
+        """
+        current = {task.id: task for task in tasks}
+        changed = [task for task in current.values() if self._tasks.get(task.id) != task]
+        removed = [task_id for task_id in self._tasks if task_id not in current]
+        if len(changed) + len(removed) > len(current) // 2:
+            self.set_tasks(current.values())
+        else:
+            for task_id in removed:
+                self.remove(task_id)
+            for task in changed:
+                self.update(task)
+        return len(changed) + len(removed)
+
+    def remove(self, task_id: str) -> None:
+        old = self._tasks.pop(task_id, None)
+        if old is not None:
+            self._unplace(old)
+
+    def _unplace(self, task: PlanTask) -> None:
+        position = bisect_left(self._order, _order(task))
+        del self._order[position]
+        self._valid = min(self._valid, position)
+
+    def plan(self, start: float, days: int) -> Plan:
+        if self._window != (start, days):
+            self._window = (start, days)
+            self._segments = work_segments(self.hours, start, days)
+            worked, total = [], 0.0
+            for opens, closes in self._segments:
+                total += closes - opens
+                worked.append(total)
+            self._worked = worked
+            self._valid = 0
+        end = start + days * DAY
+        self._layout()
+        tasks = [planned for planned in self._planned if planned is not None]
+        unscheduled = [key[-1] for key, planned in zip(self._order, self._planned) if planned is None]
+        return Plan(start, end, tasks, unscheduled)
+
+    def _layout(self) -> None:
+        """Lay out the tasks from the first one whose place is no longer known"""
+        valid = self._valid
+        del self._planned[valid:]
+        del self._resume[valid + 1:]
+        done, segment = self._resume[valid]
+        segments, worked = self._segments, self._worked
+        count = len(segments)
+        ends = self._window[0] + self._window[1] * DAY
+        planned, resume = self._planned, self._resume
+        for key in self._order[valid:]:
+            task = self._tasks[key[-1]]
+            left = task.duration
+            blocks = []
+            while left > 0 and segment < count:
+                closes = segments[segment][1]
+                available = worked[segment] - done
+                if available <= 0:
+                    segment += 1
+                    continue
+                at = closes - available
+                take = min(left, available)
+                blocks.append((at, at + take))
+                done += take
+                left -= take
+            if blocks:
+                deadline = task.deadline
+                if left:
+                    late = deadline is not None and deadline < ends
+                else:
+                    late = deadline is not None and blocks[-1][1] > deadline
+                planned.append(PlannedTask(task.id, blocks, left, late))
+            else:
+                planned.append(None)
+            resume.append((done, segment))
+        self._valid = len(self._order)
@@ -0,0 +1,219 @@
+import math
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+import redis.asyncio as aioredis
+from fastapi import HTTPException, status
+from app.core.config import settings
+from shared.log import get_logger
+
+logger = get_logger("api_gateway.rate_limit")
+
+class InMemoryTokenBucket:
+    """Per-key token buckets kept in this process (enough for a single worker)"""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, last refill)
+
+    async def hit(self, key: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """Take `cost` tokens; return (allowed, seconds until it would be allowed)"""
+        now = time.monotonic()
+        tokens, last = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens >= cost:
+            self.buckets[key] = (tokens - cost, now)
+            allowed, retry_after = True, 0.0
+        else:
+            self.buckets[key] = (tokens, now)
+            allowed, retry_after = False, (cost - tokens) / self.rate
+        if len(self.buckets) > self.max_keys:
+            self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now: float) -> None:
+        # A bucket that has refilled completely carries no state worth keeping
+        full_after = self.burst / self.rate
+        self.buckets = {
+            k: v for k, v in self.buckets.items() if now - v[1] < full_after
+        }
+
+# Refill and take tokens atomically; Redis TIME keeps all workers on one clock
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+class RedisTokenBucket:
+    """Token buckets shared by all gateway workers through a Redis Lua script"""
+
+    def __init__(self, rate: float, burst: float, redis_url: str):
+        self.rate = rate
+        self.burst = burst
+        self.client = aioredis.from_url(redis_url)
+        self.script = self.client.register_script(TOKEN_BUCKET_LUA)
+
+    async def hit(self, key: str, cost: float = 1.0) -> Tuple[bool, float]:
+        try:
+            allowed, retry_after = await self.script(
+                keys=[f"api_gateway:ratelimit:{key}"], args=[self.rate, self.burst, cost]
+            )
+        except aioredis.RedisError as e:
+            # Fail open: losing the limiter is better than losing the API
+            logger.warning("Redis unavailable, allowing request: %s", e)
+            return True, 0.0
+        return bool(allowed), float(retry_after)
+
+def build_rate_limiter():
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisTokenBucket(settings.RATE_LIMIT_RATE, settings.RATE_LIMIT_BURST, settings.REDIS_URL)
+    return InMemoryTokenBucket(settings.RATE_LIMIT_RATE, settings.RATE_LIMIT_BURST)
+
+rate_limiter = build_rate_limiter()
+
+async def charge_user(user_id: str, cost: float = 1.0) -> None:
+    """Take tokens from the user's bucket or raise 429 with Retry-After"""
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    allowed, retry_after = await rate_limiter.hit(str(user_id), cost)
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+# Path segments holding an id, e.g. a task UUID, are one route for the latency baseline
+ID_SEGMENT = re.compile(r"/[^/]*\d[^/]*")
+
+def route_template(method: str, path: str) -> str:
+    return f"{method.upper()} {ID_SEGMENT.sub('/{id}', path.split('?', 1)[0])}"
+
+class UpstreamSample:
+    """What one upstream call tells the limiter: its status, or nothing if discarded"""
+    __slots__ = ("status_code", "discarded")
+
+    def __init__(self):
+        self.status_code: Optional[int] = None
+        self.discarded = False
+
+    def discard(self) -> None:
+        """The call ended for reasons of its own, e.g. the client's deadline, not upstream load"""
+        self.discarded = True
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Global cap on in-flight upstream calls, adjusted with AIMD.
+
+    The limit grows by 1/limit for every call that completes close to the best
+    latency seen recently for its route and is cut multiplicatively (at most
+    once per window) when latency rises past LATENCY_TOLERANCE x that baseline
+    or the upstream fails: a 5xx answer, timeout or unreachable upstream.
+    Baselines are kept per method and route template, so a slow listing is
+    not held against a fast single-task read. Calls over the limit are shed
+    immediately with 503 rather than queued, which keeps tail latency flat
+    for the calls that are admitted.
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int,
+                 tolerance: float, backoff: float, window: float, max_routes: int = 256):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.window = window
+        self.max_routes = max_routes
+        self.in_flight = 0
+        # route -> (lowest latency, when it is forgotten), least recently used first
+        self.baselines: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.last_decrease = 0.0
+        self.shed = 0
+
+    def on_sample(self, route: str, latency: float, failed: bool) -> None:
+        now = time.monotonic()
+        baseline = self.baselines.get(route)
+        # Let the baseline follow real changes in upstream speed
+        if baseline is not None and now >= baseline[1]:
+            baseline = None
+        if not failed and (baseline is None or latency < baseline[0]):
+            baseline = (latency, baseline[1] if baseline is not None else now + 30 * self.window)
+        if baseline is not None:
+            self.baselines[route] = baseline
+            self.baselines.move_to_end(route)
+            if len(self.baselines) > self.max_routes:
+                self.baselines.popitem(last=False)
+        overloaded = failed or (baseline is not None and latency > baseline[0] * self.tolerance)
+        if overloaded:
+            if now - self.last_decrease >= self.window:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.last_decrease = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    @asynccontextmanager
+    async def slot(self, route: str):
+        """Admit one upstream call; the caller records its status on the yielded sample"""
+        if self.in_flight >= int(self.limit):
+            self.shed += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Gateway is overloaded, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self.in_flight += 1
+        sample = UpstreamSample()
+        started = time.perf_counter()
+        try:
+            yield sample
+        except HTTPException as e:
+            if sample.status_code is None:
+                sample.status_code = e.status_code
+            raise
+        except Exception:
+            sample.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+            raise
+        finally:
+            self.in_flight -= 1
+            if not sample.discarded:
+                failed = sample.status_code is not None and sample.status_code >= 500
+                self.on_sample(route, time.perf_counter() - started, failed)
+
+    def stats(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "routes": len(self.baselines),
+            "shed": self.shed,
+        }
+
+concurrency_limiter = AdaptiveConcurrencyLimiter(
+    initial=settings.CONCURRENCY_LIMIT_INITIAL,
+    min_limit=settings.CONCURRENCY_LIMIT_MIN,
+    max_limit=settings.CONCURRENCY_LIMIT_MAX,
+    tolerance=settings.CONCURRENCY_LATENCY_TOLERANCE,
+    backoff=settings.CONCURRENCY_BACKOFF,
+    window=settings.CONCURRENCY_WINDOW_SECONDS,
+)
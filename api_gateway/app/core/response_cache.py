@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+import redis.asyncio as aioredis
+from app.core.coalescing import coalescing_key, single_flight
+from app.core.config import settings
+from shared.log import get_logger
+from shared.wire import accepts_msgpack
+
+logger = get_logger("api_gateway.response_cache")
+
+# Rough per-entry bookkeeping cost (key tuple, dicts, OrderedDict node) on top of the body
+ENTRY_OVERHEAD = 400
+# Users whose generation is remembered; the one invalidated longest ago is forgotten first
+MAX_GENERATIONS = 100_000
+
+class LRUResponseCache:
+    """
+    In-process LRU of upstream responses bounded by total body bytes.
+
+    Entries are indexed per user so a write can drop all of that user's
+    entries at once. Each user also has a generation number that is bumped on
+    invalidation; a fetch that started before a write carries the old
+    generation and its (possibly stale) result is not stored.
+
+    Generations come from one counter and at most `max_generations` users
+    keep their own. A user without one is at the highest generation
+    forgotten so far, so forgetting one can only turn away results of
+    fetches already under way, never let a stale one in.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, max_generations: int = MAX_GENERATIONS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_generations = max_generations
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires, size, user, entry)
+        self._by_user: Dict[str, Set[Hashable]] = {}
+        self._generations: "OrderedDict[str, int]" = OrderedDict()  # Least recently invalidated first
+        self._last_generation = 0
+        self._forgotten_generation = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self, user_id: str) -> int:
+        return self._generations.get(user_id, self._forgotten_generation)
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        item = self._entries.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        if item[0] <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return item[3]
+
+    def put(self, user_id: str, key: Hashable, entry: dict, generation: int) -> None:
+        if generation != self.generation(user_id):
+            return
+        size = len(entry["raw"]) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, user_id, entry)
+        self._by_user.setdefault(user_id, set()).add(key)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate_user(self, user_id: str) -> None:
+        self._last_generation += 1
+        self._generations[user_id] = self._last_generation
+        self._generations.move_to_end(user_id)
+        if len(self._generations) > self.max_generations:
+            _, forgotten = self._generations.popitem(last=False)
+            self._forgotten_generation = max(self._forgotten_generation, forgotten)
+        for key in self._by_user.pop(user_id, ()):
+            item = self._entries.pop(key, None)
+            if item is not None:
+                self.bytes -= item[1]
+        self.invalidations += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, user_id, _ = self._entries.pop(key)
+        self.bytes -= size
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "users": len(self._by_user),
+            "generations": len(self._generations),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+class RedisResponseStore:
+    """
+    Shared second level behind the LRU, so workers reuse each other's fetches.
+
+    Entries are stored with the user's Redis generation number; invalidating
+    a user increments it, which makes every older entry unreadable at once
+    without finding and deleting them (they expire through their TTL). The
+    generation and the entry are read together with one MGET.
+    """
+
+    def __init__(self, redis_url: str, ttl: float):
+        self.client = aioredis.from_url(redis_url)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @staticmethod
+    def _generation_key(user_id: str) -> str:
+        return f"api_gateway:respcache:gen:{user_id}"
+
+    @staticmethod
+    def _entry_key(user_id: str, key: Hashable) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return f"api_gateway:respcache:{user_id}:{digest}"
+
+    async def get(self, user_id: str, key: Hashable) -> Tuple[Optional[int], Optional[dict]]:
+        """
+        Return the user's current generation and the entry, if valid.
+
+        The generation is read before the upstream fetch on a miss and
+        passed back to put, so a result fetched across a write elsewhere is
+        stored under the old generation and never served.
+        """
+        try:
+            generation, value = await self.client.mget(
+                self._generation_key(user_id), self._entry_key(user_id, key)
+            )
+        except aioredis.RedisError as e:
+            self.errors += 1
+            logger.warning("Response cache Redis read failed: %s", e)
+            return None, None
+        generation = int(generation or 0)
+        if value is None:
+            self.misses += 1
+            return generation, None
+        header, _, raw = value.partition(b"\n")
+        meta = json.loads(header)
+        if meta.pop("generation") != generation:
+            self.misses += 1
+            return generation, None
+        self.hits += 1
+        return generation, {**meta, "raw": raw}
+
+    async def put(self, user_id: str, key: Hashable, entry: dict, generation: int) -> None:
+        meta = {k: v for k, v in entry.items() if k != "raw"}
+        meta["generation"] = generation
+        try:
+            await self.client.set(
+                self._entry_key(user_id, key),
+                json.dumps(meta).encode() + b"\n" + entry["raw"],
+                ex=max(1, int(self.ttl)),
+            )
+        except aioredis.RedisError as e:
+            self.errors += 1
+            logger.warning("Response cache Redis write failed: %s", e)
+
+    async def invalidate_user(self, user_id: str) -> None:
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.incr(self._generation_key(user_id))
+            pipe.expire(self._generation_key(user_id), max(1, int(self.ttl)) * 2)
+            pipe.publish(settings.RESPONSE_CACHE_CHANNEL, user_id)
+            await pipe.execute()
+        except aioredis.RedisError as e:
+            self.errors += 1
+            logger.warning("Response cache Redis invalidation failed: %s", e)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "redis_hits": self.hits,
+            "redis_misses": self.misses,
+            "redis_hit_ratio": self.hits / total if total else 0.0,
+            "redis_errors": self.errors,
+        }
+
+class ResponseCache:
+    """
+    Per-user cache of successful task-service GET responses.
+
+    Keys combine user, path, normalized params and the representation asked
+    for (msgpack or JSON). The body is kept exactly as received, compressed,
+    so hits are relayed with no decoding. The gateway's own create, update and
+    delete routes invalidate the user's entries; RESPONSE_CACHE_TTL bounds
+    staleness from writes that bypass the gateway.
+    """
+
+    def __init__(self):
+        self.local = LRUResponseCache(settings.RESPONSE_CACHE_MAX_BYTES, settings.RESPONSE_CACHE_TTL)
+        self.shared: Optional[RedisResponseStore] = None
+        if settings.RESPONSE_CACHE_BACKEND == "redis":
+            self.shared = RedisResponseStore(settings.REDIS_URL, settings.RESPONSE_CACHE_TTL)
+        self._subscriber: Optional[asyncio.Task] = None
+
+    async def fetch(self, user_id, path: str, params: Optional[dict], accept: Optional[str],
+                    fn: Callable[[], Awaitable[dict]]) -> dict:
+        """Return a cached result for this read or run fn and cache a 200 response"""
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return await fn()
+        user_id = str(user_id)
+        key = coalescing_key(user_id, "GET", path, params) + (
+            "msgpack" if accepts_msgpack(accept) else "json",
+        )
+        entry = self.local.get(key)
+        generation = self.local.generation(user_id)
+        shared_generation = None
+        if entry is None and self.shared is not None:
+            shared_generation, entry = await self.shared.get(user_id, key)
+            if entry is not None:
+                self.local.put(user_id, key, entry, generation)
+        if entry is not None:
+            # Callers decode into the result dict, so each gets its own copy
+            return {**entry, "content": None, "headers": dict(entry["headers"])}
+
+        result = await fn()
+        if result["status_code"] == 200:
+            entry = {
+                "status_code": 200,
+                "headers": {"content-type": result["headers"].get("content-type", "application/json")},
+                "raw": result["raw"],
+                "encoding": result["encoding"],
+            }
+            self.local.put(user_id, key, entry, generation)
+            if shared_generation is not None:
+                await self.shared.put(user_id, key, entry, shared_generation)
+        return result
+
+    async def invalidate_user(self, user_id) -> None:
+        user_id = str(user_id)
+        # Reads after the write must not share a call that started before it
+        single_flight.forget_user(user_id)
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return
+        self.local.invalidate_user(user_id)
+        if self.shared is not None:
+            await self.shared.invalidate_user(user_id)
+
+    async def _subscribe_loop(self) -> None:
+        """Drop local entries of users invalidated by other workers"""
+        while True:
+            try:
+                pubsub = self.shared.client.pubsub()
+                await pubsub.subscribe(settings.RESPONSE_CACHE_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        user_id = message["data"].decode()
+                        single_flight.forget_user(user_id)
+                        self.local.invalidate_user(user_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Response cache subscription lost, retrying: %s", e)
+                await asyncio.sleep(1.0)
+
+    def start(self) -> None:
+        if settings.RESPONSE_CACHE_ENABLED and self.shared is not None and self._subscriber is None:
+            self._subscriber = asyncio.create_task(self._subscribe_loop())
+
+    async def stop(self) -> None:
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            try:
+                await self._subscriber
+            except asyncio.CancelledError:
+                pass
+            self._subscriber = None
+        if self.shared is not None:
+            await self.shared.client.close()
+
+    def stats(self) -> dict:
+        stats = {"enabled": settings.RESPONSE_CACHE_ENABLED, **self.local.stats()}
+        if self.shared is not None:
+            stats.update(self.shared.stats())
+        return stats
+
+response_cache = ResponseCache()
@@ -0,0 +1,273 @@
+import asyncio
+import calendar
+import json
+import hashlib
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import redis.asyncio as aioredis
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import RevokedToken
+from shared.log import get_logger
+from shared.shm import MAX_LOAD, SHARED_STATE_SEGMENT, FileLock, SharedTable, attach_segment
+
+logger = get_logger("api_gateway.revocation")
+
+def _epoch(dt: datetime) -> float:
+    return calendar.timegm(dt.utctimetuple())
+
+class RevocationList:
+    """
+    Each worker's in-memory view of revoked tokens.
+
+    Checking a token is one dict lookup by jti (plus one by user id while any
+    user-wide revocation is live), with no I/O. Entries are dropped once the
+    tokens they cover have expired, so memory is bounded by the revocations
+    made within one token lifetime rather than growing forever.
+    """
+
+    def __init__(self):
+        self._jtis: Dict[str, float] = {}  # jti -> token expiry (epoch seconds)
+        self._users: Dict[str, tuple] = {}  # user id -> (tokens issued at or before, entry expiry)
+        self.last_id = 0  # Highest revoked_tokens row applied, the polling watermark
+
+    def is_revoked(self, jti: Optional[str], user_id: Optional[str], issued_at: Optional[float]) -> bool:
+        if jti in self._jtis:
+            return True
+        if self._users:
+            entry = self._users.get(user_id)
+            if entry is not None and (issued_at is None or issued_at <= entry[0]):
+                return True
+        return False
+
+    def apply(self, jti: Optional[str], user_id: str, revoked_at: float, expires_at: float) -> None:
+        if expires_at <= time.time():
+            return
+        if jti:
+            self._jtis[jti] = expires_at
+        else:
+            current = self._users.get(user_id)
+            if current is None or current[0] < revoked_at:
+                self._users[user_id] = (revoked_at, expires_at)
+
+    def prune(self) -> None:
+        now = time.time()
+        self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp > now}
+        self._users = {uid: entry for uid, entry in self._users.items() if entry[1] > now}
+
+    def leads(self) -> bool:
+        """Whether this worker should poll the database; each has its own copy"""
+        return True
+
+    def stats(self) -> dict:
+        return {"jtis": len(self._jtis), "users": len(self._users), "last_id": self.last_id}
+
+def _key(value: str) -> bytes:
+    """16-byte table key: jtis and user ids are UUIDs, anything else is hashed"""
+    try:
+        key = bytes.fromhex(value.replace("-", ""))
+        if len(key) == 16:
+            return key
+    except ValueError:
+        pass
+    return hashlib.blake2b(value.encode(), digest_size=16).digest()
+
+class SharedRevocationList(RevocationList):
+    """
+    RevocationList kept in the shared memory segment of a multi-worker
+    launch (see shared.serve), so N workers hold one copy instead of N.
+
+    A revocation made by any worker is visible to all of them on their next
+    check. Only the worker holding the leader lock polls the database; the
+    others skip their sync until they inherit the lock from a worker that
+    exited. Lookups cost about as much as the dict version: a struct unpack
+    or two instead of a dict probe.
+    """
+
+    def __init__(self, segment_name: str):
+        super().__init__()
+        self._segment = attach_segment(segment_name)
+        buffer = self._segment.buf
+        lock = FileLock(f"{segment_name}-revocations")
+        # User-wide revocations are rare next to single-token ones
+        split = len(buffer) // 16
+        self._user_table = SharedTable(buffer[:split], lock)
+        self._jti_table = SharedTable(buffer[split:], lock)
+        self._leader = FileLock(f"{segment_name}-revocations-leader")
+        self._live_after_rebuild: Dict[int, int] = {}
+
+    def is_revoked(self, jti: Optional[str], user_id: Optional[str], issued_at: Optional[float]) -> bool:
+        if jti:
+            entry = self._jti_table.get(_key(jti))
+            if entry is not None and entry[1] > time.time():
+                return True
+        if user_id and len(self._user_table):
+            entry = self._user_table.get(_key(user_id))
+            if entry is not None and entry[1] > time.time() and (issued_at is None or issued_at <= entry[0]):
+                return True
+        return False
+
+    def apply(self, jti: Optional[str], user_id: str, revoked_at: float, expires_at: float) -> None:
+        if expires_at <= time.time():
+            return
+        if jti:
+            stored = self._jti_table.put(_key(jti), revoked_at, expires_at)
+        else:
+            key = _key(user_id)
+            current = self._user_table.get(key)
+            stored = (current is not None and current[0] >= revoked_at) or \
+                self._user_table.put(key, revoked_at, expires_at)
+        if not stored:
+            # Full even after dropping expired entries; keep it in this worker
+            logger.error("Shared revocation table is full, revocation only applies in this worker")
+            super().apply(jti, user_id, revoked_at, expires_at)
+
+    def prune(self) -> None:
+        super().prune()
+        # Expired entries are ignored on lookup; a rebuild scans the whole
+        # table, so it only runs once slots have filled up since the last one
+        for table in (self._jti_table, self._user_table):
+            if len(table) >= max(table.capacity * MAX_LOAD / 2, 2 * self._live_after_rebuild.get(id(table), 0)):
+                table.rebuild()
+                self._live_after_rebuild[id(table)] = len(table)
+
+    def leads(self) -> bool:
+        return self._leader.try_hold()
+
+    def stats(self) -> dict:
+        return {
+            "jtis": len(self._jti_table),
+            "users": len(self._user_table),
+            "last_id": self.last_id,
+            "shared": 1,
+            "leader": int(self._leader.held),
+            "local_overflow": len(self._jtis) + len(self._users),
+        }
+
+class RevocationService:
+    """
+    Records revocations in the gateway database and keeps every worker's
+    RevocationList in sync with it.
+
+    Workers poll the revoked_tokens table for rows past their watermark every
+    REVOCATION_SYNC_INTERVAL seconds. With the "redis" backend, revocations
+    are also pushed over pub/sub so other workers apply them within
+    milliseconds; polling then only covers missed messages. Workers started
+    by the launcher share one list in shared memory, polled by one of them.
+    """
+
+    def __init__(self):
+        self.revoked = SharedRevocationList(SHARED_STATE_SEGMENT) if SHARED_STATE_SEGMENT else RevocationList()
+        self._tasks = []
+        self._redis = None
+
+    def is_revoked(self, payload: dict) -> bool:
+        return self.revoked.is_revoked(payload.get("jti"), payload.get("sub"), payload.get("iat"))
+
+    async def revoke_token(self, jti: str, user_id: str, expires_at: datetime) -> None:
+        await self._record(jti, user_id, expires_at)
+
+    async def revoke_user(self, user_id: str) -> None:
+        """Revoke every token issued to the user so far"""
+        expires_at = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        await self._record(None, user_id, expires_at)
+
+    async def _record(self, jti: Optional[str], user_id: str, expires_at: datetime) -> None:
+        revoked_at = datetime.utcnow()
+        await asyncio.to_thread(self._insert, jti, user_id, revoked_at, expires_at)
+        # Effective in this worker at once, in the others on their next sync or message
+        self.revoked.apply(jti, str(user_id), _epoch(revoked_at), _epoch(expires_at))
+        if self._redis is not None:
+            message = json.dumps({
+                "jti": jti, "user_id": str(user_id),
+                "revoked_at": _epoch(revoked_at), "expires_at": _epoch(expires_at),
+            })
+            try:
+                await self._redis.publish(settings.REVOCATION_CHANNEL, message)
+            except aioredis.RedisError as e:
+                logger.warning("Could not publish revocation, peers will catch up by polling: %s", e)
+
+    def _insert(self, jti, user_id, revoked_at, expires_at) -> None:
+        db = SessionLocal()
+        try:
+            db.add(RevokedToken(jti=jti, user_id=user_id, revoked_at=revoked_at, expires_at=expires_at))
+            db.commit()
+        finally:
+            db.close()
+
+    def _load_since(self, last_id: int) -> list:
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            rows = db.query(RevokedToken).filter(
+                RevokedToken.id > last_id,
+                RevokedToken.expires_at > now,
+            ).order_by(RevokedToken.id).all()
+            if last_id == 0:
+                # Full load at startup is also a good moment to drop dead rows
+                db.query(RevokedToken).filter(RevokedToken.expires_at <= now).delete()
+                db.commit()
+            return [
+                (row.id, row.jti, str(row.user_id), _epoch(row.revoked_at), _epoch(row.expires_at))
+                for row in rows
+            ]
+        finally:
+            db.close()
+
+    async def sync(self) -> None:
+        """Apply revocations recorded since the last sync and forget expired ones"""
+        rows = await asyncio.to_thread(self._load_since, self.revoked.last_id)
+        for row_id, jti, user_id, revoked_at, expires_at in rows:
+            self.revoked.apply(jti, user_id, revoked_at, expires_at)
+            self.revoked.last_id = max(self.revoked.last_id, row_id)
+        self.revoked.prune()
+
+    async def _poll_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.REVOCATION_SYNC_INTERVAL)
+            if not self.revoked.leads():
+                continue
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error("Revocation sync failed: %s", e)
+
+    async def _subscribe_loop(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(settings.REVOCATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    entry = json.loads(message["data"])
+                    self.revoked.apply(entry["jti"], entry["user_id"], entry["revoked_at"], entry["expires_at"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Revocation subscription lost, retrying: %s", e)
+                await asyncio.sleep(settings.REVOCATION_SYNC_INTERVAL)
+
+    async def start(self) -> None:
+        await self.sync()
+        if settings.REVOCATION_BACKEND == "redis":
+            self._redis = aioredis.from_url(settings.REDIS_URL)
+            self._tasks.append(asyncio.create_task(self._subscribe_loop()))
+        if settings.REVOCATION_SYNC_INTERVAL > 0:
+            self._tasks.append(asyncio.create_task(self._poll_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+revocations = RevocationService()
@@ -1,3 +1,4 @@
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional, Union, Any
 from jose import jwt
@@ -13,9 +14,12 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 def create_access_token(user_id: str, expires_delta: timedelta = None) -> str:
+    now = datetime.utcnow()
     to_encode = {
         "sub": str(user_id),
-        "exp": datetime.utcnow() + (expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
+        "exp": now + (expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)),
+        "iat": now,
+        "jti": uuid.uuid4().hex,  # Identifies the token for revocation
     }
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
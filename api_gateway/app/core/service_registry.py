@@ -1,62 +1,418 @@
+import asyncio
+import os
+import random
+import time as _time
 import httpx
 import json
 from datetime import datetime, date, time
+from typing import Dict, List, Optional
+from uuid import UUID
 from fastapi import HTTPException, status
 from app.core.config import settings
+from app.core.rate_limit import concurrency_limiter, route_template
+from shared.compression import SUPPORTED_ENCODINGS, decompress
+from shared.deadline import DEADLINE_HEADER, DeadlineExceeded, deadline_header, remaining
+from shared.log import get_logger
+from shared.metrics import Histogram
+from shared.tracing import TRACE_HEADER, get_trace_id, merge_server_timing, span
+from shared.wire import MSGPACK_MEDIA_TYPE, JSON_MEDIA_TYPE, decode_body, msgpack, packb
+
+TASK_SERVICE = "task_service"
+
+logger = get_logger("api_gateway.service_registry")
+
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "upstream_request_duration_seconds", "Latency of calls forwarded to backend services",
+    ["service", "method", "status"],
+)
+
+class NoInstanceAvailable(HTTPException):
+    def __init__(self, name: str):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"No healthy instance available for {name}",
+        )
+
+# Headers forward_request sets itself; copies passed in by callers are dropped
+MANAGED_HEADERS = {"accept", "accept-encoding", "content-type", "content-length", "host"}
 
 def json_serializer(obj):
     """Custom JSON serializer for objects not serializable by default json code"""
     if isinstance(obj, (datetime, date, time)):
         return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
     if hasattr(obj, 'dict'):
         return obj.dict()
     raise TypeError(f"Type {type(obj)} not serializable")
 
-async def forward_request(service_url: str, path: str, method: str, headers: dict = None, 
-                         params: dict = None, data: dict = None, json_data: dict = None):
-    """Forward request to the appropriate microservice"""
-    url = f"{service_url}{path}"
-    
+class ServiceInstance:
+    """A single upstream instance and its load/health bookkeeping"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.healthy = True
+        self.draining = False
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.total_requests = 0
+        self.total_failures = 0
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and not self.draining and _time.monotonic() >= self.ejected_until
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "healthy": self.healthy,
+            "draining": self.draining,
+            "ejected": _time.monotonic() < self.ejected_until,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+        }
+
+class ServiceRegistry:
+    """
+    Holds the upstream instances of every service and picks one per request.
+
+    Instances come from settings (TASK_SERVICE_INSTANCES) or from a JSON file
+    (SERVICE_REGISTRY_FILE, {"task_service": ["http://...", ...]}) that is
+    re-read whenever its mtime changes. Health is tracked actively (periodic
+    GET {url}/health) and passively (consecutive failed forwards eject the
+    instance for a cool-down period).
+    """
+
+    def __init__(self, strategy: str = "least_outstanding"):
+        self.strategy = strategy
+        self.services: Dict[str, List[ServiceInstance]] = {}
+        # Logical URLs (e.g. settings.TASK_SERVICE_URL) resolve to a service name
+        self.aliases: Dict[str, str] = {}
+        self._file_mtime: Optional[float] = None
+        self._health_task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, urls: List[str], alias: Optional[str] = None) -> None:
+        """Set the instances of a service; instances no longer listed are drained"""
+        if alias:
+            self.aliases[alias] = name
+        wanted = [url.rstrip("/") for url in urls if url.strip()]
+        current = {instance.url: instance for instance in self.services.get(name, [])}
+        instances = []
+        for url in wanted:
+            instance = current.pop(url, None) or ServiceInstance(url)
+            instance.draining = False
+            instances.append(instance)
+        # Removed instances stay around until their in-flight requests finish
+        for instance in current.values():
+            if instance.outstanding > 0:
+                instance.draining = True
+                instances.append(instance)
+        self.services[name] = instances
+
+    def resolve(self, service_url: str) -> Optional[str]:
+        """Return the service name for a registered name or logical URL"""
+        if service_url in self.services:
+            return service_url
+        return self.aliases.get(service_url)
+
+    def acquire(self, name: str) -> ServiceInstance:
+        """Pick an instance and count the request against it"""
+        candidates = [i for i in self.services.get(name, []) if i.available]
+        if not candidates:
+            raise NoInstanceAvailable(name)
+        if len(candidates) == 1:
+            instance = candidates[0]
+        elif self.strategy == "p2c":
+            first, second = random.sample(candidates, 2)
+            instance = first if first.outstanding <= second.outstanding else second
+        else:
+            # Least outstanding requests, starting at a random offset to spread ties
+            offset = random.randrange(len(candidates))
+            rotated = candidates[offset:] + candidates[:offset]
+            instance = min(rotated, key=lambda i: i.outstanding)
+        instance.outstanding += 1
+        instance.total_requests += 1
+        return instance
+
+    def release(self, name: str, instance: ServiceInstance, failed: bool = False) -> None:
+        """Finish a request and feed its outcome into passive health checking"""
+        instance.outstanding -= 1
+        if failed:
+            instance.total_failures += 1
+            instance.consecutive_failures += 1
+            if instance.consecutive_failures >= settings.PASSIVE_FAILURE_THRESHOLD:
+                instance.ejected_until = _time.monotonic() + settings.PASSIVE_EJECTION_SECONDS
+                instance.consecutive_failures = 0
+                logger.warning("Ejected %s after repeated failures", instance.url)
+        else:
+            instance.consecutive_failures = 0
+        if instance.draining and instance.outstanding == 0:
+            self._remove_drained(name)
+
+    def drain(self, name: str, url: str) -> Optional[ServiceInstance]:
+        """Stop routing new requests to an instance and drop it once idle"""
+        for instance in self.services.get(name, []):
+            if instance.url == url.rstrip("/"):
+                instance.draining = True
+                if instance.outstanding == 0:
+                    self._remove_drained(name)
+                return instance
+        return None
+
+    def _remove_drained(self, name: str) -> None:
+        self.services[name] = [
+            i for i in self.services.get(name, [])
+            if not (i.draining and i.outstanding == 0)
+        ]
+
+    def snapshot(self) -> Dict[str, List[dict]]:
+        return {
+            name: [instance.snapshot() for instance in instances]
+            for name, instances in self.services.items()
+        }
+
+    def load_from_settings(self) -> None:
+        """Register instances from settings, falling back to the single configured URL"""
+        urls = [u for u in settings.TASK_SERVICE_INSTANCES.split(",") if u.strip()]
+        self.register(TASK_SERVICE, urls or [settings.TASK_SERVICE_URL], alias=settings.TASK_SERVICE_URL)
+        self.reload_file()
+
+    def reload_file(self) -> bool:
+        """Re-read SERVICE_REGISTRY_FILE if it changed since the last load"""
+        path = settings.SERVICE_REGISTRY_FILE
+        if not path or not os.path.exists(path):
+            return False
+        mtime = os.path.getmtime(path)
+        if mtime == self._file_mtime:
+            return False
+        try:
+            with open(path) as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Could not load service registry file %s: %s", path, e)
+            return False
+        self._file_mtime = mtime
+        for name, urls in config.items():
+            self.register(name, urls)
+        logger.info("Loaded service registry file %s", path)
+        return True
+
+    async def check_health(self) -> None:
+        """Probe every instance once"""
+        client = get_http_client()
+
+        async def probe(instance: ServiceInstance):
+            try:
+                response = await client.get(
+                    f"{instance.url}/health", timeout=settings.HEALTH_CHECK_TIMEOUT
+                )
+                instance.healthy = response.status_code == 200
+            except httpx.HTTPError:
+                instance.healthy = False
+
+        instances = [i for group in self.services.values() for i in group]
+        await asyncio.gather(*(probe(instance) for instance in instances))
+
+    async def _health_loop(self) -> None:
+        while True:
+            self.reload_file()
+            await self.check_health()
+            await asyncio.sleep(settings.HEALTH_CHECK_INTERVAL)
+
+    def start(self) -> None:
+        """Start the background health-check / file-reload loop"""
+        if self._health_task is None and settings.HEALTH_CHECK_INTERVAL > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+registry = ServiceRegistry(strategy=settings.LOAD_BALANCER_STRATEGY)
+registry.load_from_settings()
+
+# One pooled client for all upstream calls instead of a new connection per request
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE,
+            )
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def upstream_accept() -> str:
+    """Accept header for upstream calls whose body the gateway itself consumes"""
+    if settings.UPSTREAM_MSGPACK and msgpack is not None:
+        return f"{MSGPACK_MEDIA_TYPE}, {JSON_MEDIA_TYPE};q=0.9"
+    return JSON_MEDIA_TYPE
+
+def result_content(result: dict):
+    """Return the parsed body of a forward_request result, decoding the raw body if needed"""
+    if result.get("content") is None and result.get("raw"):
+        with span("decode"):
+            result["content"] = decode_body(
+                decompress(result["raw"], result["encoding"]), result["headers"].get("content-type")
+            )
+    return result.get("content")
+
+async def forward_request(service_url: str, path: str, method: str, headers: dict = None,
+                         params: dict = None, data: dict = None, json_data: dict = None,
+                         decode: bool = True, accept: Optional[str] = None):
+    """
+    Forward request to the appropriate microservice.
+
+    The result holds the status code, headers, the body exactly as received
+    ("raw", compressed with "encoding" if the upstream compressed it) and,
+    unless decode=False, the parsed "content". Callers that only relay the
+    body pass decode=False and can send "raw" on without touching it.
+
+    json_data is sent as msgpack when UPSTREAM_MSGPACK is on, so datetimes and
+    UUIDs travel as native types. Responses are requested as msgpack too
+    unless the caller passes its own `accept`, e.g. the client's, to relay.
+    """
+    # Nobody is waiting for an answer that would arrive past the deadline
+    budget = remaining()
+    if budget is not None and budget <= 0:
+        raise DeadlineExceeded()
+
+    # Upstream calls beyond the adaptive concurrency limit are shed with 503
+    async with concurrency_limiter.slot(route_template(method, path)) as sample:
+        try:
+            result = await _forward_request(
+                service_url, path, method, headers, params, data, json_data, decode, accept
+            )
+        except (DeadlineExceeded, NoInstanceAvailable):
+            # Neither says how loaded the upstream is
+            sample.discard()
+            raise
+        sample.status_code = result["status_code"]
+        return result
+
+async def _forward_request(service_url: str, path: str, method: str, headers: dict = None,
+                           params: dict = None, data: dict = None, json_data: dict = None,
+                           decode: bool = True, accept: Optional[str] = None):
+    service_name = registry.resolve(service_url)
+    instance = registry.acquire(service_name) if service_name else None
+    url = f"{instance.url if instance else service_url}{path}"
+    failed = False
+
     try:
-        print(f"API Gateway: Making request to URL: {url}")
-        print(f"API Gateway: Request payload: {json_data}")
-        
-        # Convert payload to JSON with custom serializer
+        logger.debug("Forwarding %s %s", method, url)
+
+        headers = {k: v for k, v in (headers or {}).items() if k.lower() not in MANAGED_HEADERS}
+        headers["Accept"] = accept or upstream_accept()
+
+        # Encode the payload once, natively typed in msgpack or as JSON
+        content = None
         if json_data is not None:
             if hasattr(json_data, 'dict'):
                 json_data = json_data.dict()
-            json_data = json.dumps(json_data, default=json_serializer)
-            json_data = json.loads(json_data)
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.request(
+            if settings.UPSTREAM_MSGPACK and msgpack is not None:
+                content = packb(json_data)
+                headers["Content-Type"] = MSGPACK_MEDIA_TYPE
+            else:
+                content = json.dumps(json_data, default=json_serializer).encode()
+                headers["Content-Type"] = JSON_MEDIA_TYPE
+
+        # Carry the trace ID so both services log the request under one ID
+        trace_id = get_trace_id()
+        if trace_id:
+            headers[TRACE_HEADER] = trace_id
+        # The task service skips or aborts work the caller will not wait for
+        deadline = deadline_header()
+        if deadline:
+            headers[DEADLINE_HEADER] = deadline
+        timeout = settings.UPSTREAM_TIMEOUT
+        budget = remaining()
+        if budget is not None:
+            timeout = max(0.001, min(timeout, budget))
+        # Ask for a compressed body; it is decompressed only if someone needs it
+        if settings.UPSTREAM_COMPRESSION:
+            headers["Accept-Encoding"] = ", ".join(SUPPORTED_ENCODINGS)
+        else:
+            headers["Accept-Encoding"] = "identity"
+
+        client = get_http_client()
+        started = _time.perf_counter()
+        with span("upstream"):
+            request = client.build_request(
                 method=method,
                 url=url,
                 headers=headers,
                 params=params,
                 data=data,
-                json=json_data,
-                timeout=10.0
+                content=content,
+                timeout=timeout
             )
-            print(f"Forwarded request to {url} with status code {response.status_code}")
-            
-            # Add response debug logging
-            print(f"API Gateway: Response status: {response.status_code}")
-            print(f"API Gateway: Response content: {response.content}")
-            
+            response = await client.send(request, stream=True)
             try:
-                return {
-                    "status_code": response.status_code,
-                    "content": response.json() if response.content else None,
-                    "headers": dict(response.headers)
-                }
-            except json.JSONDecodeError as e:
-                print(f"API Gateway: JSON decode error: {str(e)}")
-                print(f"API Gateway: Raw response content: {response.content}")
-                raise
+                raw = b"".join([chunk async for chunk in response.aiter_raw()])
+            finally:
+                await response.aclose()
+        UPSTREAM_REQUEST_DURATION.labels(
+            service_name or "direct", method, str(response.status_code)
+        ).observe(_time.perf_counter() - started)
+        failed = response.status_code >= 500
+        merge_server_timing(response.headers.get("server-timing"), service_name or "upstream")
+        logger.debug("Forwarded %s %s with status code %s", method, url, response.status_code)
+
+        try:
+            result = {
+                "status_code": response.status_code,
+                "content": None,
+                "headers": dict(response.headers),
+                "raw": raw,
+                "encoding": response.headers.get("content-encoding"),
+            }
+            if decode:
+                result_content(result)
+            return result
+        except ValueError as e:
+            logger.error("Decode error from %s: %s", url, e)
+            raise
+    except httpx.TimeoutException as exc:
+        budget = remaining()
+        if budget is not None and budget <= 0:
+            # Our own deadline ran out; the upstream is not at fault
+            logger.info("Upstream call abandoned at deadline: %s %s", method, url)
+            raise DeadlineExceeded()
+        failed = True
+        logger.warning("Upstream timed out in forward_request: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Upstream timeout: {str(exc)}"
+        )
+    except httpx.TransportError as exc:
+        failed = True
+        logger.warning("Upstream unreachable in forward_request: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Upstream error: {str(exc)}"
+        )
     except Exception as exc:
-        print(f"API Gateway: Error in forward_request: {str(exc)}")
+        logger.error("Error in forward_request: %s", exc)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Unexpected error: {str(exc)}"
         )
+    finally:
+        if instance is not None:
+            registry.release(service_name, instance, failed=failed)
@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+from datetime import datetime
+from typing import Optional, Set
+from app.core.config import settings
+from app.db.models import User
+from shared.log import get_logger
+from shared.wire import JSON_MEDIA_TYPE
+
+logger = get_logger("api_gateway.warming")
+
+# Must match the parameters /tasks/list builds from its defaults, so the
+# client's first listing hits the same response cache key
+FIRST_PAGE_PARAMS = {"sort_by": "created_at", "sort_order": "desc"}
+
+class CacheWarmer:
+    """
+    Fire-and-forget prefetch of what a user loads right after logging in.
+
+    The first task page goes into the response cache and the dashboard
+    sections into their section cache, so the first screen after login is
+    served warm. The first page is what matters, and only the optional
+    response cache can hold it, so warming is off unless
+    RESPONSE_CACHE_ENABLED is set too. Warm-ups run in the background with at most
+    LOGIN_WARMING_CONCURRENCY at a time; during a login storm, logins beyond
+    LOGIN_WARMING_MAX_PENDING are simply not warmed rather than queued, so
+    warming never adds more than a bounded load upstream.
+    """
+
+    def __init__(self):
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.scheduled = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.LOGIN_WARMING_ENABLED and settings.RESPONSE_CACHE_ENABLED
+
+    def start(self) -> None:
+        if settings.LOGIN_WARMING_ENABLED and not settings.RESPONSE_CACHE_ENABLED:
+            logger.warning("Login warming is off: it needs RESPONSE_CACHE_ENABLED to hold the first task page")
+
+    def schedule(self, user: User) -> bool:
+        """Start warming the user's caches without waiting for it"""
+        if not self.enabled:
+            return False
+        user_id = str(user.id)
+        if user_id in self._pending:
+            return False
+        if len(self._pending) >= settings.LOGIN_WARMING_MAX_PENDING:
+            self.dropped += 1
+            return False
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.LOGIN_WARMING_CONCURRENCY)
+        self._pending.add(user_id)
+        self.scheduled += 1
+        # A fresh context: the warm-up must not inherit the login request's
+        # deadline or count its upstream calls in the login's trace
+        task = contextvars.Context().run(asyncio.create_task, self._warm(user, user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _warm(self, user: User, user_id: str) -> None:
+        try:
+            async with self._semaphore:
+                await asyncio.wait_for(self._fetch(user), settings.LOGIN_WARMING_TIMEOUT)
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.warning("Could not warm caches for user %s: %s", user_id, e)
+        finally:
+            self._pending.discard(user_id)
+
+    async def _fetch(self, user: User) -> None:
+        # Imported here: both modules import app.api.auth, which schedules warm-ups
+        from app.api import dashboard, routes
+
+        now = datetime.utcnow().replace(microsecond=0).isoformat()
+        fetches = [dashboard._load_section(user, name, now) for name in dashboard.SECTIONS]
+        # Browsers ask for JSON; msgpack clients miss and fetch as usual
+        fetches.append(routes.fetch_task_list(user, dict(FIRST_PAGE_PARAMS), decode=False,
+                                              accept=JSON_MEDIA_TYPE))
+        results = await asyncio.gather(*fetches, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "scheduled": self.scheduled,
+            "dropped": self.dropped,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+cache_warmer = CacheWarmer()
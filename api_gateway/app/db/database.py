@@ -2,12 +2,15 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from shared.metrics import instrument_engine
 
 # Create SQLAlchemy engine
 engine = create_engine(
     settings.DATABASE_URL, connect_args={"check_same_thread": False}  # Only needed for SQLite
 )
 
+instrument_engine(engine, "api_gateway")
+
 # Create SessionLocal class for database sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
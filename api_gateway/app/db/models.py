@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime, time, timedelta
 from sqlalchemy import (
-    Boolean, Column, DateTime, ForeignKey, 
+    Boolean, Column, DateTime, ForeignKey, Integer,
     String, Time, Interval, Text, CheckConstraint, TypeDecorator, CHAR
 )
 from app.db.database import Base
@@ -61,3 +61,17 @@ class User(Base):
         CheckConstraint("reminder_notify_method IN ('email', 'push', 'sms')", name="chk_reminder_notify_method"),
         CheckConstraint("role IN ('admin', 'regular')", name="chk_role"),
     )
+
+class RevokedToken(Base):
+    """
+    A revoked access token (jti set) or all tokens of a user issued up to
+    revoked_at (jti NULL). Rows only matter until expires_at, after which
+    the tokens they cover have expired anyway.
+    """
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    jti = Column(String(64), index=True)
+    user_id = Column(GUID(), index=True)
+    revoked_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,31 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, validator
+
+class BatchSubRequest(BaseModel):
+    id: str
+    method: str = "GET"
+    path: str  # Relative to /api/v1, e.g. "/tasks/list"
+    params: Optional[Dict[str, Any]] = None
+    body: Optional[Dict[str, Any]] = None
+    depends_on: List[str] = []
+
+    @validator('method')
+    def validate_method(cls, v):
+        v = v.upper()
+        if v not in ['GET', 'POST', 'PUT', 'DELETE']:
+            raise ValueError('Method must be GET, POST, PUT or DELETE')
+        return v
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+
+    @validator('requests')
+    def validate_requests(cls, v):
+        if not v:
+            raise ValueError('A batch must contain at least one request')
+        return v
+
+class BatchSubResponse(BaseModel):
+    id: str
+    status_code: int
+    body: Any = None
@@ -0,0 +1,12 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+from app.schemas.users import User
+from shared.schemas.tasks import TaskResponse
+
+class Dashboard(BaseModel):
+    profile: User
+    upcoming: Optional[List[TaskResponse]] = None
+    overdue_count: Optional[int] = None
+    in_progress: Optional[List[TaskResponse]] = None
+    # Sections that could not be loaded, with the reason; the rest are still returned
+    errors: Dict[str, str] = {}
@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+from pydantic import BaseModel
+
+class TimeBlock(BaseModel):
+    start: datetime
+    end: datetime
+
+class ScheduledTask(BaseModel):
+    task_id: UUID
+    title: str
+    priority: str
+    deadline: Optional[datetime] = None
+    # Work periods, in order; a task runs across breaks and days when it does not fit in one
+    blocks: List[TimeBlock]
+    # Work left over past the end of the schedule
+    unplanned_minutes: int = 0
+    # Finishes after its deadline, or cannot be finished within the schedule before it
+    late: bool = False
+
+class Schedule(BaseModel):
+    start: datetime
+    end: datetime
+    # In the order they are worked on, which is also time order
+    tasks: List[ScheduledTask]
+    # Open tasks that get no time before the end of the schedule
+    unscheduled: List[UUID] = []
@@ -67,7 +67,7 @@ class User(UserBase):
     role: str
     
     class Config:
-        orm_mode = True
+        from_attributes = True  # Changed from orm_mode
 
 # Token schemas
 class Token(BaseModel):
@@ -90,6 +90,13 @@ class Token(BaseModel):
 class TokenPayload(BaseModel):
     sub: Optional[str] = None
     exp: Optional[int] = None
+    iat: Optional[int] = None
+    jti: Optional[str] = None
+
+# Admin revocation: a single token by jti, or every token of a user
+class RevokeRequest(BaseModel):
+    jti: Optional[str] = None
+    user_id: Optional[UUID] = None
 
 # Login schema
 class UserLogin(BaseModel):
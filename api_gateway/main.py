@@ -9,14 +9,27 @@ import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from app.api.routes import router as api_router
+from app.api import batch, dashboard, schedule
 from app.core.config import settings
+from app.core.service_registry import registry, close_http_client
+from app.core.coalescing import single_flight
+from app.core.rate_limit import concurrency_limiter
+from app.core.response_cache import response_cache
+from app.core.revocation import revocations
+from app.core.warming import cache_warmer
 from app.db.database import engine, Base
+from shared.events import task_events
+from shared.log import get_logger
+from shared.compression import CompressionMiddleware
+from shared.deadline import DeadlineMiddleware, parse_budgets
+from shared.metrics import REGISTRY, Gauge, install_metrics
+from shared.tracing import TracingMiddleware
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Debug: Print Python path
-print("Python path:", sys.path)
+logger = get_logger("api_gateway")
+logger.debug("Python path: %s", sys.path)
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -28,8 +41,72 @@ app = FastAPI(
     root_path="",
 )
 
+# Trace IDs, Server-Timing headers and sampled access logs
+app.add_middleware(TracingMiddleware, service="api_gateway")
+
+# Per-route deadlines passed upstream; client disconnects cancel the upstream call
+app.add_middleware(
+    DeadlineMiddleware,
+    service="api_gateway",
+    default_budget=settings.REQUEST_DEADLINE_DEFAULT,
+    budgets=parse_budgets(settings.REQUEST_DEADLINE_BUDGETS),
+)
+
+# Compress responses according to Accept-Encoding (gzip, or zstd when available)
+app.add_middleware(CompressionMiddleware)
+
 # Include API router
 app.include_router(api_router)
 
+# Batch and dashboard endpoints build on the handlers in app.api.routes, so they are mounted separately
+app.include_router(batch.router, prefix=settings.API_V1_STR)
+app.include_router(dashboard.router, prefix=settings.API_V1_STR)
+app.include_router(schedule.router, prefix=settings.API_V1_STR)
+
+# Prometheus /metrics endpoint and per-route latency histograms
+install_metrics(app, service="api_gateway")
+
+GATEWAY_STATS = Gauge("gateway_stat", "Coalescing, concurrency limiter, cache and event stream state", ["name"])
+
+def collect_gateway_stats():
+    for name, value in single_flight.stats().items():
+        GATEWAY_STATS.labels(f"coalescing_{name}").set(value)
+    for name, value in concurrency_limiter.stats().items():
+        GATEWAY_STATS.labels(f"concurrency_{name}").set(value or 0)
+    for name, value in dashboard.section_cache.stats().items():
+        GATEWAY_STATS.labels(f"dashboard_cache_{name}").set(value)
+    for name, value in revocations.revoked.stats().items():
+        GATEWAY_STATS.labels(f"revocation_{name}").set(value)
+    for name, value in response_cache.stats().items():
+        GATEWAY_STATS.labels(f"response_cache_{name}").set(value)
+    for name, value in task_events.hub.stats().items():
+        GATEWAY_STATS.labels(f"events_{name}").set(value)
+    for name, value in cache_warmer.stats().items():
+        GATEWAY_STATS.labels(f"warming_{name}").set(value)
+
+REGISTRY.add_collector(collect_gateway_stats)
+
+@app.on_event("startup")
+async def startup_event():
+    registry.start()
+    await revocations.start()
+    response_cache.start()
+    task_events.start()
+    cache_warmer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await registry.stop()
+    await revocations.stop()
+    await response_cache.stop()
+    await task_events.stop()
+    await cache_warmer.stop()
+    await close_http_client()
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="localhost", port=8000, reload=True)
\ No newline at end of file
+    if len(sys.argv) > 1:
+        # Production: python main.py --workers 4 [--mode reuseport] ..., see shared/serve.py
+        from shared.serve import cli
+        cli("main:app", os.path.dirname(os.path.abspath(__file__)), 8000)
+    else:
+        uvicorn.run("main:app", host="localhost", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,396 @@
+import sys
+import os
+
+# Add shared package to Python path
+shared_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, shared_path)
+
+import asyncio
+import json
+import signal
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, List, Optional, Set
+from broker import DEAD_LETTER_QUEUE, NOTIFICATIONS_QUEUE, Broker, BrokerError, Channel, Delivery, create_broker
+from digest import DIGEST_WINDOW_SECONDS, Digester
+from handlers import NotificationHandler, PermanentError, load_handlers
+from shared.log import get_logger
+from shared.metrics import Counter
+
+logger = get_logger("notification_service.consumer")
+
+# Unacked messages the broker may hand this consumer at once
+CONSUMER_PREFETCH = int(os.getenv("CONSUMER_PREFETCH", "256"))
+# AMQP's prefetch_count is a short
+MAX_PREFETCH = 65535
+# Notifications being delivered at once
+CONSUMER_CONCURRENCY = int(os.getenv("CONSUMER_CONCURRENCY", "64"))
+# Finished messages acknowledged with one frame, or sooner after CONSUMER_ACK_INTERVAL seconds
+CONSUMER_ACK_BATCH = int(os.getenv("CONSUMER_ACK_BATCH", "64"))
+CONSUMER_ACK_INTERVAL = float(os.getenv("CONSUMER_ACK_INTERVAL", "0.05"))
+# Attempts at a failing handler before the message is dead-lettered
+CONSUMER_MAX_ATTEMPTS = int(os.getenv("CONSUMER_MAX_ATTEMPTS", "3"))
+# Reminders remembered for duplicate suppression
+CONSUMER_DEDUP_SIZE = int(os.getenv("CONSUMER_DEDUP_SIZE", "100000"))
+# Used for messages without a notify_method
+CONSUMER_DEFAULT_METHOD = os.getenv("CONSUMER_DEFAULT_METHOD", "email")
+
+NOTIFICATIONS_CONSUMED = Counter(
+    "notifications_consumed_total",
+    "Notifications taken from the queue, by method and outcome: sent, digested, duplicate or dead_lettered",
+    ["method", "outcome"],
+)
+NOTIFICATION_HANDLER_RETRIES = Counter(
+    "notification_handler_retries_total", "Handler failures retried", ["method"]
+)
+DIGESTS_UNSENT = Counter(
+    "notification_digests_unsent_total", "Digests neither sent nor dead-lettered, left for redelivery",
+    ["method"],
+)
+
+class DedupCache:
+    """
+    The most recent `size` keys handled, evicted oldest first.
+
+    Redeliveries and republished reminders arrive close to the original, so
+    a bounded window catches them in O(1) time and fixed memory.
+    """
+
+    def __init__(self, size: int = CONSUMER_DEDUP_SIZE):
+        self.size = size
+        self._keys: "OrderedDict[Hashable, None]" = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._keys
+
+    def add(self, key: Hashable) -> None:
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.size:
+            self._keys.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        self._keys.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+class NotificationConsumer:
+    """
+    Delivers the notifications in task_notifications through the handler of
+    each message's notify_method.
+
+    The broker hands over up to `prefetch` messages, and `concurrency`
+    workers deliver them. Acks are sent as one `multiple` ack up to the
+    newest message before which every message is done, once `ack_batch`
+    are done or every `ack_interval` seconds. A reminder is identified by
+    (task_id, fire_at); one already handled by this consumer is acked
+    without being sent again. A reminder counts as handled only once it
+    has been sent, held for a digest or dead-lettered, so a copy
+    redelivered after a failure is never mistaken for a duplicate; a copy
+    arriving while another is being handled waits for its outcome.
+
+    With DIGEST_WINDOW_SECONDS set, reminders that name their user are
+    held in a Digester and go out per user and channel as one message,
+    within the user's working hours. A held reminder stays unacked until
+    its digest is sent or dead-lettered, so a crash loses none of them:
+    the messages done behind it are acked one by one instead of with a
+    `multiple` ack, and the prefetch is raised to leave room for the
+    Digester's `max_pending` beside the workers' share (capped at AMQP's
+    65535, with `max_pending` lowered to fit). After a lost channel the
+    held reminders are dropped and held again when redelivered. On stop()
+    digests that may go out are sent; the reminders of users outside their
+    working hours are left unacked, for the broker to redeliver.
+
+    Messages that cannot be parsed, name an unknown method, fail with
+    PermanentError, keep failing for CONSUMER_MAX_ATTEMPTS attempts or
+    break processing itself are republished, with the reason, to
+    task_notifications.dead and then acked, so one bad message cannot be
+    redelivered forever or hold up the acks of the messages behind it.
+    """
+
+    def __init__(self, broker: Broker, handlers: Dict[str, NotificationHandler] = None,
+                 prefetch: int = CONSUMER_PREFETCH, concurrency: int = CONSUMER_CONCURRENCY,
+                 ack_batch: int = CONSUMER_ACK_BATCH, ack_interval: float = CONSUMER_ACK_INTERVAL,
+                 dedup: DedupCache = None, digester: Optional[Digester] = None):
+        self.broker = broker
+        self.handlers = handlers if handlers is not None else load_handlers()
+        self.prefetch = prefetch
+        self.concurrency = concurrency
+        self.ack_batch = ack_batch
+        self.ack_interval = ack_interval
+        self.dedup = dedup or DedupCache()
+        if digester is None and DIGEST_WINDOW_SECONDS > 0:
+            digester = Digester()
+        if digester is not None:
+            # Held reminders stay unacked, and each takes up a place in the prefetch
+            self.prefetch = min(max(prefetch, digester.max_pending + concurrency), MAX_PREFETCH)
+            digester.max_pending = min(digester.max_pending, self.prefetch - concurrency)
+        self.digester = digester
+        self.stats = {"sent": 0, "digested": 0, "duplicate": 0, "dead_lettered": 0, "retried": 0, "acks": 0}
+        self._channel: Optional[Channel] = None
+        self._deliveries: Optional[asyncio.Queue] = None
+        self._order: Deque[int] = deque()  # Delivery tags not yet acked, in delivery order
+        self._done: Set[int] = set()
+        self._held: Set[int] = set()  # Held for a digest, acked once it is sent
+        self._acked: Set[int] = set()  # Acked on their own, behind a held one
+        self._handling: Dict[Hashable, asyncio.Event] = {}  # Reminders being handled, by dedup key
+        self._active = 0  # Messages being processed
+        self._workers: List[asyncio.Task] = []
+        self._supervisor: Optional[asyncio.Task] = None
+        self._releaser: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._deliveries = asyncio.Queue()
+        await self._connect()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._supervisor = asyncio.create_task(self._supervise())
+        if self.digester is not None:
+            self._releaser = asyncio.create_task(self._release_digests())
+
+    async def _connect(self) -> None:
+        backoff = 0.1
+        while True:
+            try:
+                if not self.broker.is_open:
+                    await self.broker.connect()
+                channel = await self.broker.channel()
+                # Delivery tags belong to a channel: forget the old channel's
+                self._order.clear()
+                self._done.clear()
+                self._held.clear()
+                self._acked.clear()
+                if self.digester is not None:
+                    # Held reminders come back unacked, and are held again then
+                    for _, _, key in self.digester.forget():
+                        if key is not None:
+                            self.dedup.discard(key)
+                self._channel = channel
+                await channel.consume(NOTIFICATIONS_QUEUE, self.prefetch,
+                                      lambda delivery: self._on_message(channel, delivery))
+                logger.info("Consuming %s, prefetch %d, concurrency %d",
+                            NOTIFICATIONS_QUEUE, self.prefetch, self.concurrency)
+                return
+            except (BrokerError, OSError) as e:
+                logger.warning("Could not start consuming, retrying in %.1fs: %s", backoff, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+
+    def _on_message(self, channel: Channel, delivery: Delivery) -> None:
+        if channel is self._channel:
+            self._order.append(delivery.tag)
+            self._deliveries.put_nowait((channel, delivery))
+
+    async def _supervise(self) -> None:
+        """Flush acks on a timer, and reconnect when the channel is lost"""
+        while True:
+            await asyncio.sleep(self.ack_interval)
+            if self._channel.is_open:
+                self._flush()
+            else:
+                logger.warning("Lost the broker channel; unacked messages will be redelivered")
+                await self._connect()
+
+    async def _work(self) -> None:
+        while True:
+            channel, delivery = await self._deliveries.get()
+            if channel is not self._channel:
+                continue  # Redelivered on the new channel
+            self._active += 1
+            settled = True
+            try:
+                settled = await self._process(channel, delivery)
+            except Exception as e:
+                # Set aside, so neither this worker nor the acks behind the message are stuck on it
+                logger.exception("Could not process a notification")
+                await self._dead_letter(channel, delivery.body, f"{type(e).__name__}: {e}", "unknown")
+            finally:
+                self._active -= 1
+            if settled and channel is self._channel:
+                self._settle(delivery.tag)
+
+    def _settle(self, tag: int) -> None:
+        self._done.add(tag)
+        if len(self._done) >= self.ack_batch:
+            self._flush()
+
+    async def _process(self, channel: Channel, delivery: Delivery) -> bool:
+        """Deliver the message; False while it is held for a digest, and not to be acked yet"""
+        try:
+            notification = json.loads(delivery.body)
+        except ValueError:
+            notification = None
+        if not isinstance(notification, dict) or "task_id" not in notification or "message" not in notification:
+            await self._dead_letter(channel, delivery.body, "malformed", "unknown")
+            return True
+        method = notification.get("notify_method") or CONSUMER_DEFAULT_METHOD
+        handler = self.handlers.get(method)
+        if handler is None:
+            await self._dead_letter(channel, delivery.body, f"no handler for {method!r}", method)
+            return True
+        held = self.digester is not None and bool(notification.get("user_id"))
+        # Messages from before reminders carried their instant cannot be told apart
+        fire_at = notification.get("fire_at")
+        if fire_at is None:
+            await self._handle(channel, delivery, notification, method, handler, None)
+            return not held
+        key = (notification["task_id"], fire_at)
+        # A copy already being handled decides whether this one is a duplicate
+        while key in self._handling:
+            await self._handling[key].wait()
+        if key in self.dedup:
+            self.stats["duplicate"] += 1
+            NOTIFICATIONS_CONSUMED.labels(method, "duplicate").inc()
+            return True
+        self._handling[key] = asyncio.Event()
+        try:
+            if await self._handle(channel, delivery, notification, method, handler, key):
+                self.dedup.add(key)
+        finally:
+            self._handling.pop(key).set()
+        return not held
+
+    async def _handle(self, channel: Channel, delivery: Delivery, notification: dict, method: str,
+                      handler: NotificationHandler, key: Optional[Hashable]) -> bool:
+        """Send, hold or dead-letter the notification; False if it is left to be redelivered"""
+        if self.digester is not None and notification.get("user_id"):
+            # Settled with its digest, through the token
+            self._held.add(delivery.tag)
+            self.digester.add(method, notification, (channel, delivery.tag, key))
+            self.stats["digested"] += 1
+            NOTIFICATIONS_CONSUMED.labels(method, "digested").inc()
+            return True
+        reason = await self._send(handler, method, notification)
+        return reason is None or await self._dead_letter(channel, delivery.body, reason, method)
+
+    async def _send(self, handler: NotificationHandler, method: str, notification: dict) -> Optional[str]:
+        """Deliver through the handler, retrying failures; the reason it gave up, or None once sent"""
+        for attempt in range(1, CONSUMER_MAX_ATTEMPTS + 1):
+            try:
+                await handler.send(notification)
+                self.stats["sent"] += 1
+                NOTIFICATIONS_CONSUMED.labels(method, "sent").inc()
+                return None
+            except PermanentError as e:
+                return str(e)
+            except Exception as e:
+                if attempt == CONSUMER_MAX_ATTEMPTS:
+                    return f"{type(e).__name__}: {e}"
+                self.stats["retried"] += 1
+                NOTIFICATION_HANDLER_RETRIES.labels(method).inc()
+                await asyncio.sleep(0.1 * 2 ** attempt)
+
+    async def _send_digests(self, digests: list) -> None:
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def send(method: str, message: dict, tokens: list) -> None:
+            async with limit:
+                reason = await self._send(self.handlers[method], method, message)
+            if reason is not None and not await self._dead_letter(
+                    self._channel, json.dumps(message).encode(), reason, method):
+                logger.error("Could not send or dead-letter a digest of %d reminders; "
+                             "they will be redelivered", len(tokens))
+                DIGESTS_UNSENT.labels(method).inc()
+                for _, _, key in tokens:
+                    if key is not None:
+                        self.dedup.discard(key)
+                return
+            for channel, tag, _ in tokens:
+                if channel is self._channel:
+                    self._held.discard(tag)
+                    self._settle(tag)
+
+        await asyncio.gather(*(send(*digest) for digest in digests))
+
+    async def _release_digests(self) -> None:
+        while True:
+            await asyncio.sleep(1)
+            digests = self.digester.take_due()
+            if digests:
+                await self._send_digests(digests)
+
+    async def _dead_letter(self, channel: Channel, original: bytes, reason: str, method: str) -> bool:
+        """Republish to the dead-letter queue; False if the channel was lost first"""
+        body = json.dumps({"reason": reason, "body": original.decode("utf-8", "replace")}).encode()
+        try:
+            # Acked only once the dead letter is confirmed, so it is never lost in between
+            while not await channel.publish(DEAD_LETTER_QUEUE, body):
+                await asyncio.sleep(0.1)
+        except BrokerError:
+            return False  # Redelivered with the rest when the channel comes back
+        logger.warning("Dead-lettered a notification: %s", reason)
+        self.stats["dead_lettered"] += 1
+        NOTIFICATIONS_CONSUMED.labels(method, "dead_lettered").inc()
+        return True
+
+    def _flush(self) -> None:
+        """
+        Ack every message up to the newest one with all those before it
+        done; behind a reminder held for a digest, ack each done one alone.
+        """
+        newest = None
+        while self._order and (self._order[0] in self._done or self._order[0] in self._acked):
+            tag = self._order.popleft()
+            if tag in self._acked:
+                self._acked.discard(tag)
+            else:
+                self._done.discard(tag)
+                newest = tag
+        try:
+            if newest is not None:
+                self._channel.ack(newest, multiple=True)
+                self.stats["acks"] += 1
+            if self._order and self._order[0] in self._held:
+                # A multiple ack would take the held reminder with it
+                for tag in self._done:
+                    self._channel.ack(tag)
+                    self.stats["acks"] += 1
+                self._acked |= self._done
+                self._done.clear()
+        except BrokerError:
+            pass  # The supervisor reconnects; the broker redelivers what was not acked
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Finish the notifications being delivered, ack them, and disconnect"""
+        for task in (self._supervisor, self._releaser):
+            if task is not None:
+                task.cancel()
+        # Messages not started yet are left unacked, and the broker redelivers them
+        while not self._deliveries.empty():
+            self._deliveries.get_nowait()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._active and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, *filter(None, [self._supervisor, self._releaser]),
+                             return_exceptions=True)
+        if self._channel is not None and self._channel.is_open:
+            if self.digester is not None:
+                await self._drain_digests(max(deadline - loop.time(), 1.0))
+            self._flush()
+            await self._channel.close()
+        await self.broker.close()
+
+    async def _drain_digests(self, timeout: float) -> None:
+        ready, held = self.digester.drain()
+        try:
+            await asyncio.wait_for(self._send_digests(ready), timeout)
+        except asyncio.TimeoutError:
+            logger.error("Timed out sending digests at shutdown")
+        # Quiet-hours reminders stay unacked, and the broker redelivers them once the channel closes
+        logger.info("Sent %d digests at shutdown; %d held reminders left for redelivery", len(ready), len(held))
+
+async def main() -> None:
+    consumer = NotificationConsumer(create_broker())
+    await consumer.start()
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    await stopping.wait()
+    logger.info("Stopping consumer: %s", consumer.stats)
+    await consumer.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,195 @@
+import heapq
+import itertools
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from shared.metrics import Counter, Gauge
+
+# Reminders for one user and channel within this many seconds go out as one digest; 0 disables
+DIGEST_WINDOW_SECONDS = float(os.getenv("DIGEST_WINDOW_SECONDS", "300"))
+# A digest is sent as soon as it holds this many reminders
+DIGEST_MAX_ITEMS = int(os.getenv("DIGEST_MAX_ITEMS", "50"))
+# Reminders held across all digests; past it the oldest digest is sent early. Held reminders
+# stay unacked, so the consumer also keeps this within its prefetch, which is at most 65535
+DIGEST_MAX_PENDING = int(os.getenv("DIGEST_MAX_PENDING", "50000"))
+
+DIGESTS_SENT = Counter(
+    "notification_digests_total", "Messages sent for held reminders, by why they were released",
+    ["reason"],
+)
+DIGEST_PENDING = Gauge(
+    "notification_digest_pending", "Reminders held for a digest"
+)
+
+def _seconds(clock: Optional[str]) -> Optional[int]:
+    """"HH:MM[:SS]" to seconds after midnight; None for anything else"""
+    if not isinstance(clock, str):
+        return None
+    parts = clock.split(":")
+    if len(parts) not in (2, 3) or not all(p.isascii() and p.isdigit() for p in parts):
+        return None
+    hours, minutes, seconds = int(parts[0]), int(parts[1]), int(parts[2]) if len(parts) == 3 else 0
+    if hours > 23 or minutes > 59 or seconds > 59:
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+def working_hours(notification: dict) -> Optional[Tuple[int, int]]:
+    """The user's (daily_start_time, daily_end_time) in seconds after midnight, if both are known"""
+    start = _seconds(notification.get("daily_start_time"))
+    end = _seconds(notification.get("daily_end_time"))
+    if start is None or end is None or start == end:
+        return None
+    return start, end
+
+def next_working_time(at: float, hours: Optional[Tuple[int, int]]) -> float:
+    """`at` if it is within the working hours, else when they next begin; local time, like the gateway's"""
+    if hours is None:
+        return at
+    start, end = hours
+    moment = datetime.fromtimestamp(at)
+    now = moment.hour * 3600 + moment.minute * 60 + moment.second
+    # Hours may run past midnight, e.g. 22:00 to 06:00
+    working = start <= now < end if start < end else now >= start or now < end
+    if working:
+        return at
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    begins = midnight + timedelta(seconds=start)
+    if begins <= moment:
+        begins += timedelta(days=1)
+    return begins.timestamp()
+
+class _Digest:
+    __slots__ = ("user_id", "method", "items", "tokens", "seq", "hours")
+
+    def __init__(self, user_id: str, method: str, seq: int, hours: Optional[Tuple[int, int]]):
+        self.user_id = user_id
+        self.method = method
+        self.items: List[dict] = []
+        self.tokens: List[Any] = []
+        self.seq = seq
+        self.hours = hours
+
+class Digester:
+    """
+    Holds reminders per (user, channel) and releases them as one message.
+
+    The first reminder for a user and channel opens a digest that is
+    released `window` seconds later, or, if that falls outside the user's
+    working hours, when they next begin. Reminders arriving meanwhile join
+    it. A digest of one reminder is released as that reminder; larger ones
+    as a single message listing them all. Each reminder may carry a token,
+    given back with its digest, with which the caller settles the
+    reminder once the digest is sent.
+
+    Memory is bounded: a digest is released early once it holds
+    `max_items`, and when more than `max_pending` reminders are held the
+    oldest digest is released early, working hours or not.
+    """
+
+    def __init__(self, window: float = DIGEST_WINDOW_SECONDS, max_items: int = DIGEST_MAX_ITEMS,
+                 max_pending: int = DIGEST_MAX_PENDING, clock: Callable[[], float] = time.time):
+        self.window = window
+        self.max_items = max_items
+        self.max_pending = max_pending
+        self.clock = clock
+        self.pending = 0
+        self.held = 0  # Reminders taken in
+        self.released = 0  # Messages given back
+        self._digests: "OrderedDict[Tuple[str, str], _Digest]" = OrderedDict()  # Oldest first
+        self._schedule: List[Tuple[float, int, Tuple[str, str]]] = []  # (release_at, seq, key) heap
+        self._seq = itertools.count()
+        self._ready: List[Tuple[str, dict, list]] = []  # Released early, waiting for take_due()
+
+    def add(self, method: str, notification: dict, token: Any = None) -> None:
+        key = (notification["user_id"], method)
+        digest = self._digests.get(key)
+        if digest is None:
+            hours = working_hours(notification)
+            release_at = next_working_time(self.clock() + self.window, hours)
+            digest = self._digests[key] = _Digest(key[0], method, next(self._seq), hours)
+            heapq.heappush(self._schedule, (release_at, digest.seq, key))
+        digest.items.append(notification)
+        digest.tokens.append(token)
+        self.pending += 1
+        self.held += 1
+        if len(digest.items) >= self.max_items:
+            self._ready.append(self._release(key, "full"))
+        while self.pending > self.max_pending:
+            self._ready.append(self._release(next(iter(self._digests)), "memory"))
+        DIGEST_PENDING.set(self.pending)
+
+    def _release(self, key: Tuple[str, str], reason: str) -> Tuple[str, dict, list]:
+        digest = self._digests.pop(key)
+        self.pending -= len(digest.items)
+        self.released += 1
+        DIGESTS_SENT.labels(reason).inc()
+        return digest.method, self._message(digest), digest.tokens
+
+    def _message(self, digest: _Digest) -> dict:
+        if len(digest.items) == 1:
+            return digest.items[0]
+        lines = "\n".join(f"- {item['message']}" for item in digest.items)
+        first = digest.items[0]
+        return {
+            "task_id": None,
+            "user_id": digest.user_id,
+            "notify_method": digest.method,
+            "message": f"You have {len(digest.items)} reminders:\n{lines}",
+            "daily_start_time": first.get("daily_start_time"),
+            "daily_end_time": first.get("daily_end_time"),
+            "digest": digest.items,
+        }
+
+    def take_due(self, now: Optional[float] = None) -> List[Tuple[str, dict, list]]:
+        """(method, message, tokens) for every digest due by `now`"""
+        now = self.clock() if now is None else now
+        ready, self._ready = self._ready, []
+        while self._schedule and self._schedule[0][0] <= now:
+            _, seq, key = heapq.heappop(self._schedule)
+            digest = self._digests.get(key)
+            # Entries for digests already released early, or reopened since, are skipped
+            if digest is not None and digest.seq == seq:
+                ready.append(self._release(key, "window"))
+        DIGEST_PENDING.set(self.pending)
+        return ready
+
+    def drain(self, now: Optional[float] = None) -> Tuple[List[Tuple[str, dict, list]], list]:
+        """
+        Empty the digester, at shutdown: returns the digests that may be sent
+        now, and the tokens of the reminders of users outside their working
+        hours, which are not to be sent.
+        """
+        now = self.clock() if now is None else now
+        ready, self._ready = self._ready, []
+        held = []
+        for key, digest in list(self._digests.items()):
+            if next_working_time(now, digest.hours) <= now:
+                ready.append(self._release(key, "shutdown"))
+            else:
+                del self._digests[key]
+                self.pending -= len(digest.items)
+                held.extend(digest.tokens)
+        self._schedule = []
+        DIGEST_PENDING.set(self.pending)
+        return ready, held
+
+    def forget(self) -> list:
+        """Drop every reminder held or released but not taken yet; returns their tokens"""
+        tokens = [token for _, _, released in self._ready for token in released]
+        for digest in self._digests.values():
+            tokens.extend(digest.tokens)
+        self._digests.clear()
+        self._schedule = []
+        self._ready = []
+        self.pending = 0
+        DIGEST_PENDING.set(0)
+        return tokens
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    def stats(self) -> Dict[str, int]:
+        return {"digests": len(self._digests), "pending": self.pending, "held": self.held,
+                "released": self.released}
@@ -0,0 +1,67 @@
+import asyncio
+import importlib
+import os
+from collections import deque
+from typing import Deque, Dict, Optional
+from shared.log import get_logger
+
+logger = get_logger("notification_service.handlers")
+
+# The values of the gateway's User.reminder_notify_method
+NOTIFY_METHODS = ("email", "push", "sms")
+# Notifications a FakeHandler remembers, the most recent ones
+FAKE_HANDLER_KEEP = int(os.getenv("FAKE_HANDLER_KEEP", "1000"))
+
+class PermanentError(Exception):
+    """The notification can never be delivered, e.g. no address for the user: do not retry it"""
+
+class NotificationHandler:
+    """Delivers notifications over one channel; raise PermanentError for ones that can never succeed"""
+
+    async def send(self, notification: dict) -> None:
+        raise NotImplementedError
+
+class FakeHandler(NotificationHandler):
+    """
+    Records notifications instead of delivering them, for local runs, tests
+    and benchmarks. `latency` simulates the provider's response time and
+    `fail_next()` makes the next sends raise. Only the last `keep` are
+    kept in `sent`; None keeps them all.
+    """
+
+    def __init__(self, method: str, latency: float = 0.0, keep: Optional[int] = FAKE_HANDLER_KEEP):
+        self.method = method
+        self.latency = latency
+        self.sent: Deque[dict] = deque(maxlen=keep)
+        self._failures = 0
+
+    def fail_next(self, count: int = 1) -> None:
+        self._failures += count
+
+    async def send(self, notification: dict) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._failures:
+            self._failures -= 1
+            raise ConnectionError(f"Fake {self.method} provider unavailable")
+        self.sent.append(notification)
+
+def load_handlers() -> Dict[str, NotificationHandler]:
+    """
+    One handler per notify method. NOTIFY_HANDLER_EMAIL (and _PUSH, _SMS)
+    name a handler class as "module:Class", constructed without arguments;
+    methods without one use a FakeHandler.
+    """
+    handlers = {}
+    for method in NOTIFY_METHODS:
+        path = os.getenv(f"NOTIFY_HANDLER_{method.upper()}")
+        if path:
+            module, _, name = path.partition(":")
+            handlers[method] = getattr(importlib.import_module(module), name)()
+        else:
+            handlers[method] = FakeHandler(method)
+    fakes = [method for method, handler in handlers.items() if isinstance(handler, FakeHandler)]
+    if fakes:
+        logger.warning("No NOTIFY_HANDLER_* set for %s: those notifications are recorded, not delivered",
+                       ", ".join(fakes))
+    return handlers
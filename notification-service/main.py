@@ -1,29 +1,103 @@
-from fastapi import FastAPI, BackgroundTasks
-from pydantic import BaseModel
-from datetime import datetime, timedelta
-from . import notify
+import sys
+import os
+
+# Add shared package to Python path
+shared_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, shared_path)
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, validator
+from datetime import datetime, time, timedelta
+from typing import Optional, Union
+from shared.metrics import install_metrics
+import notify
+from reminders import REMINDER_LEAD_SECONDS, reminder_scheduler
 
 app = FastAPI()
-notification_sender = notify.NotificationSender()
+notification_sender = notify.notification_sender
+
+# Prometheus /metrics endpoint and per-route latency histograms
+install_metrics(app, service="notification_service")
+
+DUE_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 class NotificationRequest(BaseModel):
-    task_id: int
+    task_id: Union[int, str]
     due_date: str
+    # When to remind; REMINDER_LEAD_SECONDS before due_date if not given
+    reminder_time: Optional[str] = None
+    user_id: Optional[str] = None
+    # The user's reminder_notify_method, which picks the consumer's handler
+    notify_method: Optional[str] = None
+    # The user's working hours; reminders outside them are held back as a digest
+    daily_start_time: Optional[time] = None
+    daily_end_time: Optional[time] = None
+
+    @validator('notify_method')
+    def validate_notify_method(cls, v):
+        if v is not None and v not in ['email', 'push', 'sms']:
+            raise ValueError('Notification method must be email, push, or sms')
+        return v
+
+def _seconds(clock: Optional[time]) -> Optional[int]:
+    return None if clock is None else clock.hour * 3600 + clock.minute * 60 + clock.second
 
 @app.post("/send-notification/")
-def send_notification(notification: NotificationRequest, background_tasks: BackgroundTasks):
-    due_date = datetime.strptime(notification.due_date, "%Y-%m-%d %H:%M:%S")
+async def send_notification(notification: NotificationRequest):
+    """Schedule the task's reminder, replacing any it had: call again when the deadline or reminder_time changes"""
+    task_id = str(notification.task_id)
+    try:
+        due_date = datetime.strptime(notification.due_date, DUE_DATE_FORMAT)
+        reminder_time = (
+            datetime.strptime(notification.reminder_time, DUE_DATE_FORMAT) if notification.reminder_time
+            else due_date - timedelta(seconds=REMINDER_LEAD_SECONDS)
+        )
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"Dates must be formatted as {DUE_DATE_FORMAT}")
     current_time = datetime.now()
 
     time_diff = (due_date - current_time).total_seconds()
 
     if time_diff > 0:
-        # Simulate sending a notification in the future (e.g., reminder 1 hour before due date)
-        background_tasks.add_task(notification_sender.send_notification, notification.task_id, f"Reminder: Task {notification.task_id} is due in {time_diff / 3600:.1f} hours.")
-        return {"message": "Notification scheduled successfully."}
+        # A reminder time already past fires on the next second
+        reminder_scheduler.schedule(task_id, int(reminder_time.timestamp()), int(due_date.timestamp()),
+                                    notification.user_id, notification.notify_method,
+                                    _seconds(notification.daily_start_time), _seconds(notification.daily_end_time))
+        return {"message": "Notification scheduled successfully.",
+                "reminder_time": max(reminder_time, current_time).strftime(DUE_DATE_FORMAT)}
     else:
+        reminder_scheduler.cancel(task_id)
         return {"message": "Task is overdue, no notification sent."}
 
+@app.get("/reminders/{task_id}")
+def get_reminder(task_id: str):
+    reminder = reminder_scheduler.store.get(task_id)
+    if reminder is None:
+        raise HTTPException(status_code=404, detail="No pending reminder")
+    _, fire_at, due_at, user_id, notify_method, _, _ = reminder
+    return {
+        "task_id": task_id,
+        "reminder_time": datetime.fromtimestamp(fire_at).strftime(DUE_DATE_FORMAT),
+        "due_date": datetime.fromtimestamp(due_at).strftime(DUE_DATE_FORMAT),
+        "user_id": user_id,
+        "notify_method": notify_method,
+    }
+
+@app.delete("/reminders/{task_id}")
+def cancel_reminder(task_id: str):
+    """Cancel a task's pending reminder, e.g. when the task is done or deleted"""
+    if not reminder_scheduler.cancel(task_id):
+        raise HTTPException(status_code=404, detail="No pending reminder")
+    return {"message": "Reminder cancelled."}
+
+@app.on_event("startup")
+async def startup_event():
+    await notification_sender.start()
+    await reminder_scheduler.start()
+
 @app.on_event("shutdown")
-def shutdown_event():
-    notification_sender.close()
+async def shutdown_event():
+    await reminder_scheduler.stop()
+    # Publishes what is still buffered before disconnecting
+    await notification_sender.close()
+    reminder_scheduler.close()
@@ -1,28 +1,48 @@
-import pika
+import asyncio
 import json
-import time
+from broker import NOTIFICATIONS_QUEUE, create_broker
+from publisher import AsyncPublisher
+from shared.log import get_logger
+
+logger = get_logger("notification_service.notify")
 
 class NotificationSender:
-    def __init__(self):
-        self.connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
-        self.channel = self.connection.channel()
+    """Publishes task notifications through an AsyncPublisher, without blocking the event loop"""
+
+    def __init__(self, publisher: AsyncPublisher = None):
+        self.publisher = publisher or AsyncPublisher(create_broker())
+
+    async def start(self):
+        await self.publisher.start()
 
-        self.channel.queue_declare(queue='task_notifications', durable=True)
+    async def send_notification(self, task_id, message: str, **details) -> asyncio.Future:
+        """
+        Queue a notification. Waits only while the outbound buffer is full;
+        await the returned future to wait for the broker's confirm.
 
-    def send_notification(self, task_id: int, message: str):
+        `details` that are not None are added to the message: for reminders
+        fire_at, their scheduled instant, which identifies them across
+        redeliveries, and the user_id, notify_method and working hours
+        (daily_start_time, daily_end_time) the consumer delivers by.
+        """
         notification_data = {
             "task_id": task_id,
             "message": message
         }
-        self.channel.basic_publish(
-            exchange='',
-            routing_key='task_notifications',
-            body=json.dumps(notification_data),
-            properties=pika.BasicProperties(
-                delivery_mode=2,  # make message persistent
-            )
-        )
-        print(f"Notification sent for Task {task_id}: {message}")
-
-    def close(self):
-        self.connection.close()
+        notification_data.update((k, v) for k, v in details.items() if v is not None)
+        body = json.dumps(notification_data).encode()
+        confirmed = await self.publisher.publish(body, NOTIFICATIONS_QUEUE)
+        confirmed.add_done_callback(lambda f: self._log_result(task_id, f))
+        return confirmed
+
+    @staticmethod
+    def _log_result(task_id: int, confirmed: asyncio.Future):
+        if confirmed.cancelled() or confirmed.exception() is not None:
+            logger.error("Notification for Task %s was not published", task_id)
+        else:
+            logger.debug("Notification sent for Task %s", task_id)
+
+    async def close(self):
+        await self.publisher.close()
+
+notification_sender = NotificationSender()
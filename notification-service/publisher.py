@@ -0,0 +1,177 @@
+import asyncio
+import os
+from typing import List, Optional
+from broker import Broker, BrokerError, NOTIFICATIONS_QUEUE
+from shared.log import get_logger
+from shared.metrics import Counter, Gauge
+
+logger = get_logger("notification_service.publisher")
+
+# Channels publishing concurrently over the one connection
+PUBLISH_CHANNELS = int(os.getenv("PUBLISH_CHANNELS", "4"))
+# Messages a channel publishes before waiting for their confirms together
+PUBLISH_CONFIRM_WINDOW = int(os.getenv("PUBLISH_CONFIRM_WINDOW", "100"))
+# Messages waiting for a channel; publish() waits for room beyond this
+PUBLISH_BUFFER_SIZE = int(os.getenv("PUBLISH_BUFFER_SIZE", "10000"))
+PUBLISH_CONFIRM_TIMEOUT = float(os.getenv("PUBLISH_CONFIRM_TIMEOUT", "10.0"))
+# Nacked messages are retried this many times before publish() fails
+PUBLISH_MAX_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS", "5"))
+
+NOTIFICATIONS_PUBLISHED = Counter(
+    "notifications_published_total", "Notifications published to RabbitMQ", ["queue"]
+)
+PUBLISH_RETRIES = Counter(
+    "notification_publish_retries_total", "Publishes retried, by reason: nack or connection", ["reason"]
+)
+PUBLISH_BUFFERED = Gauge(
+    "notification_publish_buffered", "Messages waiting in the outbound buffer"
+)
+
+class PublishError(Exception):
+    """The broker kept refusing the message"""
+
+class _Message:
+    __slots__ = ("routing_key", "body", "future", "attempts")
+
+    def __init__(self, routing_key: str, body: bytes, future: asyncio.Future):
+        self.routing_key = routing_key
+        self.body = body
+        self.future = future
+        self.attempts = 0
+
+class AsyncPublisher:
+    """
+    Publishes messages from asyncio code without blocking the event loop.
+
+    publish() puts the message in a bounded buffer and returns a future
+    that resolves once the broker has confirmed it. When the buffer is full
+    publish() waits for room, so a slow or unreachable broker slows callers
+    down instead of growing memory: at most PUBLISH_BUFFER_SIZE messages
+    wait, plus one confirm window per channel in flight.
+
+    PUBLISH_CHANNELS workers each own a channel on one shared connection.
+    A worker takes up to PUBLISH_CONFIRM_WINDOW messages, publishes them
+    all, then awaits their confirms together, so the broker round trip is
+    paid once per window rather than once per message. Nacked messages
+    are retried; when the connection drops, the window is published again
+    once a worker has reconnected, with exponential backoff. Delivery is
+    at least once: a message may be published twice if the connection drops
+    before its confirm arrives.
+    """
+
+    def __init__(self, broker: Broker, channels: int = PUBLISH_CHANNELS, window: int = PUBLISH_CONFIRM_WINDOW,
+                 buffer_size: int = PUBLISH_BUFFER_SIZE):
+        self.broker = broker
+        self.channels = channels
+        self.window = window
+        self._buffer: Optional[asyncio.Queue] = None
+        self.buffer_size = buffer_size
+        self._workers: List[asyncio.Task] = []
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._inflight = 0  # Messages taken from the buffer and not yet confirmed or failed
+        self.published = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._buffer = asyncio.Queue(self.buffer_size)
+        self._connect_lock = asyncio.Lock()
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.channels)]
+
+    async def publish(self, body: bytes, routing_key: str = NOTIFICATIONS_QUEUE) -> asyncio.Future:
+        """Queue a message, waiting while the buffer is full; await the result to know it was confirmed"""
+        future = asyncio.get_running_loop().create_future()
+        await self._buffer.put(_Message(routing_key, body, future))
+        PUBLISH_BUFFERED.set(self._buffer.qsize())
+        return future
+
+    def publish_nowait(self, body: bytes, routing_key: str = NOTIFICATIONS_QUEUE) -> Optional[asyncio.Future]:
+        """Like publish(), but None instead of waiting when the buffer is full"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._buffer.put_nowait(_Message(routing_key, body, future))
+        except asyncio.QueueFull:
+            return None
+        PUBLISH_BUFFERED.set(self._buffer.qsize())
+        return future
+
+    async def _channel(self):
+        async with self._connect_lock:
+            # Another worker may have reconnected while this one waited
+            if not self.broker.is_open:
+                await self.broker.connect()
+                logger.info("Connected to the message broker")
+        try:
+            return await self.broker.channel()
+        except BrokerError:
+            raise
+        except Exception as e:
+            raise BrokerError(str(e)) from e
+
+    async def _run(self) -> None:
+        channel = None
+        backoff = 0.1
+        while True:
+            batch = [await self._buffer.get()]
+            while len(batch) < self.window and not self._buffer.empty():
+                batch.append(self._buffer.get_nowait())
+            PUBLISH_BUFFERED.set(self._buffer.qsize())
+            self._inflight += len(batch)
+            while batch:
+                try:
+                    if channel is None or not channel.is_open:
+                        channel = await self._channel()
+                    confirms = [channel.publish(m.routing_key, m.body) for m in batch]
+                    results = await asyncio.wait_for(asyncio.gather(*confirms), PUBLISH_CONFIRM_TIMEOUT)
+                    backoff = 0.1
+                except (BrokerError, asyncio.TimeoutError, OSError) as e:
+                    logger.warning("Publish failed, retrying %d messages in %.1fs: %s", len(batch), backoff, e)
+                    PUBLISH_RETRIES.labels("connection").inc(len(batch))
+                    channel = None
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 5.0)
+                    continue
+                retry = []
+                self._inflight -= len(batch)
+                for message, acked in zip(batch, results):
+                    if acked:
+                        self.published += 1
+                        NOTIFICATIONS_PUBLISHED.labels(message.routing_key).inc()
+                        if not message.future.done():
+                            message.future.set_result(True)
+                        continue
+                    message.attempts += 1
+                    if message.attempts < PUBLISH_MAX_ATTEMPTS:
+                        retry.append(message)
+                        PUBLISH_RETRIES.labels("nack").inc()
+                    else:
+                        self.failed += 1
+                        if not message.future.done():
+                            message.future.set_exception(PublishError("Broker refused the message"))
+                self._inflight += len(retry)
+                batch = retry
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Publish what is buffered, for up to `timeout` seconds, then disconnect"""
+        if self._workers:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while (self._inflight or not self._buffer.empty()) and loop.time() < deadline:
+                await asyncio.sleep(0.05)
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers = []
+            dropped = self._buffer.qsize() + self._inflight
+            if dropped:
+                logger.error("Dropped %d unconfirmed notifications at shutdown", dropped)
+        await self.broker.close()
+
+    def stats(self) -> dict:
+        return {
+            "buffered": self._buffer.qsize() if self._buffer is not None else 0,
+            "inflight": self._inflight,
+            "published": self.published,
+            "failed": self.failed,
+        }
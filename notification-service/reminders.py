@@ -0,0 +1,260 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Optional, Set, Tuple
+import notify
+from publisher import PublishError
+from shared.log import get_logger
+from shared.metrics import Counter, Gauge
+from timing_wheel import TimingWheel
+
+logger = get_logger("notification_service.reminders")
+
+REMINDER_DB_PATH = os.getenv("REMINDER_DB_PATH", "reminders.db")
+# Default time between a reminder and the deadline when no reminder_time is given
+REMINDER_LEAD_SECONDS = int(os.getenv("REMINDER_LEAD_SECONDS", "3600"))
+# Reminders due within this many seconds are held in the timing wheel; later ones only on disk
+REMINDER_HORIZON_SECONDS = int(os.getenv("REMINDER_HORIZON_SECONDS", "3600"))
+# Delay before a reminder the broker refused is tried again
+REMINDER_RETRY_SECONDS = int(os.getenv("REMINDER_RETRY_SECONDS", "60"))
+REMINDER_LOAD_BATCH = 10_000
+
+REMINDERS_FIRED = Counter(
+    "reminders_fired_total", "Reminders handed to the publisher, by outcome: sent or retried", ["outcome"]
+)
+REMINDERS_SCHEDULED = Gauge(
+    "reminders_wheel_entries", "Reminders held in memory, due within the horizon"
+)
+
+# (task_id, fire_at, due_at, user_id, notify_method, day_start, day_end): fire_at and due_at
+# are epoch seconds, day_start and day_end the user's working hours in seconds after midnight
+Reminder = Tuple[str, int, int, Optional[str], Optional[str], Optional[int], Optional[int]]
+
+# Columns added since the table was first created, with their types
+ADDED_COLUMNS = {"notify_method": "TEXT", "day_start": "INTEGER", "day_end": "INTEGER"}
+
+class ReminderStore:
+    """
+    Pending reminders in SQLite, one per task, indexed by fire time.
+
+    A row is deleted only once its notification has been confirmed by the
+    broker, so a reminder survives a restart until it has actually been sent.
+    """
+
+    def __init__(self, path: str = REMINDER_DB_PATH):
+        # Range loads run in a worker thread; the lock serialises them with writes
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS reminders ("
+            "task_id TEXT PRIMARY KEY, fire_at INTEGER NOT NULL, due_at INTEGER NOT NULL, user_id TEXT, "
+            "notify_method TEXT, day_start INTEGER, day_end INTEGER)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(reminders)")}
+        for column, kind in ADDED_COLUMNS.items():
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE reminders ADD COLUMN {column} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_reminders_fire_at ON reminders (fire_at, task_id)")
+
+    def put(self, reminder: Reminder) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO reminders VALUES (?, ?, ?, ?, ?, ?, ?)", reminder)
+
+    def put_many(self, reminders: List[Reminder]) -> None:
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO reminders VALUES (?, ?, ?, ?, ?, ?, ?)", reminders)
+            self._db.execute("COMMIT")
+
+    def delete(self, task_id: str) -> bool:
+        with self._lock:
+            return self._db.execute("DELETE FROM reminders WHERE task_id = ?", (task_id,)).rowcount > 0
+
+    def delete_sent(self, sent: List[Tuple[str, int]]) -> None:
+        """Remove reminders that were sent, unless rescheduled in the meantime"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("DELETE FROM reminders WHERE task_id = ? AND fire_at = ?", sent)
+            self._db.execute("COMMIT")
+
+    def get(self, task_id: str) -> Optional[Reminder]:
+        with self._lock:
+            return self._db.execute("SELECT * FROM reminders WHERE task_id = ?", (task_id,)).fetchone()
+
+    def due_until(self, since: Optional[int], until: int) -> Iterator[List[Reminder]]:
+        """Reminders firing in (since, until], in batches, by an index range scan"""
+        after = (since if since is not None else -1, "")
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT * FROM reminders WHERE fire_at <= ? AND (fire_at, task_id) > (?, ?) "
+                    "ORDER BY fire_at, task_id LIMIT ?",
+                    (until, *after, REMINDER_LOAD_BATCH),
+                ).fetchall()
+            if not rows:
+                return
+            yield rows
+            after = rows[-1][1], rows[-1][0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM reminders").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+def _clock_time(seconds: Optional[int]) -> Optional[str]:
+    if seconds is None:
+        return None
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+class ReminderScheduler:
+    """
+    Sends each task's reminder when it is due, to the second.
+
+    Every reminder is written to the ReminderStore; those due within
+    REMINDER_HORIZON_SECONDS are also put in a TimingWheel, which a loop
+    advances every second. Reminders further out stay on disk and are
+    loaded into the wheel, by fire time, as the horizon moves forward. So
+    scheduling, rescheduling and cancelling are O(1) in memory plus one
+    indexed write, and memory holds only the next horizon's worth of
+    reminders however many are pending.
+
+    On startup everything due before the end of the first horizon is
+    loaded; reminders whose time passed while the service was down fire
+    immediately.
+    """
+
+    def __init__(self, store: ReminderStore = None, sender: notify.NotificationSender = None,
+                 horizon: int = REMINDER_HORIZON_SECONDS):
+        self.store = store
+        self.sender = sender
+        self.horizon = horizon
+        self.wheel: Optional[TimingWheel] = None
+        self.loaded_until: Optional[int] = None  # Every reminder firing by then is in the wheel
+        self._changed: Optional[Set[str]] = None  # Tasks rescheduled while a load runs
+        self._sent: List[Tuple[str, int]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, task_id: str, fire_at: int, due_at: int, user_id: Optional[str] = None,
+                 notify_method: Optional[str] = None, day_start: Optional[int] = None,
+                 day_end: Optional[int] = None) -> None:
+        """Schedule, or reschedule, the reminder for a task"""
+        reminder = (task_id, fire_at, due_at, user_id, notify_method, day_start, day_end)
+        self.store.put(reminder)
+        if self._changed is not None:
+            self._changed.add(task_id)
+        if fire_at <= self.loaded_until:
+            self._hold(reminder)
+        else:
+            self.wheel.cancel(task_id)
+        REMINDERS_SCHEDULED.set(len(self.wheel))
+
+    def _hold(self, reminder: Reminder) -> None:
+        # A reminder already due fires on the next tick, still identified by its own fire time
+        self.wheel.add(reminder[0], max(reminder[1], self.wheel.now + 1), reminder)
+
+    def cancel(self, task_id: str) -> bool:
+        if self._changed is not None:
+            self._changed.add(task_id)
+        self.wheel.cancel(task_id)
+        REMINDERS_SCHEDULED.set(len(self.wheel))
+        return self.store.delete(task_id)
+
+    async def _load(self, until: int) -> None:
+        """Move reminders firing by `until` from disk into the wheel"""
+        since, self.loaded_until = self.loaded_until, until
+        self._changed = set()
+        try:
+            batches = self.store.due_until(since, until)
+            while True:
+                rows = await asyncio.to_thread(next, batches, None)
+                if rows is None:
+                    break
+                for reminder in rows:
+                    # A row read before a concurrent reschedule must not undo it
+                    if reminder[0] not in self._changed:
+                        self._hold(reminder)
+        finally:
+            self._changed = None
+        REMINDERS_SCHEDULED.set(len(self.wheel))
+
+    async def _fire(self, reminder: Reminder) -> None:
+        task_id, fire_at, due_at, user_id, notify_method, day_start, day_end = reminder
+        hours = (due_at - time.time()) / 3600
+        message = f"Reminder: Task {task_id} is due in {hours:.1f} hours."
+        confirmed = await self.sender.send_notification(
+            task_id, message, fire_at=fire_at, user_id=user_id, notify_method=notify_method,
+            daily_start_time=_clock_time(day_start), daily_end_time=_clock_time(day_end),
+        )
+        confirmed.add_done_callback(lambda f: self._on_confirm(f, reminder))
+
+    def _on_confirm(self, confirmed: asyncio.Future, reminder: Reminder) -> None:
+        task_id, fire_at = reminder[:2]
+        if not confirmed.cancelled() and confirmed.exception() is None:
+            self._sent.append((task_id, fire_at))
+            REMINDERS_FIRED.labels("sent").inc()
+        elif isinstance(confirmed.exception(), PublishError):
+            # Still on disk; try again later unless it was rescheduled or cancelled meanwhile
+            stored = self.store.get(task_id)
+            if stored is not None and stored[1] == fire_at:
+                REMINDERS_FIRED.labels("retried").inc()
+                self.wheel.add(task_id, self.wheel.now + REMINDER_RETRY_SECONDS, reminder)
+
+    async def _loop(self) -> None:
+        while True:
+            now = int(time.time())
+            for _, _, reminder in self.wheel.advance(now):
+                await self._fire(reminder)
+            if self._sent:
+                sent, self._sent = self._sent, []
+                await asyncio.to_thread(self.store.delete_sent, sent)
+            if self.loaded_until - now < self.horizon // 2:
+                await self._load(now + self.horizon)
+            REMINDERS_SCHEDULED.set(len(self.wheel))
+            # Wake just after the next second starts
+            await asyncio.sleep(now + 1.001 - time.time())
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self.store = self.store or ReminderStore()
+        self.sender = self.sender or notify.notification_sender
+        now = int(time.time())
+        self.wheel = TimingWheel(now)
+        self.horizon = min(self.horizon, self.wheel.span)
+        # Reminders missed while the service was down are loaded too, and fire on the first tick
+        await self._load(now + self.horizon)
+        logger.info("Reminder scheduler started: %d pending, %d within the next %ds",
+                    len(self.store), len(self.wheel), self.horizon)
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop firing; reminders already handed to the sender are still confirmed"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def close(self) -> None:
+        """Forget the reminders confirmed since the last tick; call after the sender has drained"""
+        if self.store is not None:
+            if self._sent:
+                self.store.delete_sent(self._sent)
+                self._sent = []
+            self.store.close()
+
+    def stats(self) -> dict:
+        return {
+            "in_memory": len(self.wheel) if self.wheel is not None else 0,
+            "loaded_until": self.loaded_until,
+        }
+
+reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,91 @@
+from typing import Any, Dict, Hashable, List, Sequence, Tuple
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel with one-second ticks.
+
+    Level 0 has one slot per second, level 1 one slot per level 0 turn, and
+    so on: with the default (60, 60, 24) an entry lands in the slot of its
+    second, minute or hour, and is moved down a level as time reaches its
+    slot, until it fires. Adding, cancelling and firing an entry are O(1)
+    whatever the number of entries, and advancing a second touches only the
+    slots due that second.
+
+    Entries further ahead than the top level reaches (`span`, a day less an
+    hour with the defaults) are refused; the caller keeps them elsewhere and
+    adds them as their time approaches.
+    """
+
+    def __init__(self, now: int, slots: Sequence[int] = (60, 60, 24)):
+        self.now = now  # Every entry due at or before this second has fired
+        self.ticks: List[int] = []  # Seconds per slot, by level
+        tick = 1
+        for size in slots:
+            self.ticks.append(tick)
+            tick *= size
+        self.slots = list(slots)
+        self.span = tick - self.ticks[-1]
+        self._levels: List[List[Dict[Hashable, Tuple[int, Any]]]] = [[{} for _ in range(size)] for size in slots]
+        self._where: Dict[Hashable, Tuple[int, int]] = {}  # key -> (level, slot)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def add(self, key: Hashable, fire_at: int, value: Any = None) -> bool:
+        """
+        Schedule `key` for second `fire_at`, replacing any entry for it.
+        False if it is already due (nothing is added) or beyond the span.
+        """
+        self.cancel(key)
+        if fire_at <= self.now:
+            return False
+        for level, tick in enumerate(self.ticks):
+            if fire_at // tick - self.now // tick < self.slots[level]:
+                slot = fire_at // tick % self.slots[level]
+                self._levels[level][slot][key] = (fire_at, value)
+                self._where[key] = (level, slot)
+                return True
+        return False
+
+    def cancel(self, key: Hashable) -> bool:
+        where = self._where.pop(key, None)
+        if where is None:
+            return False
+        level, slot = where
+        del self._levels[level][slot][key]
+        return True
+
+    def advance(self, to: int) -> List[Tuple[Hashable, int, Any]]:
+        """Move the clock to second `to`; returns the (key, fire_at, value) that became due"""
+        due = []
+        while self.now < to:
+            self.now += 1
+            # Higher levels first, so entries cascading into this second's level 0 slot fire now
+            for level in range(len(self.ticks) - 1, 0, -1):
+                tick = self.ticks[level]
+                if self.now % tick == 0:
+                    self._cascade(level, self.now // tick % self.slots[level], due)
+            self._fire(0, self.now % self.slots[0], due)
+        return due
+
+    def _cascade(self, level: int, slot: int, due: list) -> None:
+        entries = self._levels[level][slot]
+        if not entries:
+            return
+        self._levels[level][slot] = {}
+        for key, (fire_at, value) in entries.items():
+            del self._where[key]
+            if not self.add(key, fire_at, value):
+                due.append((key, fire_at, value))
+
+    def _fire(self, level: int, slot: int, due: list) -> None:
+        entries = self._levels[level][slot]
+        if not entries:
+            return
+        self._levels[level][slot] = {}
+        for key, (fire_at, value) in entries.items():
+            del self._where[key]
+            due.append((key, fire_at, value))
@@ -1,5 +1,6 @@
 import redis
 import json
+from typing import Dict, List, Optional, Tuple
 
 class Cache:
     def __init__(self):
@@ -13,3 +14,21 @@ class Cache:
 
     def set(self, key: str, value: dict, ex: int = 3600):
         self.client.setex(key, ex, json.dumps(value))
+
+    def get_many(self, keys: List[str]) -> List[Optional[dict]]:
+        """One MGET for all keys; None where nothing is cached"""
+        if not keys:
+            return []
+        return [json.loads(data) if data else None for data in self.client.mget(keys)]
+
+    def set_many(self, values: Dict[str, Tuple[dict, int]]):
+        """
+        Store {key: (value, ttl)} in a single pipelined round trip; one SET
+        with its own expiry per key, as MSET cannot set TTLs
+        """
+        if not values:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key, (value, ex) in values.items():
+            pipe.set(key, json.dumps(value), ex=ex)
+        pipe.execute()
@@ -1,16 +1,61 @@
+import sys
+import os
+
+# Add shared package to Python path
+shared_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, shared_path)
+
+import math
+import zlib
+import numpy as np
+import redis
+from datetime import datetime
 from fastapi import FastAPI, Depends, HTTPException
 from pydantic import BaseModel
-from typing import Optional
-from . import priority, cache
+from typing import Dict, List, Optional, Tuple
+from shared.log import get_logger
+from shared.metrics import install_metrics
+import priority, cache
+
+logger = get_logger("priority_service")
 
 app = FastAPI()
 
 cache_client = cache.Cache()
 
+# Prometheus /metrics endpoint and per-route latency histograms
+install_metrics(app, service="priority_service")
+
+# Past-due priorities never change; their entries are still dropped after a day
+PRIORITY_CACHE_MAX_TTL = 86400
+
+def priority_cache_entry(task_id: int, changes_at: float, now: float,
+                         description: Optional[str] = None, tenant: Optional[str] = None) -> Tuple[str, int]:
+    """
+    Cache key and TTL for a task's priority, from when it next changes
+    (local epoch seconds, inf for never).
+
+    The entry expires exactly when the priority would change, so it is
+    never served stale and never recomputed while still valid. The change
+    time is part of the key, so an edited due date misses instead of
+    finding the old task's entry; so are a checksum of the description
+    and the keyword lists' version, for the same reason.
+    """
+    words = zlib.crc32(f"{tenant}\0{description}".encode()) if description else 0
+    suffix = f"{priority.keyword_scorer.version}_{words:08x}"
+    if math.isinf(changes_at):
+        return f"task_priority_{task_id}_final_{suffix}", PRIORITY_CACHE_MAX_TTL
+    return f"task_priority_{task_id}_{int(changes_at)}_{suffix}", max(1, math.ceil(changes_at - now))
+
+def _local_epoch(dt: Optional[datetime]) -> float:
+    # Naive local time as seconds since 1970, the way NumPy reads due dates
+    return math.inf if dt is None else (dt - datetime(1970, 1, 1)).total_seconds()
+
 class TaskPriorityRequest(BaseModel):
     task_id: int
     due_date: str
     description: str
+    tenant: Optional[str] = None  # Adds the tenant's keyword list to the default one
 
 class TaskPriorityResponse(BaseModel):
     task_id: int
@@ -18,16 +63,111 @@ class TaskPriorityResponse(BaseModel):
 
 @app.post("/priority/", response_model=TaskPriorityResponse)
 def calculate_priority(task: TaskPriorityRequest):
+    now = datetime.now()
+    try:
+        changes_at = priority.next_priority_change(task.due_date, now)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid due_date: {e}")
+    key, ttl = priority_cache_entry(task.task_id, _local_epoch(changes_at), _local_epoch(now),
+                                    task.description, task.tenant)
+
     # Check if we have cached priority
-    cached_priority = cache_client.get(f"task_priority_{task.task_id}")
+    cached_priority = cache_client.get(key)
     
     if cached_priority:
         return TaskPriorityResponse(task_id=task.task_id, priority=cached_priority["priority"])
 
     # Otherwise, calculate the priority
-    priority_value = priority.calculate_priority(task.due_date, task.description)
+    keywords = priority.keyword_scorer.score(task.description, task.tenant)
+    priority_value = priority.calculate_priority(task.due_date, task.description, task.tenant, keywords)
 
-    # Cache the result
-    cache_client.set(f"task_priority_{task.task_id}", {"priority": priority_value})
+    # Cache the result until it would change; the keyword score is for /priority/batch's scores
+    cache_client.set(key, {"priority": priority_value, "keywords": keywords}, ex=ttl)
 
     return TaskPriorityResponse(task_id=task.task_id, priority=priority_value)
+
+class TaskPriorityBatchRequest(BaseModel):
+    # Parallel arrays, one entry per task. With task_ids, results are also
+    # read from and written to the same cache as /priority/
+    due_dates: List[str]
+    priorities: Optional[List[str]] = None
+    estimated_durations: Optional[List[float]] = None  # Seconds
+    descriptions: Optional[List[str]] = None  # Scored for urgency keywords
+    tenant: Optional[str] = None
+    task_ids: Optional[List[int]] = None
+
+class TaskPriorityBatchResponse(BaseModel):
+    # In request order
+    priorities: List[str]
+    scores: List[float]
+    cached: int
+
+@app.post("/priority/batch", response_model=TaskPriorityBatchResponse)
+def calculate_priority_batch(batch: TaskPriorityBatchRequest):
+    count = len(batch.due_dates)
+    for name in ("priorities", "estimated_durations", "descriptions", "task_ids"):
+        values = getattr(batch, name)
+        if values is not None and len(values) != count:
+            raise HTTPException(status_code=422, detail=f"{name} must have one entry per due date")
+
+    now = datetime.now().replace(microsecond=0)
+    try:
+        buckets, scores, changes_at = priority.calculate_priorities(batch.due_dates, batch.priorities,
+                                                                    batch.estimated_durations, now)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid batch: {e}")
+
+    descriptions = batch.descriptions or [None] * count
+    keyword_scores = np.zeros(count)
+    todo = range(count)
+    cached = 0
+    entries = missing = None
+    if batch.task_ids:
+        now_epoch = _local_epoch(now)
+        entries = [priority_cache_entry(task_id, change, now_epoch, description, batch.tenant)
+                   for task_id, change, description in zip(batch.task_ids, changes_at.tolist(), descriptions)]
+        try:
+            cached_entries = cache_client.get_many([key for key, _ in entries])
+            todo = []
+            for i, entry in enumerate(cached_entries):
+                # Entries cached before they carried the keyword score cannot give the task's score
+                if entry is not None and "keywords" in entry:
+                    # What /priority/ answered for this task
+                    buckets[i] = entry["priority"]
+                    keyword_scores[i] = entry.get("keywords", 0.0)
+                    cached += 1
+                else:
+                    todo.append(i)
+            missing = {}
+        except redis.RedisError as e:
+            logger.warning("Priority cache unavailable, batch served uncached: %s", e)
+
+    # Keywords only need scoring for what the cache did not have
+    if batch.descriptions and todo:
+        keyword_scores[list(todo)] = priority.keyword_scorer.score_many(
+            [descriptions[i] for i in todo], batch.tenant)
+    priority.apply_keyword_scores(buckets, scores, keyword_scores, todo)
+
+    if missing is not None:
+        for i in todo:
+            key, ttl = entries[i]
+            missing[key] = ({"priority": buckets[i], "keywords": keyword_scores[i]}, ttl)
+        try:
+            cache_client.set_many(missing)
+        except redis.RedisError as e:
+            logger.warning("Could not cache priorities: %s", e)
+
+    return TaskPriorityBatchResponse(priorities=buckets, scores=scores.tolist(), cached=cached)
+
+class KeywordListRequest(BaseModel):
+    keywords: Dict[str, float]  # Keyword or phrase -> weight
+
+@app.put("/priority/keywords/{tenant}")
+def set_keywords(tenant: str, body: KeywordListRequest):
+    """Replace a tenant's urgency keywords ("default" for everyone's); takes effect for the next task scored"""
+    version = priority.keyword_scorer.set_tenant(None if tenant == "default" else tenant, body.keywords)
+    return {"tenant": tenant, "keywords": len(body.keywords), "version": version}
+
+@app.get("/priority/keywords")
+def get_keywords():
+    return {"version": priority.keyword_scorer.version, **priority.keyword_scorer.lists}
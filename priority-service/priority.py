@@ -1,15 +1,269 @@
-from datetime import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
 
-def calculate_priority(due_date: str, description: str) -> str:
-    # Simple priority calculation based on due date and description
-    due_date_obj = datetime.strptime(due_date, "%Y-%m-%d %H:%M:%S")
+DUE_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+ONE_DAY = 86400
+
+# Bucket names by index, least to most urgent
+LEVELS = np.array(["Low", "Medium", "High"])
+
+# How much the priority the user gave a task multiplies its urgency score
+PRIORITY_WEIGHTS = {"low": 1.0, "medium": 2.0, "high": 4.0, "urgent": 8.0}
+
+# Keyword lists, as {"default": {keyword: weight}, "tenants": {tenant: {...}}};
+# DEFAULT_KEYWORDS is used when no file is given
+PRIORITY_KEYWORDS_FILE = os.getenv("PRIORITY_KEYWORDS_FILE")
+# A description whose keyword weights add up to this moves up one bucket
+KEYWORD_BUMP_THRESHOLD = float(os.getenv("KEYWORD_BUMP_THRESHOLD", "2.0"))
+# Batches with at least this many descriptions are scored in a process pool
+# of KEYWORD_POOL_WORKERS processes (0 scores everything inline)
+KEYWORD_POOL_MIN_BATCH = int(os.getenv("KEYWORD_POOL_MIN_BATCH", "2000"))
+KEYWORD_POOL_WORKERS = int(os.getenv("KEYWORD_POOL_WORKERS", str(os.cpu_count() or 1)))
+
+DEFAULT_KEYWORDS = {
+    "asap": 2.0, "urgent": 2.0, "blocker": 2.0, "blocking": 1.5, "critical": 1.5,
+    "emergency": 2.0, "outage": 2.0, "production down": 2.0, "overdue": 1.5,
+    "today": 1.0, "end of day": 1.0, "eod": 1.0, "tonight": 1.0, "deadline": 0.5,
+    "invoice": 1.0, "payment": 1.0, "payroll": 1.0, "tax": 1.0, "contract": 0.5,
+    "client": 0.5, "customer": 0.5, "escalation": 1.5, "escalated": 1.5,
+}
+
+_WORDS = re.compile(r"\w+")
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton matching a set of weighted keywords in one pass.
+
+    The alphabet is words rather than characters: descriptions are split
+    into lowercase words by one regex, then walked word by word, so
+    keywords (including multi-word phrases like "end of day") only match
+    whole words, and the walk takes one step per word whatever the number
+    of keywords. A description's score is the sum of the weights of the
+    distinct keywords in it, so repeating "ASAP" does not add up.
+    """
+
+    def __init__(self, keywords: Dict[str, float]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._weights: List[float] = []
+        for keyword, weight in keywords.items():
+            words = _WORDS.findall(keyword.lower())
+            if not words:
+                continue
+            state = 0
+            for word in words:
+                state = self._goto[state].setdefault(word, len(self._goto))
+                if state == len(self._goto):
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+            self._out[state] += (len(self._weights),)
+            self._weights.append(float(weight))
+
+        # Breadth-first, so a state's failure link is final before its
+        # children use it; the root's children fail back to the root
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for word, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(word, 0)
+                self._out[child] += self._out[self._fail[child]]
+
+    def __len__(self) -> int:
+        return len(self._weights)
+
+    def score(self, text: Optional[str]) -> float:
+        if not text or not self._weights:
+            return 0.0
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        matched = set()
+        for word in _WORDS.findall(text.lower()):
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            if out[state]:
+                matched.update(out[state])
+        return sum(self._weights[i] for i in matched)
+
+class KeywordScorer:
+    """
+    The default keyword list plus per-tenant lists, as automata built once.
+
+    load() builds every automaton before swapping them in with a single
+    assignment, so requests in flight keep scoring with the lists they
+    started with and never see a half-built one. `version` is a digest of
+    the lists, the same in every process that loaded the same lists, for
+    cache keys. The process pool used for large batches is started with the
+    lists it should build; after a swap the next batch starts a new pool
+    and the old one is shut down once its work is done.
+    """
+
+    def __init__(self, lists: Optional[dict] = None):
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.load(lists or {"default": DEFAULT_KEYWORDS})
+
+    def load(self, lists: dict) -> str:
+        """Replace every list; lists is {"default": {...}, "tenants": {tenant: {...}}}"""
+        lists = {"default": dict(lists.get("default", {})),
+                 "tenants": {t: dict(k) for t, k in lists.get("tenants", {}).items()}}
+        automata = {None: KeywordAutomaton(lists["default"])}
+        for tenant, keywords in lists["tenants"].items():
+            automata[tenant] = KeywordAutomaton(keywords)
+        version = hashlib.blake2b(json.dumps(lists, sort_keys=True).encode(), digest_size=6).hexdigest()
+        with self._lock:
+            self.lists, self._automata, self.version = lists, automata, version
+            old_pool, self._pool = self._pool, None
+        if old_pool is not None:
+            old_pool.shutdown(wait=False)
+        return version
+
+    def set_tenant(self, tenant: Optional[str], keywords: Dict[str, float]) -> str:
+        """Replace one tenant's list (None for the default list)"""
+        lists = {"default": self.lists["default"], "tenants": dict(self.lists["tenants"])}
+        if tenant is None:
+            lists["default"] = keywords
+        else:
+            lists["tenants"][tenant] = keywords
+        return self.load(lists)
+
+    def score(self, description: Optional[str], tenant: Optional[str] = None) -> float:
+        automata = self._automata
+        score = automata[None].score(description)
+        if tenant is not None and tenant in automata:
+            score += automata[tenant].score(description)
+        return score
+
+    def score_many(self, descriptions: Sequence[Optional[str]], tenant: Optional[str] = None) -> np.ndarray:
+        """Scores in input order; large batches are split across the process pool"""
+        if KEYWORD_POOL_WORKERS < 1 or len(descriptions) < KEYWORD_POOL_MIN_BATCH:
+            return np.array([self.score(d, tenant) for d in descriptions], dtype=np.float64)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    KEYWORD_POOL_WORKERS,
+                    # Fresh interpreters: the service runs requests in threads
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.lists,),
+                )
+            pool = self._pool
+        size = -(-len(descriptions) // KEYWORD_POOL_WORKERS)
+        chunks = [(list(descriptions[i:i + size]), tenant) for i in range(0, len(descriptions), size)]
+        return np.concatenate([np.asarray(part) for part in pool.map(_score_chunk, chunks)])
+
+    def load_file(self, path: str) -> str:
+        with open(path) as f:
+            return self.load(json.load(f))
+
+_worker_scorer: Optional["KeywordScorer"] = None
+
+def _init_worker(lists: dict) -> None:
+    global _worker_scorer
+    _worker_scorer = KeywordScorer(lists)
+
+def _score_chunk(args) -> List[float]:
+    descriptions, tenant = args
+    return [_worker_scorer.score(d, tenant) for d in descriptions]
+
+keyword_scorer = KeywordScorer()
+if PRIORITY_KEYWORDS_FILE:
+    keyword_scorer.load_file(PRIORITY_KEYWORDS_FILE)
+
+def calculate_priority(due_date: str, description: str, tenant: Optional[str] = None,
+                       keywords: Optional[float] = None) -> str:
+    # Simple priority calculation based on due date and description; `keywords`
+    # is the description's keyword score, when the caller already has it
+    due_date_obj = datetime.strptime(due_date, DUE_DATE_FORMAT)
     current_time = datetime.now()
 
     time_diff = (due_date_obj - current_time).total_seconds()
 
     if time_diff < 0:
-        return "High"  # Past due tasks are high priority
-    elif time_diff < 86400:  # Less than a day
-        return "Medium"
+        level = 2  # Past due tasks are high priority
+    elif time_diff < ONE_DAY:  # Less than a day
+        level = 1
     else:
-        return "Low"
+        level = 0
+    # Urgent wording moves a task up one bucket
+    if keywords is None:
+        keywords = keyword_scorer.score(description, tenant)
+    if keywords >= KEYWORD_BUMP_THRESHOLD:
+        level = min(level + 1, 2)
+    return str(LEVELS[level])
+
+def next_priority_change(due_date: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    When calculate_priority's answer for this due date next changes, None
+    if it never will (the task is already past due). Keywords move the
+    bucket but not the instants at which it changes.
+
+    The priority only moves one day before the due date and at the due
+    date itself, so a computed priority stays valid until the next of them.
+    """
+    due_date_obj = datetime.strptime(due_date, DUE_DATE_FORMAT)
+    current_time = now or datetime.now()
+    if due_date_obj < current_time:
+        return None
+    day_before = due_date_obj - timedelta(seconds=ONE_DAY)
+    return day_before if day_before >= current_time else due_date_obj
+
+def calculate_priorities(due_dates: Sequence[str], priorities: Optional[Sequence[str]] = None,
+                         durations: Optional[Sequence[float]] = None,
+                         now: Optional[datetime] = None) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    calculate_priority over a whole backlog at once, plus an urgency score.
+
+    Due dates are parsed and compared as one NumPy array instead of one
+    strptime per task. A task's bucket uses the same thresholds as
+    calculate_priority, applied to its slack: the time left before the due
+    date once its estimated duration (seconds) is taken out, so with no
+    durations the buckets are exactly calculate_priority's. The score, for
+    ordering a backlog, is the task's priority weight over its slack in
+    days, with slack floored at one hour so overdue tasks top out rather
+    than go negative. Also returned is when each bucket next changes, as
+    local epoch seconds like the due dates (inf for overdue tasks). Results
+    are in input order.
+    """
+    # Same local wall clock as datetime.now() in calculate_priority;
+    # raises ValueError for a malformed date
+    due = np.array(due_dates, dtype="datetime64[s]").astype(np.int64)
+    now = np.datetime64(now or datetime.now(), "s").astype(np.int64)
+    slack = (due - now).astype(np.float64)
+    if durations is not None:
+        slack -= np.asarray(durations, dtype=np.float64)
+
+    bucket = np.where(slack < 0, 2, np.where(slack < ONE_DAY, 1, 0))
+    if priorities is None:
+        weights = PRIORITY_WEIGHTS["medium"]
+    else:
+        # Raises KeyError for an unknown priority
+        weights = np.array([PRIORITY_WEIGHTS[p] for p in priorities])
+    scores = weights * ONE_DAY / np.maximum(slack, 3600.0)
+    changes_at = np.where(bucket == 2, np.inf, now + slack - np.where(bucket == 0, ONE_DAY, 0))
+    return LEVELS[bucket].tolist(), scores, changes_at
+
+def apply_keyword_scores(buckets: List[str], scores: np.ndarray, keyword_scores: np.ndarray,
+                         bump: Sequence[int]) -> None:
+    """
+    Fold keyword scores into calculate_priorities' results, in place: the
+    tasks at indices `bump` move up one bucket if their keywords reach
+    KEYWORD_BUMP_THRESHOLD, and every score is scaled by 1 + keyword score
+    """
+    for i in bump:
+        if keyword_scores[i] >= KEYWORD_BUMP_THRESHOLD and buckets[i] != "High":
+            buckets[i] = "High" if buckets[i] == "Medium" else "Medium"
+    scores *= 1.0 + keyword_scores
@@ -0,0 +1,92 @@
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from shared.compression import SUPPORTED_ENCODINGS, compress, decompress, zstandard
+
+WORDS = (
+    "review update deploy client invoice meeting draft report fix migrate "
+    "schedule follow budget design test release backlog sprint notes call"
+).split()
+
+def make_listing(count: int) -> bytes:
+    """A task-service /list-tasks body with `count` TaskResponse-shaped items"""
+    now = datetime(2026, 1, 1, 9, 0)
+    rng = random.Random(42)
+    tasks = []
+    for i in range(count):
+        created = now - timedelta(days=rng.randint(0, 90))
+        tasks.append({
+            "title": " ".join(rng.choices(WORDS, k=4)).capitalize(),
+            "description": " ".join(rng.choices(WORDS, k=rng.randint(20, 120))),
+            "status": rng.choice(["pending", "in_progress", "done"]),
+            "priority": rng.choice(["low", "medium", "high", "urgent"]),
+            "color_label": rng.choice([None, "red", "blue", "green"]),
+            "estimated_duration": rng.choice([None, 900, 1800, 3600, 7200]),
+            "deadline": (now + timedelta(hours=rng.randint(1, 2000))).isoformat(),
+            "reminder_enabled": True,
+            "reminder_time": None,
+            "tags": rng.sample(WORDS, k=rng.randint(0, 3)),
+            "is_recurring": False,
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_id": "3f1c2a9e-8d4b-4f7a-9c1e-2b5d6a7e8f90",
+            "created_at": created.isoformat(),
+            "updated_at": created.isoformat(),
+            "completed_at": None,
+            "recurring_pattern": None,
+        })
+    return json.dumps(tasks).encode()
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+def codecs():
+    yield "gzip-1", lambda d: gzip.compress(d, 1, mtime=0), gzip.decompress
+    yield "gzip-6", lambda d: gzip.compress(d, 6, mtime=0), gzip.decompress
+    yield "gzip-9", lambda d: gzip.compress(d, 9, mtime=0), gzip.decompress
+    if zstandard is not None:
+        for level in (1, 3, 9):
+            compressor = zstandard.ZstdCompressor(level=level)
+            decompressor = zstandard.ZstdDecompressor()
+            yield f"zstd-{level}", compressor.compress, decompressor.decompress
+
+def main(count: int, repeat: int):
+    body = make_listing(count)
+    print(f"=== {count}-task listing: {len(body) / 1024:.1f} KiB of JSON ===")
+    print(f"{'codec':<8} {'bytes':>10} {'ratio':>7} {'compress ms':>12} {'decompress ms':>14}")
+    for name, comp, decomp in codecs():
+        compressed = comp(body)
+        c_ms = timed(lambda: comp(body), repeat)
+        d_ms = timed(lambda: decomp(compressed), repeat)
+        print(f"{name:<8} {len(compressed):>10} {len(body) / len(compressed):>6.1f}x {c_ms:>12.2f} {d_ms:>14.2f}")
+
+    # Gateway CPU per listing: relaying the compressed upstream body as-is versus
+    # the old path of decoding, re-validating/re-encoding and compressing again
+    encoding = SUPPORTED_ENCODINGS[0]
+    upstream = compress(body, encoding)
+    relay_ms = timed(lambda: bytes(upstream), repeat)
+    recompress_ms = timed(
+        lambda: compress(json.dumps(json.loads(decompress(upstream, encoding))).encode(), encoding), repeat
+    )
+    print(f"\nGateway per-listing CPU ({encoding}): relay {relay_ms:.3f} ms, "
+          f"decode+re-encode+recompress {recompress_ms:.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compression size/CPU tradeoffs on task listings")
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.tasks, args.repeat)
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'notification-service')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from broker import DEAD_LETTER_QUEUE, NOTIFICATIONS_QUEUE, MemoryBroker
+from consumer import NotificationConsumer
+from handlers import FakeHandler, NOTIFY_METHODS
+
+def messages(count: int, duplicates: float, poison: float) -> list:
+    """Reminders over the three methods, some published twice and some unusable"""
+    rng = random.Random(7)
+    bodies = []
+    for i in range(count):
+        if rng.random() < poison:
+            bodies.append(rng.choice([b"not json", json.dumps({"task_id": i}).encode(),
+                                      json.dumps({"task_id": i, "message": "x", "notify_method": "fax"}).encode()]))
+            continue
+        body = json.dumps({"task_id": f"task-{i}", "message": f"Reminder: Task {i} is due in 1.0 hours.",
+                           "fire_at": 1_800_000_000 + i, "user_id": f"user-{i % 1000}",
+                           "notify_method": rng.choice(NOTIFY_METHODS)}).encode()
+        bodies.append(body)
+        if rng.random() < duplicates:
+            bodies.append(body)
+    return bodies
+
+async def run(bodies: list, latency: float, prefetch: int, concurrency: int, ack_batch: int,
+              disconnect_at: int = 0) -> dict:
+    broker = MemoryBroker()
+    broker.queues[NOTIFICATIONS_QUEUE] = deque(bodies)
+    # Every notification is kept, to check that each went out once
+    handlers = {method: FakeHandler(method, latency, keep=None) for method in NOTIFY_METHODS}
+    consumer = NotificationConsumer(broker, handlers, prefetch=prefetch, concurrency=concurrency,
+                                    ack_batch=ack_batch)
+    consumer.digester = None  # Every message is delivered on its own, as with DIGEST_WINDOW_SECONDS=0
+    started = time.perf_counter()
+    await consumer.start()
+    disconnected = False
+    while True:
+        await asyncio.sleep(0.005)
+        if disconnect_at and not disconnected and consumer.stats["sent"] >= disconnect_at:
+            broker.disconnect()
+            disconnected = True
+        settled = not broker.queues[NOTIFICATIONS_QUEUE] and not any(
+            broker._redeliver.values()) and all(not c.unacked for c in broker._consumers)
+        if settled and broker._consumers:
+            break
+    elapsed = time.perf_counter() - started
+    await consumer.stop()
+    sent = [n for h in handlers.values() for n in h.sent]
+    return {
+        "rate": len(bodies) / elapsed,
+        "sent": len(sent),
+        "distinct": len({(n["task_id"], n["fire_at"]) for n in sent}),
+        "duplicates": consumer.stats["duplicate"],
+        "dead": len(broker.queues.get(DEAD_LETTER_QUEUE, ())),
+        "acks": broker.acks,
+        "connects": broker.connects,
+    }
+
+async def main(count: int, latency: float):
+    bodies = messages(count, duplicates=0.05, poison=0.005)
+    print(f"{len(bodies):,} messages (5% published twice, 0.5% poison), "
+          f"handlers taking {latency * 1000:g} ms\n")
+    print(f"{'prefetch':>9} {'workers':>8} {'ack batch':>10} {'msgs/s':>9} {'sent':>8} {'dupes':>7} "
+          f"{'dead':>6} {'ack frames':>11}")
+    for prefetch, concurrency, ack_batch in ((1, 1, 1), (32, 32, 1), (256, 64, 64), (1024, 256, 128)):
+        if prefetch == 1:
+            sample = bodies[:max(200, len(bodies) // 100)]
+            result = await run(sample, latency, prefetch, concurrency, ack_batch)
+        else:
+            result = await run(bodies, latency, prefetch, concurrency, ack_batch)
+        print(f"{prefetch:>9} {concurrency:>8} {ack_batch:>10} {result['rate']:>9,.0f} {result['sent']:>8,} "
+              f"{result['duplicates']:>7,} {result['dead']:>6,} {result['acks']:>11,}")
+
+    result = await run(bodies, latency, 256, 64, 64, disconnect_at=len(bodies) // 2)
+    print(f"\nDisconnect halfway: {result['connects']} connects, {result['sent']:,} sent for "
+          f"{result['distinct']:,} distinct reminders, {result['duplicates']:,} duplicates suppressed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Notification consumer throughput against the in-memory broker")
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds each handler call takes")
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.latency))
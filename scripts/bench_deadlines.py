@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'task_service')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_deadlines.db')}")
+
+import httpx
+import shared.deadline as deadlines
+from app.db.database import Base, engine
+from app.db.models import Task
+from main import app
+from shared.deadline import DEADLINE_HEADER, deadline_stats
+
+WORDS = (
+    "review update deploy client invoice meeting draft report fix migrate "
+    "schedule follow budget design test release backlog sprint notes call"
+).split()
+
+def seed(user_id: uuid.UUID, count: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    now = datetime(2026, 1, 1, 9, 0)
+    rows = [
+        {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_id": str(user_id),
+            "title": " ".join(rng.choices(WORDS, k=4)),
+            "description": " ".join(rng.choices(WORDS, k=30)),
+            "status": rng.choice(["pending", "in_progress", "done"]),
+            "priority": rng.choice(["low", "medium", "high", "urgent"]),
+            "deadline": now + timedelta(hours=rng.randint(1, 2000)),
+            "tags": "[]",
+            "created_at": now,
+            "updated_at": now,
+        }
+        for _ in range(count)
+    ]
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.insert(), rows)
+
+async def overload(client: httpx.AsyncClient, user_id: uuid.UUID, requests: int, budget: float,
+                   concurrency: int) -> dict:
+    """
+    Send all requests at once, each with `budget` seconds to live, and tally the answers.
+
+    At most `concurrency` are served at a time, like a worker with a bounded
+    number of connections; the rest queue, and their deadline runs while they do.
+    """
+    in_flight = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        deadline = str(int((time.time() + budget) * 1000))
+        headers = {"X-User-ID": str(user_id), DEADLINE_HEADER: deadline}
+        # A scan the index cannot help with, like a user's free-text search
+        path = "/api/v1/tasks/count-tasks" if i % 2 else "/api/v1/tasks/list-tasks"
+        async with in_flight:
+            response = await client.get(path, params={"search": "zzz", "limit": 50}, headers=headers)
+        return response.status_code
+
+    before = deadline_stats("task_service")
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    after = deadline_stats("task_service")
+    delta = {k: after[k] - before[k] for k in after if k != "wasted_fraction"}
+    total = sum(delta[f"{o}_seconds"] for o in ("ok", "late", "skipped", "interrupted", "cancelled"))
+    wasted = total - delta["ok_seconds"]
+    return {
+        "elapsed": elapsed,
+        "answered_in_time": sum(1 for s in statuses if s == 200) - delta["late"],
+        "late": delta["late"],
+        "skipped": delta["skipped"],
+        "interrupted": delta["interrupted"],
+        "work_seconds": total,
+        "wasted_fraction": wasted / total if total else 0.0,
+    }
+
+async def main(tasks: int, requests: int, budget: float, concurrency: int):
+    user_id = uuid.uuid4()
+    seed(user_id, tasks)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://task-service") as client:
+        await overload(client, user_id, 4, 10.0, concurrency)  # Warm up
+        print(f"{tasks:,} tasks, {requests} requests at once, {concurrency} served at a time, "
+              f"{budget * 1000:.0f} ms budget each\n")
+        print(f"{'deadlines':>10} {'elapsed':>8} {'in time':>8} {'late':>6} {'skipped':>8} "
+              f"{'aborted':>8} {'work':>8} {'wasted':>7}")
+        for enforced in (False, True):
+            deadlines.REQUEST_DEADLINES_ENFORCED = enforced
+            result = await overload(client, user_id, requests, budget, concurrency)
+            print(f"{'enforced' if enforced else 'ignored':>10} {result['elapsed']:>7.2f}s "
+                  f"{result['answered_in_time']:>8.0f} {result['late']:>6.0f} {result['skipped']:>8.0f} "
+                  f"{result['interrupted']:>8.0f} {result['work_seconds']:>7.2f}s {result['wasted_fraction']:>6.0%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Work wasted on requests past their deadline, with and without enforcement")
+    parser.add_argument("--tasks", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--budget", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.tasks, args.requests, args.budget, args.concurrency))
@@ -0,0 +1,102 @@
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'notification-service')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from digest import Digester, next_working_time, working_hours
+from handlers import NOTIFY_METHODS
+
+def workload(users: int, start: float) -> list:
+    """
+    Two days of reminders, an hour before each deadline. Most users have a
+    few tasks; one in ten has dozens, bunched around the start of the day.
+    """
+    rng = random.Random(9)
+    midnight = datetime.fromtimestamp(start).replace(hour=0, minute=0, second=0, microsecond=0)
+    reminders = []
+    for u in range(users):
+        day_start = rng.choice((7, 8, 9, 10)) * 3600
+        day_end = rng.choice((16, 17, 18, 19)) * 3600
+        user = {"user_id": f"user-{u}", "notify_method": rng.choice(NOTIFY_METHODS),
+                "daily_start_time": f"{day_start // 3600:02d}:00:00", "daily_end_time": f"{day_end // 3600:02d}:00:00"}
+        tasks = rng.randint(20, 60) if rng.random() < 0.1 else rng.randint(1, 6)
+        for t in range(tasks):
+            day = midnight + timedelta(days=rng.randint(1, 2))
+            if rng.random() < 0.6:
+                due = day + timedelta(seconds=rng.gauss(day_start + 2 * 3600, 3600))  # Morning
+            else:
+                due = day + timedelta(seconds=rng.uniform(0, 86400))
+            fire_at = due.timestamp() - 3600
+            if fire_at > start:
+                reminders.append((fire_at, {**user, "task_id": f"task-{u}-{t}", "fire_at": int(fire_at),
+                                            "message": f"Reminder: Task {t} is due in 1.0 hours."}))
+    reminders.sort(key=lambda r: r[0])
+    return reminders
+
+def simulate(reminders: list, window: float, quiet_hours: bool, max_pending: int) -> dict:
+    hours = {n["user_id"]: working_hours(n) for _, n in reminders}
+    clock = [reminders[0][0]]
+    digester = Digester(window=window, max_items=50, max_pending=max_pending, clock=lambda: clock[0])
+    sends = in_quiet = peak = 0
+    per_user = {}
+
+    def release(now: float):
+        nonlocal sends, in_quiet
+        for _, message, _ in digester.take_due(now):
+            sends += 1
+            per_user[message["user_id"]] = per_user.get(message["user_id"], 0) + 1
+            if next_working_time(now, hours[message["user_id"]]) > now:
+                in_quiet += 1
+
+    for fire_at, notification in reminders:
+        # Release what falls due first, on the whole second, as the consumer's release loop does
+        while digester._schedule and digester._schedule[0][0] <= fire_at:
+            release(math.ceil(digester._schedule[0][0]))
+        clock[0] = fire_at
+        if not quiet_hours:
+            notification = {k: v for k, v in notification.items() if not k.startswith("daily_")}
+        digester.add(notification["notify_method"], notification)
+        peak = max(peak, digester.pending)
+        release(fire_at)
+    while digester._schedule:
+        release(math.ceil(digester._schedule[0][0]))
+    return {"sends": sends, "in_quiet": in_quiet, "peak": peak, "per_user": per_user}
+
+def main(users: int, max_pending: int):
+    reminders = workload(users, time.time())
+    print(f"{len(reminders):,} reminders for {users:,} users over two days\n")
+    print(f"{'window':>8} {'quiet hours':>12} {'sends':>9} {'reduction':>10} {'sent in quiet hours':>20} "
+          f"{'peak held':>10}")
+    baseline = len(reminders)
+    quiet_baseline = sum(1 for at, n in reminders if next_working_time(at, working_hours(n)) > at)
+    print(f"{'none':>8} {'no':>12} {baseline:>9,} {'':>10} {quiet_baseline:>20,} {0:>10}")
+    for window, quiet in ((60, False), (300, False), (900, False), (3600, False), (300, True), (900, True)):
+        result = simulate(reminders, window, quiet, max_pending=10 ** 9)
+        print(f"{window:>7}s {'yes' if quiet else 'no':>12} {result['sends']:>9,} "
+              f"{1 - result['sends'] / baseline:>9.0%} {result['in_quiet']:>20,} {result['peak']:>10,}")
+    tasks = {}
+    for _, n in reminders:
+        tasks[n["user_id"]] = tasks.get(n["user_id"], 0) + 1
+    heavy = [u for u, count in tasks.items() if count >= 20]
+    before = sum(tasks[u] for u in heavy)
+    after = sum(result["per_user"].get(u, 0) for u in heavy)
+    print(f"\nThe {len(heavy):,} users with 20 or more reminders: {before:,} sends become {after:,} "
+          f"({1 - after / before:.0%} fewer), {after / len(heavy):.1f} per user over two days")
+
+    result = simulate(reminders, 900, True, max_pending=max_pending)
+    print(f"Capped at {max_pending:,} held: {result['sends']:,} sends "
+          f"({1 - result['sends'] / baseline:.0%} fewer), peak held {result['peak']:,}, "
+          f"{result['in_quiet']:,} released early in quiet hours")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sends saved by digesting reminders per user and channel")
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--max-pending", type=int, default=2_000)
+    args = parser.parse_args()
+    main(args.users, args.max_pending)
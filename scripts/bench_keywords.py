@@ -0,0 +1,81 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'priority-service')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import priority
+
+def vocabulary(rng: random.Random, size: int) -> list:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choices(letters, k=rng.randint(2, 10))) for _ in range(size)]
+
+def keyword_list(rng: random.Random, words: list, count: int) -> dict:
+    keywords = dict(priority.DEFAULT_KEYWORDS)
+    while len(keywords) < count:
+        keywords[" ".join(rng.choices(words, k=rng.choice((1, 1, 2, 3))))] = rng.choice((0.5, 1.0, 2.0))
+    return keywords
+
+def descriptions(rng: random.Random, words: list, count: int) -> list:
+    """Task descriptions of 10 to 200 words (60 to 1,200 characters), some with urgent wording"""
+    keywords = list(priority.DEFAULT_KEYWORDS)
+    texts = []
+    for _ in range(count):
+        text = rng.choices(words, k=rng.randint(10, 200))
+        for _ in range(rng.choice((0, 0, 1, 2))):
+            text.insert(rng.randrange(len(text)), rng.choice(keywords).upper())
+        texts.append(" ".join(text))
+    return texts
+
+def regex_per_keyword(keywords: dict):
+    patterns = [(re.compile(rf"\b{re.escape(k)}\b", re.IGNORECASE), w) for k, w in keywords.items()]
+    return lambda text: sum(w for pattern, w in patterns if pattern.search(text))
+
+def us_per_task(score, texts: list) -> float:
+    started = time.perf_counter()
+    for text in texts:
+        score(text)
+    return (time.perf_counter() - started) / len(texts) * 1e6
+
+def main(tasks: int, keyword_counts, regex_sample: int):
+    rng = random.Random(5)
+    words = vocabulary(rng, 20_000)
+    texts = descriptions(rng, words, tasks)
+    print(f"{tasks:,} descriptions, {sum(map(len, texts)) / len(texts):.0f} characters on average, "
+          f"{os.cpu_count()} CPUs\n")
+    print(f"{'keywords':>9} {'build':>9} {'regex/kw':>10} {'automaton':>10} {'batch':>10} {'pool batch':>11}")
+    for count in keyword_counts:
+        keywords = keyword_list(rng, words, count)
+        started = time.perf_counter()
+        scorer = priority.KeywordScorer({"default": keywords})
+        build = time.perf_counter() - started
+        regex = us_per_task(regex_per_keyword(keywords), texts[:regex_sample])
+        automaton = us_per_task(scorer.score, texts)
+
+        priority.KEYWORD_POOL_WORKERS = 0
+        started = time.perf_counter()
+        scorer.score_many(texts)
+        batch = (time.perf_counter() - started) / len(texts) * 1e6
+
+        priority.KEYWORD_POOL_WORKERS = max(2, os.cpu_count() or 1)
+        priority.KEYWORD_POOL_MIN_BATCH = 1
+        scorer.score_many(texts[:100])  # Start the pool outside the measurement
+        started = time.perf_counter()
+        scorer.score_many(texts)
+        pooled = (time.perf_counter() - started) / len(texts) * 1e6
+        scorer.load(scorer.lists)  # Shuts the pool down
+
+        print(f"{len(keywords):>9,} {build * 1000:>7.0f}ms {regex:>8.1f}µs {automaton:>8.1f}µs "
+              f"{batch:>8.1f}µs {pooled:>9.1f}µs")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="µs per task for keyword scoring, by number of keywords")
+    parser.add_argument("--tasks", type=int, default=20_000)
+    parser.add_argument("--keywords", default="25,1000,10000")
+    parser.add_argument("--regex-sample", type=int, default=200, help="Descriptions timed with regex per keyword")
+    args = parser.parse_args()
+    main(args.tasks, [int(n) for n in args.keywords.split(",")], args.regex_sample)
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+def start(service: str, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "localhost", "--port", str(port)],
+        cwd=os.path.join(ROOT, service),
+        env={**os.environ, "PYTHONPATH": ROOT, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+async def wait_ready(url: str) -> None:
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+async def seed(gateway: str, task_service: str, users: int, tasks: int, prefix: str) -> list:
+    """Register users and give each `tasks` tasks, written straight to the task service"""
+    rng = random.Random(7)
+    names = []
+    async with httpx.AsyncClient(timeout=30) as client:
+        for i in range(users):
+            username = f"{prefix}{i}"
+            response = await client.post(f"{gateway}/api/v1/users/", json={
+                "username": username, "email": f"{username}@example.com", "password": "password123",
+            })
+            user_id = response.json()["id"]
+            for j in range(tasks):
+                deadline = datetime.utcnow() + timedelta(hours=rng.randint(-48, 500))
+                await client.post(f"{task_service}/api/v1/tasks/create-task", headers={"X-User-ID": user_id}, json={
+                    "title": f"Task {j}", "description": "x" * rng.randint(20, 400),
+                    "status": rng.choice(["pending", "in_progress", "done"]),
+                    "priority": rng.choice(["low", "medium", "high", "urgent"]),
+                    "deadline": deadline.isoformat(),
+                })
+            names.append(username)
+    return names
+
+async def first_screen(gateway: str, usernames: list, think_time: float) -> dict:
+    """Log each user in, wait as a client would while rendering, then load the first screen"""
+    latencies = {"list": [], "dashboard": []}
+    async with httpx.AsyncClient(base_url=gateway, timeout=30) as client:
+        for username in usernames:
+            response = await client.post("/api/v1/auth/login", data={"username": username, "password": "password123"})
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            await asyncio.sleep(think_time)
+            for name, path in (("list", "/api/v1/tasks/list"), ("dashboard", "/api/v1/dashboard")):
+                started = time.perf_counter()
+                (await client.get(path, headers=headers)).raise_for_status()
+                latencies[name].append((time.perf_counter() - started) * 1000)
+    return latencies
+
+async def login_latency(gateway: str, usernames: list) -> list:
+    latencies = []
+    async with httpx.AsyncClient(base_url=gateway, timeout=30) as client:
+        for username in usernames:
+            started = time.perf_counter()
+            await client.post("/api/v1/auth/login", data={"username": username, "password": "password123"})
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+async def main(users: int, tasks: int, think_time: float, base_port: int):
+    workdir = tempfile.mkdtemp()
+    task_service = f"http://localhost:{base_port}"
+    ts_env = {"DATABASE_URL": f"sqlite:///{workdir}/tasks.db"}
+    subprocess.run(
+        [sys.executable, "-c", "import app.db.models; from app.db.database import Base, engine; "
+                               "Base.metadata.create_all(bind=engine)"],
+        cwd=os.path.join(ROOT, "task_service"), env={**os.environ, "PYTHONPATH": ROOT, **ts_env}, check=True,
+    )
+    processes = [start("task_service", base_port, ts_env)]
+    gateways = {}
+    for offset, warming in ((1, "false"), (2, "true")):
+        gateways[warming] = f"http://localhost:{base_port + offset}"
+        processes.append(start("api_gateway", base_port + offset, {
+            "DATABASE_URL": f"sqlite:///{workdir}/gateway_{warming}.db",
+            "TASK_SERVICE_URL": f"{task_service}/api/v1",
+            "RATE_LIMIT_ENABLED": "false",
+            "RESPONSE_CACHE_ENABLED": "true",
+            "LOGIN_WARMING_ENABLED": warming,
+        }))
+    try:
+        await wait_ready(f"{task_service}/api/v1/health")
+        for url in gateways.values():
+            await wait_ready(f"{url}/docs")
+        print(f"{users} users with {tasks} tasks each, {think_time * 1000:.0f} ms between login and first request\n")
+        print(f"{'warming':>8} {'login p50':>10} {'list p50':>9} {'list p95':>9} {'dash p50':>9} {'dash p95':>9}")
+        for warming, gateway in gateways.items():
+            usernames = await seed(gateway, task_service, users, tasks, f"warm{warming}_")
+            latencies = await first_screen(gateway, usernames, think_time)
+            logins = await login_latency(gateway, usernames)
+            print(f"{'on' if warming == 'true' else 'off':>8} {percentile(logins, 0.5):>8.1f}ms "
+                  f"{percentile(latencies['list'], 0.5):>7.1f}ms {percentile(latencies['list'], 0.95):>7.1f}ms "
+                  f"{percentile(latencies['dashboard'], 0.5):>7.1f}ms {percentile(latencies['dashboard'], 0.95):>7.1f}ms")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="First-screen latency after login, with and without cache warming")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--think-time", type=float, default=0.2)
+    parser.add_argument("--base-port", type=int, default=8301)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.tasks, args.think_time, args.base_port))
@@ -0,0 +1,175 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'api_gateway'))
+sys.path.insert(0, ROOT)
+
+from app.core.planner import DAY, Planner, PlanTask, WorkingHours, _order, work_segments
+
+PRIORITIES = ("low", "medium", "high", "urgent")
+DURATIONS = (900, 1800, 1800, 3600, 2 * 3600, 4 * 3600, 8 * 3600)
+
+def make_task(rng: random.Random, task_id: str, start: float, days: int) -> PlanTask:
+    """Deadlines from a week ago to past the end of the plan, a fifth without one"""
+    deadline = start + rng.uniform(-7 * DAY, days * DAY * 1.5) if rng.random() < 0.8 else None
+    return PlanTask(task_id, rng.choice(DURATIONS), deadline, rng.choice(PRIORITIES))
+
+def check(planner: Planner, start: float, days: int) -> list:
+    """Everything a plan must satisfy; returns the violations"""
+    plan = planner.plan(start, days)
+    segments = work_segments(planner.hours, start, days)
+    problems = []
+    order = sorted(_order(planner.get(p.id)) for p in plan.tasks)
+    if [key[-1] for key in order] != [p.id for p in plan.tasks]:
+        problems.append("tasks not in deadline order")
+    previous_end = start
+    segment = 0
+    for planned in plan.tasks:
+        task = planner.get(planned.id)
+        if sum(e - s for s, e in planned.blocks) + planned.unplanned != task.duration:
+            problems.append(f"{task.id}: blocks do not add up to its duration")
+        for s, e in planned.blocks:
+            if s < previous_end or e <= s:
+                problems.append(f"{task.id}: overlapping or empty block")
+            while segment < len(segments) and segments[segment][1] <= s:
+                segment += 1
+            if segment == len(segments) or not segments[segment][0] <= s < e <= segments[segment][1]:
+                problems.append(f"{task.id}: block outside working time")
+            previous_end = e
+        finish = planned.blocks[-1][1]
+        late = task.deadline is not None and (finish > task.deadline if not planned.unplanned
+                                              else task.deadline < plan.end)
+        if late != planned.late:
+            problems.append(f"{task.id}: late flag wrong")
+    if len(plan.tasks) + len(plan.unscheduled) != len(planner):
+        problems.append("tasks missing from the plan")
+    return problems
+
+def check_segments(hours: WorkingHours, start: float, days: int) -> list:
+    problems = []
+    segments = work_segments(hours, start, days)
+    for (s1, e1), (s2, e2) in zip(segments, segments[1:]):
+        if e1 - s1 > hours.break_frequency or s2 - e1 < hours.break_duration:
+            problems.append(f"segment at {s1}: run too long or break too short")
+    return problems
+
+def median_ms(samples):
+    return statistics.median(samples) * 1000
+
+def main(tasks: int, days: int, changes: int):
+    rng = random.Random(3)
+    start = (int(time.time()) // 60 + 1) * 60
+    hours = WorkingHours(9 * 3600, 17 * 3600, 15 * 60, 90 * 60)
+    task_list = [make_task(rng, f"task-{i:06d}", start, days) for i in range(tasks)]
+
+    # Correctness: invariants, including for a working day that runs past midnight
+    print("Checks (violations):")
+    night = WorkingHours(22 * 3600, 6 * 3600, 10 * 60, 120 * 60)
+    for name, h in (("9:00-17:00, 15 min every 90", hours), ("22:00-06:00, 10 min every 120", night)):
+        planner = Planner(h)
+        planner.set_tasks(task_list)
+        print(f"  {name}: segments {len(check_segments(h, start, days))}, "
+              f"plan {len(check(planner, start, days))}")
+
+    # Incremental re-planning gives the same plan as planning from scratch
+    planner = Planner(hours)
+    planner.set_tasks(task_list)
+    planner.plan(start, days)
+    current = {task.id: task for task in task_list}
+    mismatches = 0
+    for i in range(200):
+        action = rng.random()
+        if action < 0.7:
+            task = make_task(rng, rng.choice(list(current)), start, days)
+            current[task.id] = task
+            planner.update(task)
+        elif action < 0.85:
+            task_id = rng.choice(list(current))
+            del current[task_id]
+            planner.remove(task_id)
+        else:
+            task = make_task(rng, f"new-{i}", start, days)
+            current[task.id] = task
+            planner.update(task)
+        if i % 20 == 0 or i == 199:
+            fresh = Planner(hours)
+            fresh.set_tasks(current.values())
+            mismatches += planner.plan(start, days) != fresh.plan(start, days)
+    print(f"  incremental vs from scratch: {mismatches} mismatches; invariants {len(check(planner, start, days))}")
+    same = Planner(hours)
+    same.set_tasks(current.values())
+    changed = list(current.values())[:5]
+    changed = [t._replace(duration=t.duration + 600) for t in changed]
+    print(f"  sync() with 5 changed tasks re-planned {same.sync(list(current.values())[5:] + changed)} of them")
+
+    # Timings: the tasks above, far more work than fits in the plan, and the same tasks
+    # scaled to fill the working time exactly, so that every one of them is laid out
+    capacity = sum(e - s for s, e in work_segments(hours, start, days))
+    scale = capacity / sum(task.duration for task in task_list)
+    fitting = [task._replace(duration=max(60, int(task.duration * scale))) for task in task_list]
+    for name, listed in (("overbooked", task_list), ("filling the plan", fitting)):
+        timings(rng, hours, listed, start, days, changes, name)
+
+def timings(rng: random.Random, hours: WorkingHours, task_list: list, start: float, days: int,
+            changes: int, name: str):
+    planner = Planner(hours)
+    planner.set_tasks(task_list)
+    result = planner.plan(start, days)
+    late = sum(p.late for p in result.tasks)
+    print(f"\n{len(task_list):,} tasks over {days} days, {name}: {len(result.tasks):,} planned, "
+          f"{late:,} late, {len(result.unscheduled):,} beyond the plan")
+
+    full = []
+    for _ in range(changes):
+        started = time.perf_counter()
+        planner = Planner(hours)
+        planner.set_tasks(task_list)
+        planner.plan(start, days)
+        full.append(time.perf_counter() - started)
+
+    incremental, tail, next_minute, sync = [], [], [], []
+    for _ in range(changes):
+        task = rng.choice(task_list)
+        task = task._replace(deadline=(task.deadline or start) + rng.uniform(-DAY, DAY))
+        started = time.perf_counter()
+        planner.update(task)
+        planner.plan(start, days)
+        incremental.append(time.perf_counter() - started)
+    latest = max(planner.plan(start, days).tasks, key=lambda p: p.blocks[0][0])
+    for _ in range(changes):
+        task = planner.get(latest.id)
+        started = time.perf_counter()
+        planner.update(task._replace(duration=task.duration % 3600 + 900))
+        planner.plan(start, days)
+        tail.append(time.perf_counter() - started)
+    for minute in range(1, changes + 1):
+        started = time.perf_counter()
+        planner.plan(start + minute * 60, days)
+        next_minute.append(time.perf_counter() - started)
+    tasks_now = [planner.get(task.id) for task in task_list]
+    for _ in range(changes):
+        i = rng.randrange(len(tasks_now))
+        tasks_now[i] = tasks_now[i]._replace(priority=rng.choice(PRIORITIES))
+        started = time.perf_counter()
+        planner.sync(tasks_now)
+        planner.plan(start + changes * 60, days)
+        sync.append(time.perf_counter() - started)
+
+    print(f"  from scratch (sort and lay out)        {median_ms(full):7.2f} ms")
+    print(f"  one task changed, anywhere             {median_ms(incremental):7.2f} ms")
+    print(f"  one task changed, near the end         {median_ms(tail):7.2f} ms")
+    print(f"  same tasks, a minute later             {median_ms(next_minute):7.2f} ms")
+    print(f"  sync() of the full list, one changed   {median_ms(sync):7.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Correctness and speed of the auto-scheduling planner")
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--changes", type=int, default=50, help="Timed runs of each kind")
+    args = parser.parse_args()
+    main(args.tasks, args.days, args.changes)
@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'priority-service')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+import priority
+from main import app
+
+def backlog(count: int, rng: random.Random) -> dict:
+    now = datetime.now()
+    return {
+        "due_dates": [(now + timedelta(seconds=rng.randint(-86400, 30 * 86400))).strftime(priority.DUE_DATE_FORMAT)
+                      for _ in range(count)],
+        "priorities": [rng.choice(list(priority.PRIORITY_WEIGHTS)) for _ in range(count)],
+        "estimated_durations": [rng.randint(0, 8) * 1800 for _ in range(count)],
+    }
+
+def best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+async def main(sizes, use_cache: bool, repeat: int):
+    rng = random.Random(3)
+    transport = httpx.ASGITransport(app=app)
+    print(f"{'tasks':>7} {'scalar':>10} {'numpy':>10} {'POST /batch':>12} {'µs/task':>8} {'tasks/s':>10}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://priority-service", timeout=120) as client:
+        for size in sizes:
+            body = backlog(size, rng)
+            if use_cache:
+                body["task_ids"] = list(range(size))
+            # The per-task path /priority/ runs, minus its HTTP call and Redis round trips
+            scalar = best_of(repeat, lambda: [priority.calculate_priority(d, "") for d in body["due_dates"]])
+            vector = best_of(repeat, lambda: priority.calculate_priorities(
+                body["due_dates"], body["priorities"], body["estimated_durations"]))
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = await client.post("/priority/batch", json=body)
+                best = min(best, time.perf_counter() - started)
+                response.raise_for_status()
+            print(f"{size:>7,} {scalar * 1000:>8.2f}ms {vector * 1000:>8.2f}ms {best * 1000:>10.2f}ms "
+                  f"{best / size * 1e6:>8.2f} {size / best:>10,.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of POST /priority/batch by batch size")
+    parser.add_argument("--sizes", default="1,10,100,1000,10000,100000")
+    parser.add_argument("--cache", action="store_true", help="Send task ids so results go through Redis")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main([int(n) for n in args.sizes.split(",")], args.cache, args.repeat))
@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'task_service'))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_sweep.db')}")
+
+import httpx
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.priority_sweeper import PrioritySweeper
+from app.db.database import Base, engine
+from app.db.models import Task
+
+def seed(count: int, now: datetime) -> None:
+    """`count` tasks spread across users, with deadlines from a month ago to two months ahead"""
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(11)
+    users = [str(uuid.uuid4()) for _ in range(1000)]
+    for start in range(0, count, 50_000):
+        rows = [
+            {
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "user_id": rng.choice(users),
+                "title": f"Task {start + i}",
+                "status": rng.choice(["pending", "pending", "in_progress", "done"]),
+                "priority": rng.choice(["low", "medium", "high", "urgent"]),
+                "deadline": now + timedelta(seconds=rng.randint(-30 * 86400, 60 * 86400)),
+                "tags": [],
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(min(50_000, count - start))
+        ]
+        with engine.begin() as conn:
+            conn.execute(Task.__table__.insert(), rows)
+
+def start_priority_service(port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=os.path.join(ROOT, "priority-service"),
+        env={**os.environ, "PYTHONPATH": ROOT},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+def wait_ready(url: str) -> None:
+    for _ in range(100):
+        try:
+            httpx.get(url)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+def full_scan_seconds() -> float:
+    """What re-scoring every open task each sweep would have to read"""
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT id, priority, deadline FROM tasks WHERE status != 'done'")).fetchall()
+    return time.perf_counter() - started
+
+async def main(tasks: int, port: int):
+    now = datetime.utcnow().replace(microsecond=0)
+    started = time.perf_counter()
+    seed(tasks, now)
+    print(f"Seeded {tasks:,} tasks in {time.perf_counter() - started:.0f}s")
+
+    service = start_priority_service(port)
+    settings.PRIORITY_SERVICE_URL = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(f"{settings.PRIORITY_SERVICE_URL}/docs")
+        sweeper = PrioritySweeper()
+        with engine.connect() as conn:
+            since, until = now, now + timedelta(minutes=1)
+            plan = conn.execute(text(
+                "EXPLAIN QUERY PLAN SELECT id FROM tasks WHERE "
+                "((deadline > :a AND deadline <= :b) OR (deadline > :c AND deadline <= :d)) "
+                "AND status != 'done' AND priority != 'urgent'"
+            ), {"a": since, "b": until, "c": since + timedelta(days=1), "d": until + timedelta(days=1)}).fetchall()
+            print("Crossing query plan:", "; ".join(row[-1] for row in plan))
+        print(f"Reading every open task instead: {full_scan_seconds() * 1000:.0f} ms per sweep\n")
+
+        await sweeper._score([now])  # Warm up the connection to priority-service
+        print(f"{'window':>8} {'crossed':>8} {'escalated':>10} {'sweep':>9} {'µs/crossing':>12}")
+        cursor = now
+        for window in (timedelta(minutes=1), timedelta(minutes=10), timedelta(hours=1), timedelta(hours=6),
+                       timedelta(days=1)):
+            sweeper.swept_until = cursor
+            rows = len(sweeper._load_crossings(cursor, cursor + window))
+            started = time.perf_counter()
+            escalated = await sweeper.sweep(until=cursor + window)
+            elapsed = time.perf_counter() - started
+            print(f"{str(window):>8} {rows:>8,} {escalated:>10,} {elapsed * 1000:>7.1f}ms "
+                  f"{elapsed / max(rows, 1) * 1e6:>12.1f}")
+            cursor += window
+        await sweeper.stop()
+    finally:
+        service.terminate()
+        service.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Priority sweep cost by number of tasks crossing a threshold")
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--port", type=int, default=8402)
+    args = parser.parse_args()
+    asyncio.run(main(args.tasks, args.port))
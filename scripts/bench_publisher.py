@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'notification-service')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from broker import MemoryBroker
+from publisher import AsyncPublisher
+
+def body(i: int) -> bytes:
+    return json.dumps({"task_id": i, "message": f"Reminder: Task {i} is due in 1.0 hours."}).encode()
+
+async def throughput(messages: int, latency: float, channels: int, window: int) -> float:
+    """Messages per second from publish() to confirm"""
+    broker = MemoryBroker(confirm_latency=latency)
+    publisher = AsyncPublisher(broker, channels=channels, window=window, buffer_size=10_000)
+    await publisher.start()
+    started = time.perf_counter()
+    confirms = [await publisher.publish(body(i)) for i in range(messages)]
+    await asyncio.gather(*confirms)
+    elapsed = time.perf_counter() - started
+    await publisher.close()
+    assert len(broker.queues["task_notifications"]) == messages
+    return messages / elapsed
+
+async def faults(messages: int) -> None:
+    """Nacks and a dropped connection mid-run: every message is still confirmed"""
+    broker = MemoryBroker(confirm_latency=0.001)
+    publisher = AsyncPublisher(broker, channels=4, window=100)
+    await publisher.start()
+    broker.nack_next(50)
+    confirms = []
+    for i in range(messages):
+        confirms.append(await publisher.publish(body(i)))
+        if i == messages // 2:
+            await asyncio.sleep(0.01)  # Let some windows go out, then cut them off unconfirmed
+            broker.disconnect()
+    await asyncio.gather(*confirms)
+    await publisher.close()
+    delivered = {json.loads(b)["task_id"] for b in broker.queues["task_notifications"]}
+    print(f"Faults: {messages:,} confirmed after 50 nacks and a disconnect, {broker.connects} connects, "
+          f"{len(delivered):,} distinct delivered, "
+          f"{len(broker.queues['task_notifications']) - len(delivered):,} duplicates")
+
+async def backpressure(buffer_size: int) -> None:
+    """A stalled broker holds confirms back: the buffer fills and publish() waits instead of growing"""
+    broker = MemoryBroker()
+    broker.stalled = True
+    publisher = AsyncPublisher(broker, channels=2, window=100, buffer_size=buffer_size)
+    await publisher.start()
+
+    async def produce():
+        return [await publisher.publish(body(i)) for i in range(buffer_size * 5)]
+
+    producer = asyncio.create_task(produce())
+    await asyncio.sleep(0.5)
+    stats = publisher.stats()
+    print(f"Stalled broker: {stats['buffered']:,} buffered and {stats['inflight']:,} in flight "
+          f"(buffer {buffer_size:,}, 2 windows of 100), producer still waiting: {not producer.done()}")
+    broker.resume()
+    confirms = await producer
+    started = time.perf_counter()
+    await asyncio.gather(*confirms)
+    print(f"Resumed: the remaining {len(confirms) - stats['inflight']:,} published in "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms")
+    await publisher.close()
+
+async def main(messages: int, latency: float):
+    print(f"{messages:,} messages, {latency * 1000:g} ms confirm round trip\n")
+    print(f"{'channels':>9} {'window':>7} {'msgs/s':>10}")
+    for channels, window in ((1, 1), (4, 1), (1, 100), (4, 100), (8, 500)):
+        rate = await throughput(messages, latency, channels, window)
+        print(f"{channels:>9} {window:>7} {rate:>10,.0f}")
+    print()
+    await faults(10_000)
+    await backpressure(1_000)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AsyncPublisher throughput against the in-memory broker")
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--latency", type=float, default=0.001, help="Seconds from publish to confirm")
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.latency))
@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'notification-service')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from broker import MemoryBroker
+from notify import NotificationSender
+from publisher import AsyncPublisher
+from reminders import ReminderScheduler, ReminderStore
+from timing_wheel import TimingWheel
+
+def wheel_costs(entries: int) -> None:
+    """µs per add and cancel with `entries` reminders due within the day already held"""
+    rng = random.Random(3)
+    now = int(time.time())
+    fire_times = [now + rng.randint(1, TimingWheel(now).span) for _ in range(entries)]
+    tracemalloc.start()
+    wheel = TimingWheel(now)
+    for key, fire_at in enumerate(fire_times):
+        wheel.add(key, fire_at, (fire_at, fire_at + 3600, None))
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    wheel = TimingWheel(now)
+    started = time.perf_counter()
+    for key, fire_at in enumerate(fire_times):
+        wheel.add(key, fire_at, (fire_at, fire_at + 3600, None))
+    add = (time.perf_counter() - started) / entries * 1e6
+    started = time.perf_counter()
+    for key in range(0, entries, 10):
+        wheel.cancel(key)
+    cancel = (time.perf_counter() - started) / (entries // 10) * 1e6
+    started = time.perf_counter()
+    fired = len(wheel.advance(now + 3600))
+    advance = time.perf_counter() - started
+    print(f"Wheel with {entries:,} entries: add {add:.2f} µs, cancel {cancel:.2f} µs, "
+          f"{memory / entries:.0f} bytes each; an hour of ticks fired {fired:,} in {advance * 1000:.0f} ms")
+
+def store_costs(path: str, pending: int, days: int) -> ReminderStore:
+    rng = random.Random(4)
+    now = int(time.time())
+    store = ReminderStore(path)
+    started = time.perf_counter()
+    for start in range(0, pending, 100_000):
+        rows = []
+        for i in range(start, min(pending, start + 100_000)):
+            fire_at = now + rng.randint(60, days * 86400)
+            rows.append((f"task-{i}", fire_at, fire_at + 3600, f"user-{i % 5000}", "email", 9 * 3600, 17 * 3600))
+        store.put_many(rows)
+    print(f"Stored {pending:,} reminders over {days} days in {time.perf_counter() - started:.1f}s")
+    return store
+
+async def scheduler_costs(store: ReminderStore, schedules: int, fire: int) -> None:
+    broker = MemoryBroker(confirm_latency=0.001)
+    sender = NotificationSender(AsyncPublisher(broker))
+    await sender.start()
+    scheduler = ReminderScheduler(store, sender, horizon=3600)
+    started = time.perf_counter()
+    await scheduler.start()
+    print(f"Startup with {len(store):,} pending: loaded the {len(scheduler.wheel):,} due within the hour "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(5)
+    now = int(time.time())
+    started = time.perf_counter()
+    for i in range(schedules):
+        fire_at = now + rng.randint(60, 30 * 86400)
+        scheduler.schedule(f"task-{i}", fire_at, fire_at + 3600)  # Reschedules existing tasks
+    print(f"schedule(): {(time.perf_counter() - started) / schedules * 1e6:.0f} µs each, "
+          f"including the SQLite write")
+
+    # Reminders due over the next few seconds: how late does each reach the broker?
+    now = int(time.time())
+    for i in range(fire):
+        scheduler.schedule(f"soon-{i}", now + 2 + i % 3, now + 3600)
+    seen = {}
+    deadline = time.time() + 8
+    while len(seen) < fire and time.time() < deadline:
+        await asyncio.sleep(0.01)
+        queue = broker.queues.get("task_notifications", ())
+        while queue:
+            message = json.loads(queue.popleft())
+            seen.setdefault(message["task_id"], time.time() - message["fire_at"])
+    late = sorted(v for k, v in seen.items() if k.startswith("soon-"))
+    print(f"Fired {len(late):,} of {fire:,} due in 2-4 s; delay after their second: "
+          f"median {late[len(late) // 2] * 1000:.0f} ms, max {late[-1] * 1000:.0f} ms")
+    await scheduler.stop()
+    await sender.close()
+    scheduler.close()
+
+def main(pending: int, schedules: int, fire: int):
+    wheel_costs(min(pending, 1_000_000))
+    path = os.path.join(tempfile.mkdtemp(), "bench_reminders.db")
+    store = store_costs(path, pending, 30)
+    asyncio.run(scheduler_costs(store, schedules, fire))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reminder scheduling costs with many pending reminders")
+    parser.add_argument("--pending", type=int, default=2_000_000)
+    parser.add_argument("--schedules", type=int, default=20_000, help="Reschedules timed through the scheduler")
+    parser.add_argument("--fire", type=int, default=5_000, help="Reminders timed from due to published")
+    args = parser.parse_args()
+    main(args.pending, args.schedules, args.fire)
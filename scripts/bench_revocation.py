@@ -0,0 +1,47 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'api_gateway')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.core.revocation import RevocationList
+
+def build(revoked: int, users: int) -> RevocationList:
+    revocations = RevocationList()
+    expires = time.time() + 3600
+    for _ in range(revoked):
+        revocations.apply(uuid.uuid4().hex, None, time.time(), expires)
+    for _ in range(users):
+        revocations.apply(None, str(uuid.uuid4()), time.time(), expires)
+    return revocations
+
+def check_ns(revocations: RevocationList, payloads, iterations: int) -> float:
+    is_revoked = revocations.is_revoked
+    started = time.perf_counter()
+    for _ in range(iterations // len(payloads)):
+        for jti, sub, iat in payloads:
+            is_revoked(jti, sub, iat)
+    return (time.perf_counter() - started) / iterations * 1e9
+
+def main(iterations: int):
+    payloads = [(uuid.uuid4().hex, str(uuid.uuid4()), int(time.time())) for _ in range(1000)]
+    print(f"{'revoked jtis':>12} {'revoked users':>14} {'ns/check':>9} {'memory':>10} {'bytes/entry':>12}")
+    for revoked, users in ((0, 0), (1_000, 0), (100_000, 0), (100_000, 1_000), (1_000_000, 0)):
+        tracemalloc.start()
+        revocations = build(revoked, users)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        ns = check_ns(revocations, payloads, iterations)
+        per_entry = memory / (revoked + users) if revoked + users else 0
+        print(f"{revoked:>12,} {users:>14,} {ns:>9.0f} {memory / 2**20:>8.1f}MB {per_entry:>12.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost of the in-memory token revocation check")
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    args = parser.parse_args()
+    main(args.iterations)
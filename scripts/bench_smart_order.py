@@ -0,0 +1,215 @@
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'task_service'))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_smart.db')}")
+
+import httpx
+from sqlalchemy import text
+from app.api.tasks import smart_order
+from app.core.priority_sweeper import PrioritySweeper
+from app.core.urgency import urgency_score
+from app.core.urgency_refresher import UrgencyRefresher
+from app.db.database import Base, SessionLocal, engine, migrate_db
+from app.db.models import Task
+from main import app
+
+STATUSES = ("pending", "pending", "in_progress", "done")
+PRIORITIES = ("low", "medium", "high", "urgent")
+
+def seed(users: list, per_user: list, now: datetime) -> None:
+    """Tasks with deadlines from two months ago to three months ahead, a fifth without one"""
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(7)
+    for user_id, count in zip(users, per_user):
+        for start in range(0, count, 50_000):
+            rows = [
+                {
+                    "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "user_id": str(user_id),
+                    "title": f"Task {start + i}",
+                    "status": rng.choice(STATUSES),
+                    "priority": rng.choice(PRIORITIES),
+                    "estimated_duration": rng.choice([None, 1800, 3600, 4 * 3600, 3 * 86400]),
+                    "deadline": (now + timedelta(seconds=rng.randint(-60 * 86400, 90 * 86400))
+                                 if rng.random() < 0.8 else None),
+                    "tags": [],
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for i in range(min(50_000, count - start))
+            ]
+            with engine.begin() as conn:
+                conn.execute(Task.__table__.insert(), rows)
+
+def check_scores(now: datetime) -> int:
+    """Every stored score against urgency_score() at `now`; returns the mismatches"""
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT priority, deadline, estimated_duration, urgency_score FROM tasks"
+        )).fetchall()
+    wrong = 0
+    for priority, deadline, duration, score in rows:
+        deadline = datetime.fromisoformat(deadline) if deadline else None
+        wrong += urgency_score(priority, deadline, duration, now) != score
+    return wrong
+
+def expected(user_id: uuid.UUID, statuses, priority, descending: bool, limit: int) -> list:
+    """Scores of the first page, from every matching task sorted in Python"""
+    db = SessionLocal()
+    try:
+        query = db.query(Task.urgency_score).filter(Task.user_id == user_id, Task.status.in_(statuses))
+        if priority:
+            query = query.filter(Task.priority == priority)
+        return sorted((score for score, in query), reverse=descending)[:limit]
+    finally:
+        db.close()
+
+def explain(user_id: uuid.UUID) -> list:
+    db = SessionLocal()
+    try:
+        query = db.query(Task).filter(Task.user_id == user_id, Task.status == "pending")
+        statement = query.order_by(Task.urgency_score.desc()).limit(20).statement.compile(engine)
+        params = [str(v) if isinstance(v, uuid.UUID) else v
+                  for v in (statement.params[name] for name in statement.positiontup)]
+        with engine.connect() as conn:
+            return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(params))]
+    finally:
+        db.close()
+
+def timed(fn, runs: int) -> float:
+    """Median milliseconds of `fn`"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def python_sorted(user_id: uuid.UUID, now: datetime, limit: int) -> list:
+    """The alternative: read all the user's open tasks and rank them in Python"""
+    db = SessionLocal()
+    try:
+        tasks = db.query(Task).filter(Task.user_id == user_id, Task.status != "done").all()
+        tasks.sort(key=lambda t: urgency_score(t.priority, t.deadline, t.estimated_duration, now), reverse=True)
+        return tasks[:limit]
+    finally:
+        db.close()
+
+def indexed(user_id: uuid.UUID, status, priority, limit: int) -> list:
+    db = SessionLocal()
+    try:
+        query = db.query(Task).filter(Task.user_id == user_id)
+        if priority:
+            query = query.filter(Task.priority == priority)
+        return smart_order(query, status, priority, True, limit)
+    finally:
+        db.close()
+
+async def main(heavy: int, others: int, per_other: int, runs: int):
+    now = datetime.utcnow().replace(microsecond=0)
+    users = [uuid.uuid4() for _ in range(1 + others)]
+    started = time.perf_counter()
+    seed(users, [heavy] + [per_other] * others, now)
+    total = heavy + others * per_other
+    print(f"Seeded {total:,} tasks ({heavy:,} for one user) in {time.perf_counter() - started:.0f}s")
+
+    # Existing databases: the column is added with every score 0, then recomputed once
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_tasks_user_status_urgency"))
+        conn.execute(text("ALTER TABLE tasks DROP COLUMN urgency_score"))
+    added = migrate_db()
+    refresher = UrgencyRefresher()
+    started = time.perf_counter()
+    await refresher.refresh(now, full=True)
+    print(f"Migration added {added}; rescored every task in {time.perf_counter() - started:.1f}s")
+    print(f"  scores wrong after migration: {check_scores(now)}")
+
+    # ORM writes score the task themselves
+    db = SessionLocal()
+    task = Task(user_id=users[0], title="Written through the ORM", priority="low",
+                deadline=now + timedelta(hours=3), estimated_duration=3600)
+    db.add(task)
+    db.commit()
+    created = task.urgency_score
+    task.priority = "urgent"
+    db.commit()
+    print(f"  ORM insert scored {created}, update to urgent scored {task.urgency_score}")
+    db.close()
+
+    # The refresher keeps up as time passes, writing only the scores that changed
+    later = now + timedelta(days=2)
+    started = time.perf_counter()
+    rescored = await refresher.refresh(later)
+    print(f"Refresh two days later: {rescored:,} of {total:,} tasks rescored in "
+          f"{time.perf_counter() - started:.2f}s; scores wrong: {check_scores(later)}")
+
+    # Escalations by the priority sweeper bypass the ORM but keep the score in step
+    with engine.connect() as conn:
+        ids = [row[0] for row in conn.execute(text(
+            "SELECT id FROM tasks WHERE priority IN ('low', 'medium') AND status != 'done' LIMIT 2000"
+        ))]
+    escalated = PrioritySweeper()._apply({"high": ids[:1000], "urgent": ids[1000:]}, later)
+    print(f"Sweeper escalated {escalated} tasks; scores wrong: {check_scores(later)}")
+
+    # The endpoint against a sort of every matching task
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        cases = [
+            (None, None, "desc", 20), ("pending", None, "desc", 20), ("pending,in_progress", None, "desc", 50),
+            ("done", "high", "desc", 20), (None, "low", "asc", 20), (None, None, "desc", 1000),
+        ]
+        mismatches = 0
+        for status, priority, order, limit in cases:
+            params = {"sort_by": "smart", "sort_order": order, "limit": limit}
+            params.update({k: v for k, v in (("status", status), ("priority", priority)) if v})
+            response = await client.get("/api/v1/tasks/list-tasks", params=params, headers={"X-User-ID": str(users[0])})
+            response.raise_for_status()
+            got = response.json()
+            statuses = status.split(",") if status else ["pending", "in_progress", "done"]
+            ok = all(t["status"] in statuses and (not priority or t["priority"] == priority) for t in got)
+            db = SessionLocal()
+            scores = [db.get(Task, uuid.UUID(t["id"])).urgency_score for t in got]
+            db.close()
+            ok = ok and scores == expected(users[0], statuses, priority, order == "desc", limit)
+            mismatches += not ok
+        print(f"Endpoint orders checked: {len(cases)}, mismatches: {mismatches}")
+
+        print("Query plan for one status:")
+        for line in explain(users[0]):
+            print(f"  {line}")
+
+        print(f"\nTop 20 for the {heavy:,}-task user, median of {runs}:")
+        print(f"  all open tasks ranked in Python  {timed(lambda: python_sorted(users[0], later, 20), 3):8.2f} ms")
+        print(f"  smart, all statuses             {timed(lambda: indexed(users[0], None, None, 20), runs):8.2f} ms")
+        print(f"  smart, pending and in progress  "
+              f"{timed(lambda: indexed(users[0], 'pending,in_progress', None, 20), runs):8.2f} ms")
+        print(f"  smart, priority=urgent          {timed(lambda: indexed(users[0], None, 'urgent', 20), runs):8.2f} ms")
+        print(f"  smart, priority=low             {timed(lambda: indexed(users[0], None, 'low', 20), runs):8.2f} ms")
+
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            response = await client.get("/api/v1/tasks/list-tasks", params={"sort_by": "smart", "limit": 20},
+                                        headers={"X-User-ID": str(users[0])})
+            samples.append((time.perf_counter() - started) * 1000)
+        print(f"  GET /list-tasks?sort_by=smart&limit=20  {statistics.median(samples):8.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Correctness and top-20 latency of sort_by=smart")
+    parser.add_argument("--heavy", type=int, default=100_000, help="Tasks of the user whose list is timed")
+    parser.add_argument("--others", type=int, default=20, help="Other users")
+    parser.add_argument("--per-other", type=int, default=5_000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.heavy, args.others, args.per_other, args.runs))
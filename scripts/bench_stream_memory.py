@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'api_gateway')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_stream.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_PATH}")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from app.api.events import router
+from app.core.security import create_access_token, get_password_hash
+from app.db.database import Base, SessionLocal, engine
+from app.db.models import User
+from fastapi import FastAPI
+from shared.events import task_events
+
+def create_users(count: int) -> list:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        password_hash = get_password_hash("password123")
+        users = [
+            User(username=f"user{i}", email=f"user{i}@example.com", password_hash=password_hash)
+            for i in range(count)
+        ]
+        db.add_all(users)
+        db.commit()
+        return [str(user.id) for user in users]
+    finally:
+        db.close()
+
+class Connection:
+    """Drives one ASGI connection and records what the server sent"""
+
+    def __init__(self, app, scope):
+        self.kind = scope["type"]
+        self.disconnected = asyncio.get_running_loop().create_future()
+        self.ready = asyncio.get_running_loop().create_future()
+        self.received = 0
+        self.task = asyncio.create_task(app(scope, self.receive, self.send))
+
+    async def receive(self):
+        if self.kind == "websocket" and not self.ready.done():
+            return {"type": "websocket.connect"}
+        await self.disconnected
+        return {"type": f"{self.kind}.disconnect"}
+
+    async def send(self, message):
+        kind = message["type"]
+        if kind in ("http.response.body", "websocket.send"):
+            self.received += 1
+        if kind in ("http.response.body", "websocket.accept") and not self.ready.done():
+            self.ready.set_result(None)
+
+    async def close(self):
+        self.disconnected.set_result(None)
+        try:
+            await asyncio.wait_for(self.task, 5)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+
+def sse_scope(token: str) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/tasks/stream", "raw_path": b"/tasks/stream",
+        "query_string": b"", "root_path": "", "client": ("127.0.0.1", 1), "server": ("test", 80),
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+    }
+
+def ws_scope(token: str) -> dict:
+    return {
+        "type": "websocket", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "scheme": "ws", "path": "/tasks/ws", "raw_path": b"/tasks/ws",
+        "query_string": f"access_token={token}".encode(), "root_path": "",
+        "client": ("127.0.0.1", 1), "server": ("test", 80), "headers": [], "subprotocols": [],
+    }
+
+async def run(kind: str, connections: int, tokens: list, user_ids: list, app) -> None:
+    build_scope = sse_scope if kind == "http" else ws_scope
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    opened = []
+    for i in range(connections):
+        opened.append(Connection(app, build_scope(tokens[i % len(tokens)])))
+    await asyncio.gather(*(c.ready for c in opened))
+    open_seconds = time.perf_counter() - started
+    gc.collect()
+    per_connection = (tracemalloc.get_traced_memory()[0] - baseline) / connections
+    tracemalloc.stop()
+
+    # Fan one event out to every user and wait until each connection has it
+    before = sum(c.received for c in opened)
+    started = time.perf_counter()
+    for user_id in user_ids:
+        await task_events.publish(user_id, "task.updated", user_id, {"title": "Benchmark"})
+    while sum(c.received for c in opened) < before + connections:
+        await asyncio.sleep(0)
+    fanout_ms = (time.perf_counter() - started) * 1000
+
+    await asyncio.gather(*(c.close() for c in opened))
+    label = "SSE" if kind == "http" else "WebSocket"
+    print(f"{label:>9} {connections:>11,} {open_seconds:>8.1f}s {per_connection / 1024:>10.1f}KB {fanout_ms:>10.1f}ms "
+          f"{task_events.hub.stats()['connections']:>9}")
+
+async def main(connections: int, users: int):
+    app = FastAPI()
+    app.include_router(router, prefix="/tasks")
+    user_ids = create_users(users)
+    tokens = [create_access_token(user_id) for user_id in user_ids]
+    print(f"{'transport':>9} {'connections':>11} {'open':>9} {'mem/conn':>12} {'fan-out':>12} {'left open':>9}")
+    await run("http", connections, tokens, user_ids, app)
+    await run("websocket", connections, tokens, user_ids, app)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory per idle task event stream and fan-out time")
+    parser.add_argument("--connections", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.connections, args.users))
@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from shared.compression import SUPPORTED_ENCODINGS, compress
+from shared.schemas.tasks import TaskResponse
+from shared.wire import dumps_json, msgpack, packb, unpackb
+
+WORDS = (
+    "review update deploy client invoice meeting draft report fix migrate "
+    "schedule follow budget design test release backlog sprint notes call"
+).split()
+
+DATETIME_FIELDS = ("deadline", "reminder_time", "created_at", "updated_at", "completed_at")
+
+def make_tasks(count: int):
+    """`count` TaskResponse payloads as the task service builds them"""
+    now = datetime(2026, 1, 1, 9, 0)
+    rng = random.Random(42)
+    user_id = uuid.UUID(int=rng.getrandbits(128))
+    tasks = []
+    for _ in range(count):
+        created = now - timedelta(days=rng.randint(0, 90), seconds=rng.randint(0, 86400))
+        tasks.append(TaskResponse(
+            id=uuid.UUID(int=rng.getrandbits(128)),
+            user_id=user_id,
+            title=" ".join(rng.choices(WORDS, k=4)).capitalize(),
+            description=" ".join(rng.choices(WORDS, k=rng.randint(5, 40))),
+            status=rng.choice(["pending", "in_progress", "done"]),
+            priority=rng.choice(["low", "medium", "high", "urgent"]),
+            estimated_duration=rng.choice([None, 900, 1800, 3600]),
+            deadline=now + timedelta(hours=rng.randint(1, 2000)),
+            reminder_time=now + timedelta(hours=rng.randint(1, 2000)),
+            tags=rng.sample(WORDS, k=rng.randint(0, 3)),
+            created_at=created,
+            updated_at=created,
+            completed_at=created + timedelta(hours=1) if rng.random() < 0.3 else None,
+        ).model_dump())
+    return tasks
+
+def json_loads_typed(body: bytes):
+    """What a JSON consumer must do to get the same native types msgpack yields"""
+    tasks = json.loads(body)
+    for task in tasks:
+        task["id"] = uuid.UUID(task["id"])
+        task["user_id"] = uuid.UUID(task["user_id"])
+        for field in DATETIME_FIELDS:
+            if task[field] is not None:
+                task[field] = datetime.fromisoformat(task[field])
+    return tasks
+
+def rate(fn, count: int, repeat: int) -> float:
+    """Best-of-`repeat` throughput in tasks per second"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return count / best
+
+def main(count: int, repeat: int):
+    if msgpack is None:
+        sys.exit("msgpack is not installed")
+    tasks = make_tasks(count)
+    as_json = dumps_json(tasks)
+    as_msgpack = packb(tasks)
+    assert unpackb(as_msgpack) == json_loads_typed(as_json)
+
+    print(f"=== {count} TaskResponse payloads ===")
+    print(f"{'format':<8} {'bytes':>10} {'bytes/task':>11}", *(f"{e:>8}" for e in SUPPORTED_ENCODINGS))
+    for name, body in (("json", as_json), ("msgpack", as_msgpack)):
+        compressed = [len(compress(body, e)) for e in SUPPORTED_ENCODINGS]
+        print(f"{name:<8} {len(body):>10} {len(body) / count:>11.1f}", *(f"{c:>8}" for c in compressed))
+
+    print(f"\n{'operation':<36} {'tasks/s':>12}")
+    for label, fn in (
+        ("json encode", lambda: dumps_json(tasks)),
+        ("msgpack encode", lambda: packb(tasks)),
+        ("json decode (strings)", lambda: json.loads(as_json)),
+        ("json decode + parse datetimes/UUIDs", lambda: json_loads_typed(as_json)),
+        ("msgpack decode (native types)", lambda: unpackb(as_msgpack)),
+        ("msgpack -> json at the edge", lambda: dumps_json(unpackb(as_msgpack))),
+    ):
+        print(f"{label:<36} {rate(fn, count, repeat):>12,.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON vs msgpack for TaskResponse payloads")
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.tasks, args.repeat)
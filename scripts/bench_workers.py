@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def seed(env: dict, user_id: str, tasks: int) -> None:
+    script = (
+        "import random, uuid; from datetime import datetime, timedelta\n"
+        "import app.db.models; from app.db.database import Base, engine; from app.db.models import Task\n"
+        "Base.metadata.create_all(bind=engine)\n"
+        "rng = random.Random(1); now = datetime(2026, 1, 1)\n"
+        f"rows = [dict(id=str(uuid.uuid4()), user_id='{user_id}', title=f'Task {{i}}', description='x' * 200,\n"
+        "             status=rng.choice(['pending', 'in_progress', 'done']), priority=rng.choice(['low', 'high']),\n"
+        "             deadline=now + timedelta(hours=rng.randint(1, 2000)), tags=[], created_at=now, updated_at=now)\n"
+        f"        for i in range({tasks})]\n"
+        "with engine.begin() as conn: conn.execute(Task.__table__.insert(), rows)\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=os.path.join(ROOT, "task_service"),
+                   env={**os.environ, "PYTHONPATH": ROOT, **env}, check=True)
+
+def start(workers: int, port: int, mode: str, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "main.py", "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1",
+         "--mode", mode],
+        cwd=os.path.join(ROOT, "task_service"),
+        env={**os.environ, "PYTHONPATH": ROOT, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+def wait_ready(url: str) -> None:
+    for _ in range(300):
+        try:
+            httpx.get(url)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+def client(url: str, user_id: str, connections: int, duration: float, results) -> None:
+    """One load generator process: `connections` keep-alive connections in a loop"""
+    async def run():
+        done = 0
+        limits = httpx.Limits(max_connections=connections)
+        async with httpx.AsyncClient(limits=limits, timeout=30, headers={"X-User-ID": user_id}) as http:
+            end = time.perf_counter() + duration
+
+            async def loop():
+                nonlocal done
+                while time.perf_counter() < end:
+                    response = await http.get(url, params={"limit": 20})
+                    done += response.status_code == 200
+
+            await asyncio.gather(*(loop() for _ in range(connections)))
+        return done
+
+    results.put(asyncio.run(run()))
+
+def measure(url: str, user_id: str, clients: int, connections: int, duration: float) -> float:
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=client, args=(url, user_id, connections, duration, results))
+                 for _ in range(clients)]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total / duration
+
+def main(worker_counts, mode: str, tasks: int, clients: int, connections: int, duration: float, port: int):
+    workdir = tempfile.mkdtemp()
+    env = {"DATABASE_URL": f"sqlite:///{workdir}/tasks.db", "REQUEST_DEADLINES_ENFORCED": "false"}
+    user_id = str(uuid.uuid4())
+    seed(env, user_id, tasks)
+    url = f"http://127.0.0.1:{port}/api/v1/tasks/list-tasks"
+    print(f"{os.cpu_count()} CPUs, {mode} mode, {clients} client processes x {connections} connections, "
+          f"GET /tasks/list-tasks over {tasks:,} tasks\n")
+    print(f"{'workers':>7} {'req/s':>9} {'per worker':>11} {'scaling':>8}")
+    baseline = None
+    for workers in worker_counts:
+        server = start(workers, port, mode, env)
+        try:
+            wait_ready(f"http://127.0.0.1:{port}/api/v1/health")
+            measure(url, user_id, 1, 2, 1.0)  # Warm up
+            rps = measure(url, user_id, clients, connections, duration)
+        finally:
+            server.terminate()
+            server.wait()
+        baseline = baseline or rps
+        print(f"{workers:>7} {rps:>9.0f} {rps / workers:>11.0f} {rps / baseline:>7.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Task-service throughput by number of worker processes")
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker counts to try")
+    parser.add_argument("--mode", choices=("prefork", "reuseport"), default="prefork")
+    parser.add_argument("--tasks", type=int, default=5_000)
+    parser.add_argument("--clients", type=int, default=2, help="Load generator processes")
+    parser.add_argument("--connections", type=int, default=8, help="Connections per load generator")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8401)
+    args = parser.parse_args()
+    main([int(n) for n in args.workers.split(",")], args.mode, args.tasks, args.clients, args.connections,
+         args.duration, args.port)
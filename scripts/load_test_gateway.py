@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import time
+from collections import Counter
+import httpx
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> str:
+    """Create the user if needed and return a bearer token"""
+    await client.post("/api/v1/users/", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": password,
+    })
+    response = await client.post("/api/v1/auth/login", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+async def worker(client, token, path, deadline, latencies, statuses):
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get(path, headers=headers)
+            code = response.status_code
+        except httpx.HTTPError:
+            code = "error"
+        elapsed = time.perf_counter() - started
+        statuses[code] += 1
+        if code == 200:
+            latencies.append(elapsed)
+        elif code in (429, 503):
+            # Behave like a well-mannered client and honour Retry-After
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+
+async def run(base_url: str, users: int, concurrency: int, duration: float, path: str):
+    """
+    Overload scenario: `users` accounts share `concurrency` looping clients.
+
+    With rate and concurrency limiting enabled the p99 of admitted requests
+    should stay close to the unloaded latency while excess load is shed with
+    429/503; with RATE_LIMIT_ENABLED=false and a high CONCURRENCY_LIMIT_MIN it
+    grows with the queue instead.
+    """
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        tokens = [await login(client, f"loadtest{i}", "loadtest-password") for i in range(users)]
+        latencies, statuses = [], Counter()
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(
+            worker(client, tokens[i % users], path, deadline, latencies, statuses)
+            for i in range(concurrency)
+        ))
+
+    total = sum(statuses.values())
+    print(f"\n=== {concurrency} clients, {users} users, {duration:.0f}s against {path} ===")
+    print(f"Requests: {total} ({total / duration:.1f}/s)")
+    for code, count in sorted(statuses.items(), key=lambda item: str(item[0])):
+        print(f"  {code}: {count}")
+    print(f"Admitted latency p50: {percentile(latencies, 0.50) * 1000:.1f} ms")
+    print(f"Admitted latency p95: {percentile(latencies, 0.95) * 1000:.1f} ms")
+    print(f"Admitted latency p99: {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the gateway task listing")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--path", default="/api/v1/tasks/list")
+    args = parser.parse_args()
+    asyncio.run(run(args.base_url, args.users, args.concurrency, args.duration, args.path))
@@ -0,0 +1,39 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+def run_instances(count: int, base_port: int):
+    """Start several task-service processes on consecutive ports"""
+    task_service_dir = os.path.join(os.path.dirname(__file__), '..', 'task_service')
+    processes = []
+    urls = []
+    for i in range(count):
+        port = base_port + i
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "localhost", "--port", str(port)],
+            cwd=os.path.abspath(task_service_dir),
+        ))
+        urls.append(f"http://localhost:{port}/api/v1")
+
+    print("\nStart the gateway with:")
+    print(f"TASK_SERVICE_INSTANCES={','.join(urls)}")
+    print("\nPress Ctrl+C to stop all instances")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several local task-service instances")
+    parser.add_argument("--count", type=int, default=3)
+    parser.add_argument("--base-port", type=int, default=8001)
+    args = parser.parse_args()
+    run_instances(args.count, args.base_port)
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from fastapi import HTTPException, status
+from shared.metrics import Counter
+
+# Absolute deadline of a request, in Unix epoch milliseconds
+DEADLINE_HEADER = "X-Request-Deadline"
+
+# With enforcement off deadlines are still propagated and outcomes counted,
+# which gives the baseline for how much work finishes after nobody waits for it
+REQUEST_DEADLINES_ENFORCED = os.getenv("REQUEST_DEADLINES_ENFORCED", "true").lower() != "false"
+# SQLite virtual machine instructions between deadline checks in a running query
+DEADLINE_CHECK_OPS = int(os.getenv("DEADLINE_CHECK_OPS", "1000"))
+
+REQUEST_DEADLINE_OUTCOMES = Counter(
+    "request_deadline_outcomes_total",
+    "Requests by deadline outcome: ok, late, skipped, interrupted or cancelled",
+    ["service", "outcome"],
+)
+REQUEST_DEADLINE_WORK_SECONDS = Counter(
+    "request_deadline_work_seconds_total",
+    "Time spent serving requests by deadline outcome; all but ok is wasted work",
+    ["service", "outcome"],
+)
+
+class Deadline:
+    """
+    The deadline of the request being served, plus why it stopped early.
+
+    `at` is None when the request has no deadline. `cancelled` is set when
+    the client disconnected, which ends the request just like an expired
+    deadline does.
+    """
+
+    __slots__ = ("at", "cancelled", "skipped", "interrupted")
+
+    def __init__(self, at: Optional[float]):
+        self.at = at
+        self.cancelled = False
+        self.skipped = False
+        self.interrupted = False
+
+    def remaining(self) -> Optional[float]:
+        return None if self.at is None else self.at - time.time()
+
+    @property
+    def expired(self) -> bool:
+        return self.cancelled or (self.at is not None and time.time() >= self.at)
+
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+class DeadlineExceeded(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Deadline exceeded")
+
+def parse_deadline(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds from an X-Request-Deadline value, None if absent or invalid"""
+    if not value:
+        return None
+    try:
+        return int(value) / 1000
+    except ValueError:
+        return None
+
+def parse_budgets(spec: str) -> Dict[str, float]:
+    """Parse "path-prefix=seconds,..." into a dict; 0 means no deadline"""
+    budgets = {}
+    for item in spec.split(","):
+        prefix, _, seconds = item.strip().partition("=")
+        if prefix and seconds:
+            budgets[prefix] = float(seconds)
+    return budgets
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, None if it has no deadline"""
+    deadline = current_deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+def deadline_header() -> Optional[str]:
+    """Value to send downstream so the next service knows when to give up"""
+    deadline = current_deadline.get()
+    if deadline is None or deadline.at is None:
+        return None
+    return str(int(deadline.at * 1000))
+
+def check_deadline() -> None:
+    """
+    Raise 504 instead of starting work nobody will wait for.
+
+    Called at the points where a request is about to do real work, e.g. when
+    it gets its database session after queueing behind other requests.
+    """
+    deadline = current_deadline.get()
+    if REQUEST_DEADLINES_ENFORCED and deadline is not None and deadline.expired:
+        deadline.skipped = True
+        raise DeadlineExceeded()
+
+def sqlite_progress_handler() -> int:
+    """Abort the running SQLite statement once the request's deadline has passed"""
+    deadline = current_deadline.get()
+    if REQUEST_DEADLINES_ENFORCED and deadline is not None and deadline.expired:
+        deadline.interrupted = True
+        return 1
+    return 0
+
+def install_sqlite_deadlines(engine) -> None:
+    """
+    Check the current request's deadline every DEADLINE_CHECK_OPS SQLite
+    instructions, so long queries stop when their caller has given up.
+
+    Other databases would use a per-statement timeout instead; only SQLite is
+    used by the services today.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.set_progress_handler(sqlite_progress_handler, DEADLINE_CHECK_OPS)
+
+async def _send_timeout(send) -> None:
+    body = json.dumps({"detail": "Deadline exceeded"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status.HTTP_504_GATEWAY_TIMEOUT,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware giving every HTTP request a deadline and enforcing it.
+
+    The deadline is the earlier of the incoming X-Request-Deadline header and
+    now plus the route's budget (longest matching path prefix in `budgets`,
+    else `default_budget`; 0 or None means none). It is kept in a context
+    variable for outgoing calls and database queries to honour.
+
+    Requests arriving past their deadline get 504 without running. A client
+    disconnect cancels the handler, and with it any upstream call in flight.
+    A query aborted by the SQLite progress handler surfaces as whatever error
+    the route turns it into, or as an unhandled exception; either way it is
+    reported as 504 so callers see a timeout rather than a server fault.
+    """
+
+    def __init__(self, app, service: str, default_budget: Optional[float] = None,
+                 budgets: Optional[Dict[str, float]] = None):
+        self.app = app
+        self.service = service
+        self.default_budget = default_budget
+        # Longest prefix first so the most specific budget wins
+        self.budgets = sorted((budgets or {}).items(), key=lambda item: -len(item[0]))
+
+    def _budget(self, path: str) -> Optional[float]:
+        for prefix, seconds in self.budgets:
+            if path.startswith(prefix):
+                return seconds
+        return self.default_budget
+
+    def _record(self, outcome: str, seconds: float) -> None:
+        REQUEST_DEADLINE_OUTCOMES.labels(self.service, outcome).inc()
+        REQUEST_DEADLINE_WORK_SECONDS.labels(self.service, outcome).inc(seconds)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        at = None
+        for key, value in scope["headers"]:
+            if key == b"x-request-deadline":
+                at = parse_deadline(value.decode("latin-1"))
+                break
+        budget = self._budget(scope["path"])
+        if budget:
+            at = min(at, time.time() + budget) if at is not None else time.time() + budget
+        deadline = Deadline(at)
+
+        if REQUEST_DEADLINES_ENFORCED and deadline.expired:
+            self._record("skipped", 0.0)
+            await _send_timeout(send)
+            return
+
+        token = current_deadline.set(deadline)
+        replaced = False
+        response_started = False
+        response_done = False
+
+        async def send_checked(message):
+            nonlocal replaced, response_started, response_done
+            if message["type"] == "http.response.start":
+                response_started = True
+                if deadline.interrupted and message["status"] >= 500:
+                    replaced = True
+                    await _send_timeout(send)
+                    return
+            elif message["type"] == "http.response.body":
+                response_done = not message.get("more_body", False)
+            if not replaced:
+                await send(message)
+
+        # Request messages are read here and handed to the app through a
+        # queue, so a disconnect is noticed while the handler is busy waiting
+        # on something else
+        messages: asyncio.Queue = asyncio.Queue()
+
+        async def receive_queued():
+            return await messages.get()
+
+        handler = asyncio.create_task(self.app(scope, receive_queued, send_checked))
+
+        async def watch_disconnect():
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    if not response_done and REQUEST_DEADLINES_ENFORCED:
+                        deadline.cancelled = True
+                        handler.cancel()
+                    return
+
+        watcher = asyncio.create_task(watch_disconnect())
+        started = time.perf_counter()
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not deadline.cancelled:
+                handler.cancel()
+                raise
+        except Exception:
+            # An aborted query the route did not handle
+            if not deadline.interrupted or response_started:
+                raise
+            await _send_timeout(send)
+        finally:
+            watcher.cancel()
+            current_deadline.reset(token)
+            elapsed = time.perf_counter() - started
+            if deadline.at is None:
+                # Long-lived streams have no deadline and are not work to account
+                pass
+            elif deadline.cancelled:
+                self._record("cancelled", elapsed)
+            elif deadline.interrupted:
+                self._record("interrupted", elapsed)
+            elif deadline.skipped:
+                self._record("skipped", elapsed)
+            elif deadline.at is not None and time.time() > deadline.at:
+                self._record("late", elapsed)
+            else:
+                self._record("ok", elapsed)
+
+def deadline_stats(service: str) -> Dict[str, float]:
+    """Outcome counts, work seconds and the wasted fraction for one service"""
+    stats: Dict[str, float] = {}
+    total = wasted = 0.0
+    for outcome in ("ok", "late", "skipped", "interrupted", "cancelled"):
+        seconds = REQUEST_DEADLINE_WORK_SECONDS.labels(service, outcome).value
+        stats[outcome] = REQUEST_DEADLINE_OUTCOMES.labels(service, outcome).value
+        stats[f"{outcome}_seconds"] = seconds
+        total += seconds
+        if outcome != "ok":
+            wasted += seconds
+    stats["wasted_fraction"] = wasted / total if total else 0.0
+    return stats
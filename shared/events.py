@@ -0,0 +1,292 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Set, Tuple
+from shared.log import get_logger
+from shared.wire import dumps_json
+
+logger = get_logger("shared.events")
+
+# Configured from the environment so the gateway and the task service agree
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")  # "memory" or "redis"
+EVENTS_REDIS_URL = os.getenv("EVENTS_REDIS_URL", "redis://localhost:6379/2")
+EVENTS_STREAM = os.getenv("EVENTS_STREAM", "chronos:task_events")
+EVENTS_STREAM_MAXLEN = int(os.getenv("EVENTS_STREAM_MAXLEN", "100000"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", "100"))  # Per connection
+EVENTS_HISTORY_SIZE = int(os.getenv("EVENTS_HISTORY_SIZE", "100"))  # Per user, for resume
+EVENTS_HISTORY_USERS = int(os.getenv("EVENTS_HISTORY_USERS", "10000"))
+
+def parse_event_id(event_id: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Event ids look like Redis stream ids, "<ms>-<seq>", and order as such"""
+    if not event_id:
+        return None
+    ms, _, seq = event_id.partition("-")
+    try:
+        return int(ms), int(seq or 0)
+    except ValueError:
+        return None
+
+class Event:
+    """
+    One task change, encoded once and shared by every connection it goes to.
+
+    `data` is the JSON object sent as the SSE data line and as the WebSocket
+    message; `sse` is the complete SSE frame.
+    """
+
+    __slots__ = ("id", "key", "type", "data", "_sse")
+
+    def __init__(self, event_id: str, event_type: str, payload: str):
+        self.id = event_id
+        self.key = parse_event_id(event_id)
+        self.type = event_type
+        # payload is a JSON object without the id; splice the id in front
+        self.data = f'{{"id":"{event_id}",{payload[1:]}'
+        self._sse = None
+
+    @property
+    def sse(self) -> bytes:
+        if self._sse is None:
+            self._sse = f"id: {self.id}\nevent: {self.type}\ndata: {self.data}\n\n".encode()
+        return self._sse
+
+# Control items handed to a connection instead of an event
+HEARTBEAT = "heartbeat"
+RESET = "reset"  # Events were lost (buffer overflow or too old to resume): refetch
+
+class Subscription:
+    """
+    One connection's bounded buffer.
+
+    Kept deliberately small for many idle connections: no queue object and no
+    timer per connection, just a deque and a future that exists only while
+    the connection is waiting. When the buffer overflows it is replaced by a
+    single RESET so the client refetches instead of silently missing events.
+    """
+
+    __slots__ = ("user_id", "buffer", "waiter")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.buffer: Deque = deque()
+        self.waiter: Optional[asyncio.Future] = None
+
+    def push(self, item) -> None:
+        if len(self.buffer) >= EVENTS_BUFFER_SIZE:
+            self.buffer.clear()
+            self.buffer.append(RESET)
+        else:
+            self.buffer.append(item)
+        self._wake()
+
+    def heartbeat(self) -> None:
+        """Wake an idle connection so it can send a keep-alive"""
+        if self.waiter is not None and not self.buffer:
+            self.buffer.append(HEARTBEAT)
+            self._wake()
+
+    def _wake(self) -> None:
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def next(self):
+        """Wait for the next Event, HEARTBEAT or RESET"""
+        while not self.buffer:
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        return self.buffer.popleft()
+
+class UserHistory:
+    __slots__ = ("events", "truncated")
+
+    def __init__(self):
+        self.events: Deque[Event] = deque(maxlen=EVENTS_HISTORY_SIZE)
+        self.truncated = False
+
+class EventHub:
+    """
+    Per-process fan-out of task events to the connections of each user.
+
+    Recent events are kept per user (for the most recently active users) so
+    a reconnecting client can resume after its Last-Event-ID. When the events
+    it missed are no longer all retained it gets a RESET instead.
+    """
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[Subscription]] = {}
+        self.history: "OrderedDict[str, UserHistory]" = OrderedDict()
+        # Events up to here may be missing from history: they happened before
+        # this process listened, or belonged to a history evicted since
+        self.horizon = parse_event_id(f"{int(time.time() * 1000)}-0")
+        self.connections = 0
+        self.published = 0
+        self.delivered = 0
+
+    def publish(self, user_id: str, event: Event) -> None:
+        self.published += 1
+        history = self.history.get(user_id)
+        if history is None:
+            history = self.history[user_id] = UserHistory()
+            if len(self.history) > EVENTS_HISTORY_USERS:
+                _, evicted = self.history.popitem(last=False)
+                if evicted.events:
+                    self.horizon = max(self.horizon, evicted.events[-1].key)
+        else:
+            self.history.move_to_end(user_id)
+        if len(history.events) == history.events.maxlen:
+            history.truncated = True
+        history.events.append(event)
+        for subscription in self.subscribers.get(user_id, ()):
+            subscription.push(event)
+            self.delivered += 1
+
+    def subscribe(self, user_id: str, last_event_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(user_id)
+        self.subscribers.setdefault(user_id, set()).add(subscription)
+        self.connections += 1
+        last_key = parse_event_id(last_event_id)
+        if last_key is not None:
+            self._replay(subscription, last_key)
+        return subscription
+
+    def _replay(self, subscription: Subscription, last_key: Tuple[int, int]) -> None:
+        history = self.history.get(subscription.user_id)
+        events = history.events if history is not None else ()
+        if events and last_key >= events[0].key:
+            complete = True
+        else:
+            complete = last_key >= self.horizon and not (history is not None and history.truncated)
+        if not complete:
+            subscription.push(RESET)
+            return
+        for event in events:
+            if event.key > last_key:
+                subscription.push(event)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self.subscribers.get(subscription.user_id)
+        if subscriptions is not None and subscription in subscriptions:
+            subscriptions.discard(subscription)
+            self.connections -= 1
+            if not subscriptions:
+                del self.subscribers[subscription.user_id]
+
+    def heartbeat(self) -> None:
+        for subscriptions in self.subscribers.values():
+            for subscription in subscriptions:
+                subscription.heartbeat()
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "users": len(self.subscribers),
+            "history_users": len(self.history),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+class TaskEvents:
+    """
+    Publishing side and feed of the hub.
+
+    With the "memory" backend events are published straight into this
+    process's hub, which suits a single gateway worker that publishes from its
+    own write routes. With "redis" the task service appends events to a Redis
+    stream from its mutation paths; every gateway worker reads the stream and
+    fans events out to its local connections. Stream entry ids double as event
+    ids, so Last-Event-ID works across workers.
+    """
+
+    def __init__(self):
+        self.hub = EventHub()
+        self._redis = None
+        self._tasks = []
+        self._last_ms = 0
+        self._seq = 0
+
+    @property
+    def local_only(self) -> bool:
+        return EVENTS_BACKEND != "redis"
+
+    def _client(self):
+        if self._redis is None:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(EVENTS_REDIS_URL)
+        return self._redis
+
+    def _next_id(self) -> str:
+        ms = int(time.time() * 1000)
+        if ms <= self._last_ms:
+            self._seq += 1
+        else:
+            self._last_ms, self._seq = ms, 0
+        return f"{self._last_ms}-{self._seq}"
+
+    async def publish(self, user_id, event_type: str, task_id, task=None) -> None:
+        """Publish a task.created / task.updated / task.deleted event for a user"""
+        user_id = str(user_id)
+        payload = dumps_json({"type": event_type, "task_id": str(task_id), "task": task}).decode()
+        if self.local_only:
+            self.hub.publish(user_id, Event(self._next_id(), event_type, payload))
+            return
+        try:
+            await self._client().xadd(
+                EVENTS_STREAM,
+                {"user_id": user_id, "type": event_type, "payload": payload},
+                maxlen=EVENTS_STREAM_MAXLEN,
+                approximate=True,
+            )
+        except Exception as e:
+            # Clients fall back to refetching; a lost event must not fail the write
+            logger.warning("Could not publish task event: %s", e)
+
+    async def _consume(self) -> None:
+        last_id = "$"
+        while True:
+            try:
+                response = await self._client().xread({EVENTS_STREAM: last_id}, block=5000, count=500)
+                for _, entries in response or ():
+                    for entry_id, fields in entries:
+                        last_id = entry_id.decode()
+                        self.hub.publish(
+                            fields[b"user_id"].decode(),
+                            Event(last_id, fields[b"type"].decode(), fields[b"payload"].decode()),
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Task event stream read failed, retrying: %s", e)
+                await asyncio.sleep(1.0)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(EVENTS_HEARTBEAT_SECONDS)
+            self.hub.heartbeat()
+
+    def start(self, consume: bool = True) -> None:
+        """Start heartbeats and, with the redis backend, reading the event stream"""
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+        if consume and not self.local_only:
+            self._tasks.append(asyncio.create_task(self._consume()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+task_events = TaskEvents()
@@ -0,0 +1,232 @@
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from typing import List, Optional
+import uvicorn
+from shared.log import get_logger
+from shared.shm import create_segment
+
+logger = get_logger("shared.serve")
+
+# Workers are started fresh rather than forked, so each imports the current
+# code (what a rolling restart is for) and no event loop or database
+# connection is inherited from the supervisor
+_context = multiprocessing.get_context("spawn")
+
+def _event_loop() -> str:
+    try:
+        import uvloop  # noqa: F401
+        return "uvloop"
+    except ImportError:
+        return "asyncio"
+
+def _http_protocol() -> str:
+    try:
+        import httptools  # noqa: F401
+        return "httptools"
+    except ImportError:
+        return "h11"
+
+def _bind(host: str, port: int, reuse_port: bool, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+class _WorkerServer(uvicorn.Server):
+    """uvicorn.Server that tells the supervisor once it accepts connections"""
+
+    def __init__(self, config: uvicorn.Config, ready):
+        super().__init__(config)
+        self._ready = ready
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets)
+        if self.started:
+            self._ready.set()
+
+def _run_worker(app: str, app_dir: str, host: str, port: int, sock: Optional[socket.socket],
+                backlog: int, graceful_timeout: float, ready) -> None:
+    sys.path.insert(0, app_dir)
+    os.chdir(app_dir)
+    if sock is None:
+        # SO_REUSEPORT: every worker has its own listening socket and the
+        # kernel spreads new connections across them
+        sock = _bind(host, port, True, backlog)
+    config = uvicorn.Config(
+        app,
+        loop=_event_loop(),
+        http=_http_protocol(),
+        backlog=backlog,
+        access_log=False,  # TracingMiddleware already logs every request
+        timeout_graceful_shutdown=graceful_timeout,
+    )
+    _WorkerServer(config, ready).run(sockets=[sock])
+
+class Worker:
+    def __init__(self, process, ready):
+        self.process = process
+        self.ready = ready
+
+class Supervisor:
+    """
+    Runs `workers` copies of an ASGI app and keeps them running.
+
+    In "prefork" mode the supervisor binds the listening socket and every
+    worker accepts on it; in "reuseport" mode each worker binds its own with
+    SO_REUSEPORT, which balances better under many short connections. Each
+    worker runs uvicorn on uvloop and httptools when they are installed.
+
+    A worker that dies is replaced. SIGHUP replaces them all one at a time:
+    a new worker is started and must report ready before the old one gets
+    SIGTERM and drains its in-flight requests, so the port is never left
+    without a worker. SIGTERM or SIGINT stop everything the same graceful way.
+
+    With `shared_memory` > 0 a segment of that many bytes is created for the
+    workers' read-mostly state and its name passed in SHARED_STATE_SEGMENT;
+    see shared.shm.
+    """
+
+    def __init__(self, app: str, app_dir: str, host: str, port: int, workers: int, mode: str = "prefork",
+                 shared_memory: int = 0, backlog: int = 2048, graceful_timeout: float = 30.0,
+                 ready_timeout: float = 60.0):
+        self.app = app
+        self.app_dir = os.path.abspath(app_dir)
+        self.host = host
+        self.port = port
+        self.count = workers
+        self.mode = mode
+        self.shared_memory = shared_memory
+        self.backlog = backlog
+        self.graceful_timeout = graceful_timeout
+        self.ready_timeout = ready_timeout
+        self.workers: List[Worker] = []
+        self._socket: Optional[socket.socket] = None
+        self._restart = False
+        self._exit = False
+        self.restarts = 0
+
+    def _spawn(self) -> Worker:
+        ready = _context.Event()
+        process = _context.Process(
+            target=_run_worker,
+            args=(self.app, self.app_dir, self.host, self.port, self._socket, self.backlog,
+                  self.graceful_timeout, ready),
+            daemon=False,
+        )
+        process.start()
+        return Worker(process, ready)
+
+    def _stop(self, worker: Worker) -> None:
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(self.graceful_timeout + 5)
+        if worker.process.is_alive():
+            logger.warning("Worker %s did not drain in time, killing it", worker.process.pid)
+            worker.process.kill()
+            worker.process.join()
+
+    def _wait_ready(self, worker: Worker) -> bool:
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline and worker.process.is_alive():
+            if worker.ready.wait(0.1):
+                return True
+        return False
+
+    def rolling_restart(self) -> None:
+        logger.info("Rolling restart of %d workers", len(self.workers))
+        for i, old in enumerate(list(self.workers)):
+            new = self._spawn()
+            if not self._wait_ready(new):
+                # Most likely a broken deploy: keep serving with what runs
+                logger.error("Replacement worker failed to start, restart aborted")
+                self._stop(new)
+                return
+            self.workers[i] = new
+            self._stop(old)
+            self.restarts += 1
+        logger.info("Rolling restart done")
+
+    def _handle_signal(self, signum, frame) -> None:
+        if signum == signal.SIGHUP:
+            self._restart = True
+        else:
+            self._exit = True
+
+    def run(self) -> None:
+        segment = None
+        if self.shared_memory > 0:
+            segment = create_segment(self.shared_memory)
+            # Inherited by the spawned workers
+            os.environ["SHARED_STATE_SEGMENT"] = segment.name
+        if self.mode == "prefork":
+            self._socket = _bind(self.host, self.port, False, self.backlog)
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._handle_signal)
+        try:
+            self.workers = [self._spawn() for _ in range(self.count)]
+            for worker in self.workers:
+                self._wait_ready(worker)
+            logger.info("%d workers serving %s on %s:%d (%s, %s loop, %s parser)", self.count, self.app,
+                        self.host, self.port, self.mode, _event_loop(), _http_protocol())
+            while not self._exit:
+                time.sleep(0.5)
+                if self._restart:
+                    self._restart = False
+                    self.rolling_restart()
+                for i, worker in enumerate(self.workers):
+                    if not worker.process.is_alive() and not self._exit:
+                        logger.warning("Worker %s exited with %s, replacing it",
+                                       worker.process.pid, worker.process.exitcode)
+                        self.workers[i] = self._spawn()
+        finally:
+            for worker in self.workers:
+                if worker.process.is_alive():
+                    worker.process.terminate()
+            for worker in self.workers:
+                self._stop(worker)
+            if self._socket is not None:
+                self._socket.close()
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve an ASGI app with several worker processes")
+    parser.add_argument("app", help="Import string of the app, e.g. main:app")
+    parser.add_argument("--app-dir", default=".", help="Directory the app is imported from")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--mode", choices=("prefork", "reuseport"), default="prefork")
+    parser.add_argument("--shared-memory-mb", type=float, default=32.0,
+                        help="Segment for state shared by the workers, 0 for none")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    args = parser.parse_args(argv)
+    Supervisor(
+        args.app, args.app_dir, args.host, args.port, args.workers, args.mode,
+        shared_memory=int(args.shared_memory_mb * 2**20),
+        graceful_timeout=args.graceful_timeout,
+    ).run()
+
+def cli(app: str, app_dir: str, default_port: int) -> None:
+    """
+    `python main.py --workers N ...` in a service: re-run as this module, so
+    the spawned workers do not each import the service's main.py twice
+    (once as their __main__, once as the app)
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")]))
+    os.execv(sys.executable, [sys.executable, "-m", "shared.serve", app, "--app-dir", app_dir,
+                              "--port", str(default_port), *sys.argv[1:]])
+
+if __name__ == "__main__":
+    main()
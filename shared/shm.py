@@ -0,0 +1,146 @@
+import fcntl
+import os
+import struct
+import tempfile
+import time
+from multiprocessing import shared_memory
+from typing import Iterator, Optional, Tuple
+
+# Name of the segment the launcher (shared.serve) creates for a service's
+# workers; unset when running as a single process
+SHARED_STATE_SEGMENT = os.getenv("SHARED_STATE_SEGMENT")
+
+# Slots are filled up to this fraction before a table refuses new keys
+MAX_LOAD = 0.7
+
+_HEADER = struct.Struct("<QQ")  # write sequence, slots in use
+_SLOT = struct.Struct("<16sdd")  # key, value, expiry (0 = empty slot)
+
+def create_segment(size: int) -> shared_memory.SharedMemory:
+    """A new zero-filled segment; the creator is responsible for unlinking it"""
+    return shared_memory.SharedMemory(create=True, size=size)
+
+def attach_segment(name: str) -> shared_memory.SharedMemory:
+    """Map an existing segment without taking ownership of it"""
+    # Attaching registers the segment with the resource tracker, which
+    # unlinks what is registered when it exits. Workers spawned by
+    # shared.serve share the supervisor's tracker, so that only happens
+    # when the supervisor goes, as it should.
+    return shared_memory.SharedMemory(name=name)
+
+class FileLock:
+    """
+    An flock on a file next to the segment, shared by every process using it.
+
+    Used as a context manager for short exclusive sections (table writes),
+    or held for the life of the process with try_hold() to elect one worker
+    for jobs that only need to run once per host.
+    """
+
+    def __init__(self, name: str):
+        self.path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.held = False
+
+    def __enter__(self):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def try_hold(self) -> bool:
+        """Take the lock without blocking and keep it; True if this process has it"""
+        if not self.held:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self.held = True
+            except BlockingIOError:
+                pass
+        return self.held
+
+class SharedTable:
+    """
+    Fixed-capacity hash table of 16-byte keys to (value, expiry) pairs, laid
+    out in a shared memory buffer so every worker reads the same copy.
+
+    Open addressing with linear probing; keys are expected to be random
+    (UUIDs), so their leading bytes serve as the hash. Readers take no lock:
+    writers bump a sequence number before and after every change, and a read
+    that saw it odd or changed is retried. Writers serialise on `lock`.
+    Entries are never deleted one by one; rebuild() drops the expired ones.
+    """
+
+    def __init__(self, buffer: memoryview, lock: FileLock):
+        self._buf = buffer
+        # Largest power of two that fits
+        self.capacity = 1 << ((len(buffer) - _HEADER.size) // _SLOT.size).bit_length() - 1
+        self._mask = self.capacity - 1
+        self.lock = lock
+
+    @staticmethod
+    def size_for(capacity: int) -> int:
+        """Bytes needed for at least `capacity` slots"""
+        return _HEADER.size + _SLOT.size * (1 << (capacity - 1).bit_length())
+
+    def _find(self, key: bytes) -> Tuple[int, float, float]:
+        """Offset of the key's slot, or of the empty slot where it would go"""
+        index = int.from_bytes(key[:8], "little") & self._mask
+        while True:
+            offset = _HEADER.size + index * _SLOT.size
+            slot_key, value, expires = _SLOT.unpack_from(self._buf, offset)
+            if expires == 0 or slot_key == key:
+                return offset, value, expires
+            index = (index + 1) & self._mask
+
+    def get(self, key: bytes) -> Optional[Tuple[float, float]]:
+        """(value, expiry) stored for the key, None if absent"""
+        while True:
+            seq = _HEADER.unpack_from(self._buf, 0)[0]
+            if seq & 1:
+                time.sleep(0)  # A writer is mid-update
+                continue
+            _, value, expires = self._find(key)
+            if _HEADER.unpack_from(self._buf, 0)[0] == seq:
+                return (value, expires) if expires else None
+
+    def put(self, key: bytes, value: float, expires: float) -> bool:
+        """Insert or overwrite; False if the table is full even after a rebuild"""
+        with self.lock:
+            seq, used = _HEADER.unpack_from(self._buf, 0)
+            offset, _, current = self._find(key)
+            if not current:
+                if used >= self.capacity * MAX_LOAD:
+                    self._rebuild(time.time())
+                    seq, used = _HEADER.unpack_from(self._buf, 0)
+                    if used >= self.capacity * MAX_LOAD:
+                        return False
+                    offset, _, _ = self._find(key)
+                used += 1
+            _HEADER.pack_into(self._buf, 0, seq + 1, used)
+            _SLOT.pack_into(self._buf, offset, key, value, expires)
+            _HEADER.pack_into(self._buf, 0, seq + 2, used)
+            return True
+
+    def items(self) -> Iterator[Tuple[bytes, float, float]]:
+        for offset in range(_HEADER.size, _HEADER.size + self.capacity * _SLOT.size, _SLOT.size):
+            key, value, expires = _SLOT.unpack_from(self._buf, offset)
+            if expires:
+                yield key, value, expires
+
+    def __len__(self) -> int:
+        return _HEADER.unpack_from(self._buf, 0)[1]
+
+    def _rebuild(self, now: float) -> None:
+        live = [(key, value, expires) for key, value, expires in self.items() if expires > now]
+        seq = _HEADER.unpack_from(self._buf, 0)[0]
+        _HEADER.pack_into(self._buf, 0, seq + 1, len(live))
+        self._buf[_HEADER.size:_HEADER.size + self.capacity * _SLOT.size] = bytes(self.capacity * _SLOT.size)
+        for key, value, expires in live:
+            _SLOT.pack_into(self._buf, self._find(key)[0], key, value, expires)
+        _HEADER.pack_into(self._buf, 0, seq + 2, len(live))
+
+    def rebuild(self) -> None:
+        """Drop expired entries, freeing their slots"""
+        with self.lock:
+            self._rebuild(time.time())
@@ -0,0 +1,144 @@
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from shared.log import get_logger
+
+TRACE_HEADER = "X-Trace-ID"
+
+# Fraction of requests whose access log is emitted; errors and slow requests are always logged
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "500"))
+
+logger = get_logger("access")
+
+class Trace:
+    """Timing spans collected while serving one request"""
+
+    __slots__ = ("trace_id", "started", "spans")
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []  # (name, seconds)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.spans.append((name, seconds))
+
+    def totals(self) -> Dict[str, Tuple[float, int]]:
+        """Sum spans by name: name -> (seconds, count)"""
+        totals: Dict[str, Tuple[float, int]] = {}
+        for name, seconds in self.spans:
+            total, count = totals.get(name, (0.0, 0))
+            totals[name] = (total + seconds, count + 1)
+        return totals
+
+    def server_timing(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        entries = [
+            f"{name};dur={seconds * 1000:.2f}"
+            for name, (seconds, _) in self.totals().items()
+        ]
+        entries.append(f"total;dur={elapsed * 1000:.2f}")
+        return ", ".join(entries)
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+def get_trace_id() -> Optional[str]:
+    trace = current_trace.get()
+    return trace.trace_id if trace else None
+
+@contextmanager
+def span(name: str):
+    """Record the duration of the enclosed block on the current request's trace"""
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+def record_span(name: str, seconds: float) -> None:
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+def merge_server_timing(header: Optional[str], prefix: str) -> None:
+    """Copy an upstream Server-Timing header into the current trace under a prefix"""
+    trace = current_trace.get()
+    if trace is None or not header:
+        return
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        if not params.startswith("dur=") or name == "total":
+            continue
+        try:
+            trace.add(f"{prefix}-{name}", float(params[4:]) / 1000)
+        except ValueError:
+            continue
+
+class TracingMiddleware:
+    """
+    ASGI middleware that opens a trace per HTTP request.
+
+    The trace ID is taken from the incoming X-Trace-ID header (so a request
+    keeps one ID across services) or generated. Spans recorded during the
+    request are returned in a Server-Timing header, and a structured access
+    log line is written for a sample of requests plus all slow or failed ones.
+    """
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for key, value in scope["headers"]:
+            if key == b"x-trace-id":
+                incoming = value.decode("latin-1")
+                break
+        trace = Trace(incoming)
+        token = current_trace.set(trace)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                headers.append((b"x-trace-id", trace.trace_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_trace.reset(token)
+            elapsed_ms = (time.perf_counter() - trace.started) * 1000
+            if status_code >= 500 or elapsed_ms >= TRACE_SLOW_MS or random.random() < TRACE_SAMPLE_RATE:
+                logger.info(
+                    "request",
+                    extra={
+                        "service": self.service,
+                        "trace_id": trace.trace_id,
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code,
+                        "duration_ms": round(elapsed_ms, 2),
+                        "spans": {
+                            name: {"ms": round(seconds * 1000, 2), "count": count}
+                            for name, (seconds, count) in trace.totals().items()
+                        },
+                    },
+                )
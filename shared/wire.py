@@ -0,0 +1,180 @@
+import json
+import struct
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Optional
+from uuid import UUID, SafeUUID
+from fastapi import HTTPException, Request, status
+from fastapi.routing import APIRoute
+from starlette.responses import Response
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; services fall back to JSON
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+JSON_MEDIA_TYPE = "application/json"
+
+# Extension type codes, shared by every service speaking msgpack
+EXT_DATETIME = 1  # year, month, day, hour, minute, second, microsecond [, UTC offset seconds]
+EXT_UUID = 2      # 16 raw bytes
+EXT_DATE = 3      # year, month, day
+EXT_TIME = 4      # hour, minute, second, microsecond (naive times only)
+
+# Fixed-width component layouts: constructing from components is several
+# times cheaper than epoch arithmetic with timedelta on the decode side
+_DATETIME = struct.Struct(">HBBBBBI")
+_DATETIME_TZ = struct.Struct(">HBBBBBIi")
+_DATE = struct.Struct(">HBB")
+_TIME = struct.Struct(">BBBI")
+
+_new_object = object.__new__
+_set_attribute = object.__setattr__
+
+def _uuid_from_bytes(data: bytes) -> UUID:
+    # UUID(bytes=...) re-validates its input; these 16 bytes came from a UUID
+    value = _new_object(UUID)
+    _set_attribute(value, "int", int.from_bytes(data, "big"))
+    _set_attribute(value, "is_safe", SafeUUID.unknown)
+    return value
+
+def _default(obj: Any):
+    """msgpack hook for types it does not know natively"""
+    if isinstance(obj, datetime):
+        fields = (obj.year, obj.month, obj.day, obj.hour, obj.minute, obj.second, obj.microsecond)
+        if obj.tzinfo is None:
+            return msgpack.ExtType(EXT_DATETIME, _DATETIME.pack(*fields))
+        offset = int(obj.utcoffset().total_seconds())
+        return msgpack.ExtType(EXT_DATETIME, _DATETIME_TZ.pack(*fields, offset))
+    if isinstance(obj, UUID):
+        return msgpack.ExtType(EXT_UUID, obj.bytes)
+    if isinstance(obj, date):
+        return msgpack.ExtType(EXT_DATE, _DATE.pack(obj.year, obj.month, obj.day))
+    if isinstance(obj, time):
+        if obj.tzinfo is not None:
+            return obj.isoformat()
+        return msgpack.ExtType(EXT_TIME, _TIME.pack(obj.hour, obj.minute, obj.second, obj.microsecond))
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if hasattr(obj, "dict"):
+        return obj.dict()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+def _ext_hook(code: int, data: bytes):
+    if code == EXT_DATETIME:
+        if len(data) == _DATETIME.size:
+            return datetime(*_DATETIME.unpack(data))
+        *fields, offset = _DATETIME_TZ.unpack(data)
+        return datetime(*fields, tzinfo=timezone(timedelta(seconds=offset)))
+    if code == EXT_UUID:
+        return _uuid_from_bytes(data)
+    if code == EXT_DATE:
+        return date(*_DATE.unpack(data))
+    if code == EXT_TIME:
+        return time(*_TIME.unpack(data))
+    return msgpack.ExtType(code, data)
+
+def packb(obj: Any) -> bytes:
+    """Encode to msgpack, keeping datetimes, dates, times and UUIDs as native types"""
+    return msgpack.packb(obj, default=_default, use_bin_type=True, datetime=False)
+
+def unpackb(data: bytes) -> Any:
+    return msgpack.unpackb(data, ext_hook=_ext_hook, raw=False)
+
+def json_default(obj: Any):
+    """JSON hook producing the same strings FastAPI would for these types"""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if hasattr(obj, "dict"):
+        return obj.dict()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+def dumps_json(obj: Any) -> bytes:
+    return json.dumps(obj, default=json_default, separators=(",", ":")).encode()
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.split(";", 1)[0].strip().lower() == MSGPACK_MEDIA_TYPE
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    """
+    True if an Accept header asks for msgpack at least as strongly as JSON.
+
+    Wildcards alone never select msgpack, so browsers and generic HTTP
+    clients keep getting JSON.
+    """
+    if msgpack is None or not accept:
+        return False
+    msgpack_q, json_q = 0.0, 0.0
+    for part in accept.split(","):
+        media, _, params = part.strip().partition(";")
+        media = media.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if media == MSGPACK_MEDIA_TYPE:
+            msgpack_q = q
+        elif media == JSON_MEDIA_TYPE:
+            json_q = q
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+def decode_body(body: bytes, content_type: Optional[str]) -> Any:
+    """Parse a msgpack or JSON body according to its Content-Type"""
+    if is_msgpack(content_type):
+        return unpackb(body)
+    return json.loads(body)
+
+class MsgpackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return packb(content)
+
+def negotiate(request, content: Any):
+    """
+    Return content as msgpack if the caller asked for it.
+
+    Otherwise content is returned unchanged for FastAPI to validate against
+    the route's response_model and render as JSON.
+    """
+    if accepts_msgpack(request.headers.get("accept")):
+        return MsgpackResponse(content)
+    return content
+
+class MsgpackRoute(APIRoute):
+    """
+    APIRoute that also accepts msgpack request bodies.
+
+    The body is decoded here and handed to FastAPI as if it were already
+    parsed JSON, so body parameters validate as usual but datetimes and UUIDs
+    arrive as native objects instead of strings to be parsed again.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            if is_msgpack(request.headers.get("content-type")):
+                body = await request.body()
+                try:
+                    parsed = unpackb(body) if body else None
+                except Exception:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Invalid msgpack body",
+                    )
+                headers = [(k, v) for k, v in request.scope["headers"] if k != b"content-type"]
+                headers.append((b"content-type", JSON_MEDIA_TYPE.encode("latin-1")))
+                request = Request({**request.scope, "headers": headers}, request.receive)
+                request._body = body
+                request._json = parsed
+            return await handler(request)
+
+        return route_handler
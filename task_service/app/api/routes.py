@@ -9,4 +9,9 @@ router.include_router(
     tasks.router,
     prefix="/tasks",
     tags=["tasks"],
-)
\ No newline at end of file
+)
+
+@router.get("/health", tags=["health"])
+def health():
+    """Liveness probe used by the gateway's service registry"""
+    return {"status": "ok"}
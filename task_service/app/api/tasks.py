@@ -1,9 +1,10 @@
+import heapq
 import json
 from datetime import datetime, timedelta, date, time
 from typing import Any, Dict, List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Header, Query, status, Path
-from sqlalchemy import and_, or_, func
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, status, Path
+from sqlalchemy import and_, case, or_, func
 from sqlalchemy.orm import Session, joinedload
 from app.db.database import get_db
 from app.db.models import Task, RecurringTask
@@ -16,8 +17,16 @@ from app.cache.redis import (
     get_cached_task_list, invalidate_user_task_cache
 )
 from app.core.config import settings
+from app.core.urgency import PRIORITY_RANK, score_range
+from shared.events import task_events
+from shared.log import get_logger
+from shared.tracing import span
+from shared.wire import MsgpackRoute, negotiate
 
-router = APIRouter()
+# Routes accept and (when asked) return msgpack as well as JSON
+router = APIRouter(route_class=MsgpackRoute)
+
+logger = get_logger("task_service.tasks")
 
 # Helper function to validate user_id from headers
 def get_user_id(x_user_id: str = Header(...)) -> UUID:
@@ -29,16 +38,21 @@ def get_user_id(x_user_id: str = Header(...)) -> UUID:
             detail="Invalid user ID",
         )
 
+async def publish_task_event(user_id: UUID, event_type: str, task_id: UUID, task=None) -> None:
+    """Append a change to the shared event stream read by the gateway workers"""
+    # With the memory backend the gateway publishes from its own write routes
+    if not task_events.local_only:
+        await task_events.publish(user_id, event_type, task_id, task)
+
 @router.post("/create-task", response_model=TaskResponse)
 async def create_task(
+    request: Request,
     task_in: TaskWithRecurringCreate,
     db: Session = Depends(get_db),
     user_id: UUID = Depends(get_user_id)
 ):
     """Create a new task with optional recurring pattern"""
     try:
-        print(f"Received task creation request: {task_in.dict()}")  # Debug print
-        
         # Set the user_id from the header
         task_in.user_id = user_id
         
@@ -83,8 +97,9 @@ async def create_task(
             completed_at=db_task.completed_at,
             recurring_pattern=db_task.recurring_pattern
         )
+        await publish_task_event(user_id, "task.created", db_task.id, response)
         
-        return response
+        return negotiate(request, response)
         
     except Exception as e:
         db.rollback()
@@ -95,13 +110,12 @@ async def create_task(
 
 @router.get("/get-task/{task_id}", response_model=TaskResponse)
 async def get_task(
+    request: Request,
     task_id: UUID = Path(...),
     db: Session = Depends(get_db),
     user_id: UUID = Depends(get_user_id)
 ):
     """Get a single task by ID"""
-    print(f"Task Service: Received get task request for task_id={task_id}, user_id={user_id}")
-    
     try:
         task = db.query(Task).options(
             joinedload(Task.recurring_pattern)
@@ -110,8 +124,6 @@ async def get_task(
             Task.user_id == user_id
         ).first()
         
-        print(f"Task Service: Query result: {task is not None}")
-        
         if not task:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -138,15 +150,15 @@ async def get_task(
             completed_at=task.completed_at,
             recurring_pattern=task.recurring_pattern
         )
-        print(f"Task Service: Generated response: {response.dict()}")
-        return response
+        return negotiate(request, response)
         
     except Exception as e:
-        print(f"Task Service: Error occurred: {str(e)}")
+        logger.error("Error getting task %s: %s", task_id, e)
         raise
 
 @router.put("/update-task/{task_id}", response_model=TaskResponse)
 async def update_task(
+    request: Request,
     task_in: TaskWithRecurringUpdate,
     task_id: UUID = Path(...),
     db: Session = Depends(get_db),
@@ -222,11 +234,12 @@ async def update_task(
             completed_at=task.completed_at,
             recurring_pattern=task.recurring_pattern
         )
+        await publish_task_event(user_id, "task.updated", task.id, response)
         
-        return response
+        return negotiate(request, response)
         
     except Exception as e:
-        print(f"Error updating task: {str(e)}")
+        logger.error("Error updating task %s: %s", task_id, e)
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -235,6 +248,7 @@ async def update_task(
 
 @router.delete("/delete-task/{task_id}")  # Remove status_code=204
 async def delete_task(
+    request: Request,
     task_id: UUID = Path(...),
     db: Session = Depends(get_db),
     user_id: UUID = Depends(get_user_id)
@@ -261,11 +275,83 @@ async def delete_task(
     db.commit()
 
     #TODO: Invalidate cache for this task if it exists
+    await publish_task_event(user_id, "task.deleted", task_id)
     
-    return {"message": f"Task '{task_title}' deleted successfully"}
+    return negotiate(request, {"message": f"Task '{task_title}' deleted successfully"})
+
+def filter_tasks(query, status: Optional[str] = None, priority: Optional[str] = None,
+                 search: Optional[str] = None, tags: Optional[str] = None,
+                 deadline_before: Optional[str] = None, deadline_after: Optional[str] = None):
+    """Apply the list filters shared by list-tasks and count-tasks"""
+    if status:
+        # A comma-separated list matches any of the given statuses
+        statuses = status.split(",")
+        if len(statuses) == 1:
+            query = query.filter(Task.status == status)
+        else:
+            query = query.filter(Task.status.in_(statuses))
+    
+    if priority:
+        query = query.filter(Task.priority == priority)
+    
+    if search:
+        search_term = f"%{search}%"
+        query = query.filter(
+            or_(
+                Task.title.ilike(search_term),
+                Task.description.ilike(search_term)
+            )
+        )
+    
+    if tags:
+        tag_list = tags.split(",")
+        for tag in tag_list:
+            query = query.filter(Task.tags.like(f"%{tag}%"))
+    
+    # Parse datetime strings if provided
+    if deadline_before:
+        try:
+            deadline_before_dt = datetime.fromisoformat(deadline_before.replace('Z', '+00:00'))
+            query = query.filter(Task.deadline <= deadline_before_dt)
+        except ValueError:
+            pass
+    
+    if deadline_after:
+        try:
+            deadline_after_dt = datetime.fromisoformat(deadline_after.replace('Z', '+00:00'))
+            query = query.filter(Task.deadline >= deadline_after_dt)
+        except ValueError:
+            pass
+    
+    return query
+
+TASK_STATUSES = ("pending", "in_progress", "done")
+
+def smart_order(query, status: Optional[str], priority: Optional[str], descending: bool,
+                limit: Optional[int]) -> List[Task]:
+    """
+    Tasks by urgency_score, most urgent first unless `descending` is False.
+
+    With a limit, each status is read separately in the order of the
+    (user_id, status, urgency_score) index, which stops after `limit` rows,
+    and the per-status lists are merged; so the first page costs the same
+    whatever the number of tasks the user has. A priority filter also
+    bounds the scores scanned to those that priority can have.
+    """
+    statuses = status.split(",") if status else TASK_STATUSES
+    if priority in PRIORITY_RANK:
+        low, high = score_range(priority)
+        query = query.filter(Task.urgency_score.between(low, high))
+    key = Task.urgency_score.desc() if descending else Task.urgency_score.asc()
+    if not limit:
+        return query.filter(Task.status.in_(statuses)).order_by(key).all()
+    runs = [query.filter(Task.status == s).order_by(key).limit(limit).all() for s in statuses]
+    merged = heapq.merge(*runs, key=lambda task: task.urgency_score, reverse=descending)
+    return [task for task, _ in zip(merged, range(limit))]
 
 @router.get("/list-tasks", response_model=List[TaskResponse])
 async def list_tasks(
+    request: Request,
     status: Optional[str] = Query(None),
     priority: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
@@ -274,6 +360,7 @@ async def list_tasks(
     deadline_after: Optional[str] = Query(None),   # Changed from datetime to str
     sort_by: str = Query("created_at"),
     sort_order: str = Query("desc"),
+    limit: Optional[int] = Query(None, ge=1),
     db: Session = Depends(get_db),
     user_id: UUID = Depends(get_user_id)
 ):
@@ -284,79 +371,73 @@ async def list_tasks(
             joinedload(Task.recurring_pattern)
         ).filter(Task.user_id == user_id)
         
-        # Apply filters
-        if status:
-            query = query.filter(Task.status == status)
-        
-        if priority:
-            query = query.filter(Task.priority == priority)
-        
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                or_(
-                    Task.title.ilike(search_term),
-                    Task.description.ilike(search_term)
-                )
-            )
-        
-        if tags:
-            tag_list = tags.split(",")
-            for tag in tag_list:
-                query = query.filter(Task.tags.like(f"%{tag}%"))
-        
-        # Parse datetime strings if provided
-        if deadline_before:
-            try:
-                deadline_before_dt = datetime.fromisoformat(deadline_before.replace('Z', '+00:00'))
-                query = query.filter(Task.deadline <= deadline_before_dt)
-            except ValueError:
-                pass
-        
-        if deadline_after:
-            try:
-                deadline_after_dt = datetime.fromisoformat(deadline_after.replace('Z', '+00:00'))
-                query = query.filter(Task.deadline >= deadline_after_dt)
-            except ValueError:
-                pass
-        
-        # Apply sorting
-        if sort_order.lower() == "asc":
-            query = query.order_by(getattr(Task, sort_by).asc())
+        if sort_by == "smart":
+            # Urgency combines priority, deadline and estimated duration; status is filtered per run
+            query = filter_tasks(query, None, priority, search, tags, deadline_before, deadline_after)
+            tasks = smart_order(query, status, priority, sort_order.lower() != "asc", limit)
         else:
-            query = query.order_by(getattr(Task, sort_by).desc())
-        
-        # Execute query
-        tasks = query.all()
+            # Apply filters
+            query = filter_tasks(query, status, priority, search, tags, deadline_before, deadline_after)
+            
+            # Apply sorting; priorities by rank rather than alphabetically
+            column = case(PRIORITY_RANK, value=Task.priority) if sort_by == "priority" else getattr(Task, sort_by)
+            if sort_order.lower() == "asc":
+                query = query.order_by(column.asc())
+            else:
+                query = query.order_by(column.desc())
+            
+            if limit:
+                query = query.limit(limit)
+            
+            # Execute query
+            tasks = query.all()
         
         # Convert to response models
-        responses = []
-        for task in tasks:
-            responses.append(TaskResponse(
-                id=task.id,
-                user_id=task.user_id,
-                title=task.title,
-                description=task.description,
-                status=task.status,
-                priority=task.priority,
-                color_label=task.color_label,
-                estimated_duration=task.estimated_duration,
-                deadline=task.deadline,
-                reminder_enabled=task.reminder_enabled,
-                reminder_time=task.reminder_time,
-                tags=task.tags,  # Using JSONArray
-                is_recurring=task.is_recurring,
-                created_at=task.created_at,
-                updated_at=task.updated_at,
-                completed_at=task.completed_at,
-                recurring_pattern=task.recurring_pattern
-            ))
-        
-        return responses
+        with span("serialize"):
+            responses = []
+            for task in tasks:
+                responses.append(TaskResponse(
+                    id=task.id,
+                    user_id=task.user_id,
+                    title=task.title,
+                    description=task.description,
+                    status=task.status,
+                    priority=task.priority,
+                    color_label=task.color_label,
+                    estimated_duration=task.estimated_duration,
+                    deadline=task.deadline,
+                    reminder_enabled=task.reminder_enabled,
+                    reminder_time=task.reminder_time,
+                    tags=task.tags,  # Using JSONArray
+                    is_recurring=task.is_recurring,
+                    created_at=task.created_at,
+                    updated_at=task.updated_at,
+                    completed_at=task.completed_at,
+                    recurring_pattern=task.recurring_pattern
+                ))
+        
+        return negotiate(request, responses)
         
     except Exception as e:
-        print(f"Error in list_tasks: {str(e)}")
+        logger.error("Error in list_tasks: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+
+@router.get("/count-tasks")
+async def count_tasks(
+    request: Request,
+    status: Optional[str] = Query(None),
+    priority: Optional[str] = Query(None),
+    search: Optional[str] = Query(None),
+    tags: Optional[str] = Query(None),
+    deadline_before: Optional[str] = Query(None),
+    deadline_after: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    user_id: UUID = Depends(get_user_id)
+):
+    """Count tasks matching the list-tasks filters"""
+    query = db.query(func.count(Task.id)).filter(Task.user_id == user_id)
+    query = filter_tasks(query, status, priority, search, tags, deadline_before, deadline_after)
+    return negotiate(request, {"count": query.scalar()})
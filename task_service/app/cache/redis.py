@@ -2,10 +2,15 @@ import json
 import redis
 from typing import Any, Dict, List, Optional, Union
 from app.core.config import settings
+from shared.metrics import Counter
 
 # Redis client
 redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
 
+CACHE_LOOKUPS = Counter(
+    "task_cache_lookups_total", "Task cache lookups by kind and result", ["kind", "result"]
+)
+
 def get_cache_key(key_type: str, *args) -> str:
     """Generate a cache key with proper namespacing"""
     return f"task_service:{key_type}:{':'.join(str(arg) for arg in args)}"
@@ -47,10 +52,14 @@ async def cache_task_list(user_id: str, filters: Dict[str, Any], tasks_data: Dic
 async def get_cached_task(user_id: str, task_id: str) -> Optional[Dict[str, Any]]:
     """Get a cached task"""
     key = get_cache_key("tasks", user_id, "task", task_id)
-    return await get_from_cache(key)
+    data = await get_from_cache(key)
+    CACHE_LOOKUPS.labels("task", "hit" if data is not None else "miss").inc()
+    return data
 
 async def get_cached_task_list(user_id: str, filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Get a cached task list based on filters"""
     filter_str = json.dumps(filters, sort_keys=True)
     key = get_cache_key("tasks", user_id, "list", hash(filter_str))
-    return await get_from_cache(key)
+    data = await get_from_cache(key)
+    CACHE_LOOKUPS.labels("list", "hit" if data is not None else "miss").inc()
+    return data
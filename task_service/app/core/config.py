@@ -14,6 +14,16 @@ class Settings(BaseSettings):
     REDIS_TTL_TASKS: int = 3600  # 1 hour
     REDIS_TTL_TASK_LIST: int = 300  # 5 minutes
     
+    # Priority sweeper: escalates open tasks as their deadlines approach
+    PRIORITY_SERVICE_URL: str = "http://localhost:8002"
+    PRIORITY_SWEEP_INTERVAL: float = 60.0  # Seconds between sweeps, 0 disables the sweeper
+    PRIORITY_SWEEP_BATCH: int = 1000  # Tasks per /priority/batch call and bulk UPDATE
+    PRIORITY_SWEEP_LOOKBACK: float = 3600.0  # Seconds of deadlines re-checked at startup
+    
+    # Urgency refresher: keeps urgency_score, the sort_by=smart key, current as deadlines approach
+    URGENCY_REFRESH_INTERVAL: float = 300.0  # Seconds between refreshes, 0 disables the refresher
+    URGENCY_REFRESH_BATCH: int = 5000  # Rows per bulk UPDATE
+    
     # API settings
     DEFAULT_PAGE_SIZE: int = 20
     MAX_PAGE_SIZE: int = 100
@@ -0,0 +1,163 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import httpx
+from sqlalchemy import and_, case, or_
+from app.core.config import settings
+from app.core.urgency import PRIORITY_RANK, URGENCY_PRIORITY_STEP
+from app.db.database import SessionLocal
+from app.db.models import Task
+from shared.events import task_events
+from shared.log import get_logger
+from shared.metrics import Counter, Histogram
+from shared.shm import SHARED_STATE_SEGMENT, FileLock
+
+logger = get_logger("task_service.priority_sweeper")
+
+# How long before its deadline a task's priority-service bucket changes:
+# Low -> Medium a day before, Medium -> High at the deadline itself
+THRESHOLDS = (timedelta(days=1), timedelta(0))
+
+# The priority a task is raised to when it enters a priority-service bucket.
+# Tasks are only ever escalated; a priority the user set higher is kept.
+ESCALATIONS = {"Medium": "high", "High": "urgent"}
+PRIORITY_ORDER = ("low", "medium", "high", "urgent")
+
+# Same format, and local clock, as priority-service's calculate_priority
+DUE_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+PRIORITY_SWEEP_TASKS = Counter(
+    "priority_sweep_tasks_total", "Tasks the priority sweeper looked at, by outcome: unchanged or escalated",
+    ["outcome"],
+)
+PRIORITY_SWEEP_DURATION = Histogram(
+    "priority_sweep_duration_seconds", "Time taken by one priority sweep",
+)
+
+class PrioritySweeper:
+    """
+    Raises the priority of open tasks as their deadlines approach.
+
+    Every PRIORITY_SWEEP_INTERVAL seconds, the tasks whose deadline crossed
+    one of priority-service's thresholds since the last sweep are found with
+    two range scans on the deadline index, so a sweep reads only the tasks
+    that may have changed, whatever the size of the table. They are scored
+    by POST /priority/batch in batches of PRIORITY_SWEEP_BATCH, and the
+    escalations are written with one UPDATE per target priority.
+
+    If priority-service cannot be reached the window is kept and retried on
+    the next sweep. At startup the previous PRIORITY_SWEEP_LOOKBACK seconds
+    are swept again, which is harmless since escalations are idempotent.
+    With the multi-worker launcher only one worker sweeps.
+    """
+
+    def __init__(self):
+        self.swept_until: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._leader = FileLock(f"{SHARED_STATE_SEGMENT}-priority-sweeper") if SHARED_STATE_SEGMENT else None
+
+    def _load_crossings(self, since: datetime, until: datetime) -> List[Tuple]:
+        db = SessionLocal()
+        try:
+            windows = [
+                and_(Task.deadline > since + offset, Task.deadline <= until + offset)
+                for offset in THRESHOLDS
+            ]
+            return db.query(Task.id, Task.user_id, Task.priority, Task.deadline).filter(
+                or_(*windows),
+                Task.status != "done",
+                Task.priority != PRIORITY_ORDER[-1],
+            ).all()
+        finally:
+            db.close()
+
+    async def _score(self, deadlines: List[datetime]) -> List[str]:
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=settings.PRIORITY_SERVICE_URL, timeout=30)
+        # Deadlines are stored in UTC; priority-service compares against local time
+        due_dates = [d.replace(tzinfo=timezone.utc).astimezone().strftime(DUE_DATE_FORMAT) for d in deadlines]
+        response = await self._client.post("/priority/batch", json={"due_dates": due_dates})
+        response.raise_for_status()
+        return response.json()["priorities"]
+
+    def _apply(self, escalations: Dict[str, list], now: datetime) -> int:
+        db = SessionLocal()
+        try:
+            updated = 0
+            for priority, ids in escalations.items():
+                lower = PRIORITY_ORDER[:PRIORITY_ORDER.index(priority)]
+                # A bulk UPDATE skips the ORM hook that scores tasks: raise the score by the priority steps gained
+                gained = case(
+                    {old: URGENCY_PRIORITY_STEP * (PRIORITY_RANK[priority] - PRIORITY_RANK[old]) for old in lower},
+                    value=Task.priority,
+                )
+                # Re-checked in the UPDATE so an edit made since the read wins
+                updated += db.query(Task).filter(
+                    Task.id.in_(ids),
+                    Task.priority.in_(lower),
+                    Task.status != "done",
+                ).update({Task.priority: priority, Task.updated_at: now,
+                          Task.urgency_score: Task.urgency_score + gained}, synchronize_session=False)
+            db.commit()
+            return updated
+        finally:
+            db.close()
+
+    async def sweep(self, until: Optional[datetime] = None) -> int:
+        """Escalate tasks whose deadline crossed a threshold since the last sweep; returns how many"""
+        until = until or datetime.utcnow()
+        since = self.swept_until or until - timedelta(seconds=settings.PRIORITY_SWEEP_LOOKBACK)
+        started = time.perf_counter()
+        rows = await asyncio.to_thread(self._load_crossings, since, until)
+        escalated = 0
+        for start in range(0, len(rows), settings.PRIORITY_SWEEP_BATCH):
+            batch = rows[start:start + settings.PRIORITY_SWEEP_BATCH]
+            buckets = await self._score([deadline for _, _, _, deadline in batch])
+            escalations: Dict[str, list] = {}
+            changed = []
+            for (task_id, user_id, current, _), bucket in zip(batch, buckets):
+                target = ESCALATIONS.get(bucket)
+                if target and PRIORITY_ORDER.index(target) > PRIORITY_ORDER.index(current):
+                    escalations.setdefault(target, []).append(task_id)
+                    changed.append((user_id, task_id))
+            if escalations:
+                escalated += await asyncio.to_thread(self._apply, escalations, until)
+            for user_id, task_id in changed:
+                # No task body: clients refetch it, as after any update they did not make
+                if not task_events.local_only:
+                    await task_events.publish(user_id, "task.updated", task_id)
+        self.swept_until = until
+        PRIORITY_SWEEP_TASKS.labels("escalated").inc(escalated)
+        PRIORITY_SWEEP_TASKS.labels("unchanged").inc(len(rows) - escalated)
+        PRIORITY_SWEEP_DURATION.observe(time.perf_counter() - started)
+        return escalated
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.PRIORITY_SWEEP_INTERVAL)
+            if self._leader is not None and not self._leader.try_hold():
+                continue
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.warning("Priority sweep failed, retrying the same window next time: %s", e)
+
+    def start(self) -> None:
+        if settings.PRIORITY_SWEEP_INTERVAL > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+priority_sweeper = PrioritySweeper()
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+# urgency_score orders tasks for sort_by=smart, most urgent first. It adds:
+#  - URGENCY_PRIORITY_STEP per priority level above low;
+#  - up to URGENCY_DEADLINE_POINTS as the slack (time to the deadline less the
+#    estimated duration) shrinks from URGENCY_HORIZON to zero, so a medium task
+#    that must be started now ranks with a high one without a deadline;
+#  - up to URGENCY_OVERDUE_POINTS more once the slack is negative, reached
+#    URGENCY_OVERDUE_SPAN after it could no longer be finished on time.
+# A point of deadline score is about two minutes, so the score of a waiting
+# task drifts by a few points between refreshes.
+PRIORITY_RANK = {"low": 0, "medium": 1, "high": 2, "urgent": 3}
+URGENCY_PRIORITY_STEP = 10_000
+URGENCY_DEADLINE_POINTS = 10_000
+URGENCY_OVERDUE_POINTS = 5_000
+URGENCY_HORIZON = timedelta(days=14)
+URGENCY_OVERDUE_SPAN = timedelta(days=7)
+# Estimated durations count for at most this much, so the deadlines whose
+# score can still change are within a bounded range
+URGENCY_MAX_DURATION = timedelta(days=7)
+
+def urgency_score(priority: str, deadline: Optional[datetime], estimated_duration: Optional[int],
+                  now: datetime) -> int:
+    """The task's urgency at `now`, a naive UTC datetime like stored deadlines"""
+    score = URGENCY_PRIORITY_STEP * PRIORITY_RANK.get(priority, 1)
+    if deadline is None:
+        return score
+    if deadline.tzinfo is not None:
+        deadline = deadline.astimezone(timezone.utc).replace(tzinfo=None)
+    duration = min(estimated_duration or 0, URGENCY_MAX_DURATION.total_seconds())
+    slack = (deadline - now).total_seconds() - duration
+    if slack >= URGENCY_HORIZON.total_seconds():
+        return score
+    if slack >= 0:
+        return score + int(URGENCY_DEADLINE_POINTS * (1 - slack / URGENCY_HORIZON.total_seconds()))
+    overdue = min(-slack / URGENCY_OVERDUE_SPAN.total_seconds(), 1.0)
+    return score + URGENCY_DEADLINE_POINTS + int(URGENCY_OVERDUE_POINTS * overdue)
+
+def changing_deadlines(now: datetime):
+    """The deadlines whose urgency_score changes with time at `now`, as (after, before)"""
+    return now - URGENCY_OVERDUE_SPAN, now + URGENCY_HORIZON + URGENCY_MAX_DURATION
+
+def score_range(priority: str):
+    """The lowest and highest urgency_score a task of this priority can have"""
+    low = URGENCY_PRIORITY_STEP * PRIORITY_RANK[priority]
+    return low, low + URGENCY_DEADLINE_POINTS + URGENCY_OVERDUE_POINTS
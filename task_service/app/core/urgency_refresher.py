@@ -0,0 +1,139 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, bindparam, update
+from app.core.config import settings
+from app.core.urgency import changing_deadlines, urgency_score
+from app.db.database import SessionLocal
+from app.db.models import Task
+from shared.log import get_logger
+from shared.metrics import Counter, Histogram
+from shared.shm import SHARED_STATE_SEGMENT, FileLock
+
+logger = get_logger("task_service.urgency_refresher")
+
+URGENCY_REFRESH_TASKS = Counter(
+    "urgency_refresh_tasks_total", "Tasks the urgency refresher looked at, by outcome: unchanged or rescored",
+    ["outcome"],
+)
+URGENCY_REFRESH_DURATION = Histogram(
+    "urgency_refresh_duration_seconds", "Time taken by one urgency refresh",
+)
+
+_tasks = Task.__table__
+# Guarded by updated_at so a refresh never overwrites the score of a task edited since it was read,
+# and leaves updated_at as it was: a new score is not an edit
+_RESCORE = update(_tasks).where(
+    and_(_tasks.c.id == bindparam("_id"), _tasks.c.updated_at == bindparam("_updated_at"))
+).values(urgency_score=bindparam("_score"), updated_at=_tasks.c.updated_at)
+
+class UrgencyRefresher:
+    """
+    Keeps Task.urgency_score current as time passes.
+
+    Scores are computed on every insert and update, but the deadline part
+    of a score grows as the deadline approaches. Every
+    URGENCY_REFRESH_INTERVAL seconds the tasks whose score can still change
+    with time, those with a deadline between URGENCY_OVERDUE_SPAN ago and
+    URGENCY_HORIZON plus URGENCY_MAX_DURATION ahead, are read by a range
+    scan on the deadline index, rescored, and the changed ones written back
+    in batches of URGENCY_REFRESH_BATCH. Scores are therefore at most one
+    interval stale, a few points out of tens of thousands.
+
+    rescore_all() recomputes every task, after the column has been added to
+    an existing table. With the multi-worker launcher only one worker
+    refreshes.
+    """
+
+    def __init__(self):
+        self.refreshed_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._leader = FileLock(f"{SHARED_STATE_SEGMENT}-urgency-refresher") if SHARED_STATE_SEGMENT else None
+
+    def _load(self, since: Optional[datetime], until: Optional[datetime], after: str = "",
+              limit: Optional[int] = None) -> List[Tuple]:
+        db = SessionLocal()
+        try:
+            query = db.query(Task.id, Task.priority, Task.deadline, Task.estimated_duration,
+                             Task.urgency_score, Task.updated_at)
+            if since is not None:
+                query = query.filter(Task.deadline > since, Task.deadline <= until)
+            else:
+                # Everything, in pages by primary key
+                query = query.filter(Task.id > after).order_by(Task.id).limit(limit)
+            return query.all()
+        finally:
+            db.close()
+
+    def _rescore(self, rows: List[Tuple], now: datetime) -> int:
+        changed = []
+        for task_id, priority, deadline, duration, score, updated_at in rows:
+            new = urgency_score(priority, deadline, duration, now)
+            if new != score:
+                changed.append({"_id": task_id, "_updated_at": updated_at, "_score": new})
+        if not changed:
+            return 0
+        db = SessionLocal()
+        try:
+            for start in range(0, len(changed), settings.URGENCY_REFRESH_BATCH):
+                db.execute(_RESCORE, changed[start:start + settings.URGENCY_REFRESH_BATCH])
+                db.commit()
+            return len(changed)
+        finally:
+            db.close()
+
+    def _refresh(self, now: datetime) -> Tuple[int, int]:
+        # Deadlines that left the window since the last refresh get their final score too
+        last = self.refreshed_at or now - timedelta(seconds=settings.URGENCY_REFRESH_INTERVAL)
+        rows = self._load(changing_deadlines(last)[0], changing_deadlines(now)[1])
+        return len(rows), self._rescore(rows, now)
+
+    def _rescore_all(self, now: datetime) -> Tuple[int, int]:
+        seen = rescored = 0
+        after = ""
+        while True:
+            rows = self._load(None, None, after, settings.URGENCY_REFRESH_BATCH)
+            if not rows:
+                return seen, rescored
+            seen += len(rows)
+            rescored += self._rescore(rows, now)
+            after = str(rows[-1][0])
+
+    async def refresh(self, now: Optional[datetime] = None, full: bool = False) -> int:
+        """Rescore the tasks whose score may have changed since the last refresh; returns how many did"""
+        now = now or datetime.utcnow()
+        started = time.perf_counter()
+        seen, rescored = await asyncio.to_thread(self._rescore_all if full else self._refresh, now)
+        self.refreshed_at = now
+        URGENCY_REFRESH_TASKS.labels("rescored").inc(rescored)
+        URGENCY_REFRESH_TASKS.labels("unchanged").inc(seen - rescored)
+        URGENCY_REFRESH_DURATION.observe(time.perf_counter() - started)
+        return rescored
+
+    async def rescore_all(self) -> int:
+        return await self.refresh(full=True)
+
+    async def _loop(self) -> None:
+        while True:
+            if self._leader is None or self._leader.try_hold():
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    logger.warning("Urgency refresh failed, retrying next time: %s", e)
+            await asyncio.sleep(settings.URGENCY_REFRESH_INTERVAL)
+
+    def start(self) -> None:
+        if settings.URGENCY_REFRESH_INTERVAL > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+urgency_refresher = UrgencyRefresher()
@@ -1,13 +1,39 @@
-from sqlalchemy import create_engine
+import time
+from contextlib import nullcontext
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from shared.deadline import check_deadline, install_sqlite_deadlines
+from shared.metrics import instrument_engine
+from shared.shm import SHARED_STATE_SEGMENT, FileLock
+from shared.tracing import record_span
 
 # Create SQLAlchemy engine
 engine = create_engine(
     settings.DATABASE_URL, connect_args={"check_same_thread": False}  # Only needed for SQLite
 )
 
+instrument_engine(engine, "task_service")
+
+# Long queries are aborted once the request's X-Request-Deadline has passed
+install_sqlite_deadlines(engine)
+
+# Time every statement into the current request's trace as a "db" span
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record_span("db", time.perf_counter() - conn.info["query_started"].pop())
+
+@event.listens_for(engine, "handle_error")
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection else None
+    if started:
+        started.pop()
+
 # Create SessionLocal class for database sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -16,6 +42,8 @@ Base = declarative_base()
 
 # Dependency to get database session
 def get_db():
+    # Requests that queued past their deadline give up before touching the database
+    check_deadline()
     db = SessionLocal()
     try:
         yield db
@@ -24,4 +52,28 @@ def get_db():
 
 def init_db():
     Base.metadata.drop_all(bind=engine)  # Drop existing tables
-    Base.metadata.create_all(bind=engine)  # Create new tables
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)  # Create new tables
+
+# Columns added to existing tables since they were first created, with their DDL
+ADDED_COLUMNS = {
+    "tasks": {"urgency_score": "INTEGER NOT NULL DEFAULT 0"},
+}
+
+def migrate_db() -> list:
+    """Add new columns and indexes to existing tables; returns the "table.column"s added"""
+    added = []
+    # Workers started together by the multi-worker launcher migrate one at a time
+    lock = FileLock(f"{SHARED_STATE_SEGMENT}-migrate") if SHARED_STATE_SEGMENT else nullcontext()
+    with lock, engine.begin() as conn:
+        inspector = inspect(conn)
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for column, ddl in columns.items():
+                if column not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                    added.append(f"{table}.{column}")
+            for index in Base.metadata.tables[table].indexes:
+                index.create(conn, checkfirst=True)
+    return added
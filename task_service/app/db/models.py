@@ -4,11 +4,12 @@ from typing import List, Optional
 from sqlalchemy import (
     Boolean, Column, DateTime, Date, ForeignKey, 
     String, Time, Float, Text, CheckConstraint, 
-    Interval, JSON, and_, TypeDecorator, CHAR, Integer
+    Interval, JSON, and_, TypeDecorator, CHAR, Integer, Index, event
 )
 from sqlalchemy.ext.mutable import MutableList
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import expression
+from app.core.urgency import urgency_score
 from app.db.database import Base
 from sqlalchemy.types import TypeDecorator, TEXT
 import json
@@ -77,14 +78,25 @@ class Task(Base):
     
     is_recurring = Column(Boolean, nullable=False, default=False)
     
+    # Precomputed for sort_by=smart: set on every write, kept current by the urgency refresher
+    urgency_score = Column(Integer, nullable=False, default=0, server_default="0")
+    
     # Add relationship to RecurringTask
     recurring_pattern = relationship("RecurringTask", back_populates="task", uselist=False, cascade="all, delete-orphan")
     
     __table_args__ = (
         CheckConstraint("status IN ('pending', 'in_progress', 'done')", name="chk_status"),
         CheckConstraint("priority IN ('low', 'medium', 'high', 'urgent')", name="chk_priority"),
+        # Serves a user's tasks of one status already in smart order
+        Index("ix_tasks_user_status_urgency", "user_id", "status", "urgency_score"),
     )
 
+@event.listens_for(Task, "before_insert")
+@event.listens_for(Task, "before_update")
+def _set_urgency_score(mapper, connection, task):
+    task.urgency_score = urgency_score(task.priority or "medium", task.deadline, task.estimated_duration,
+                                       datetime.utcnow())
+
 class RecurringTask(Base):
     __tablename__ = "recurring_tasks"
     
@@ -13,7 +13,14 @@ load_dotenv()  # Add this line at the top
 from fastapi import FastAPI
 from app.api.routes import router as api_router
 from app.core.config import settings
-from app.db.database import engine, Base, init_db
+from app.core.priority_sweeper import priority_sweeper
+from app.core.urgency_refresher import urgency_refresher
+from app.db.database import engine, Base, init_db, migrate_db
+from shared.compression import CompressionMiddleware
+from shared.deadline import DeadlineMiddleware
+from shared.events import task_events
+from shared.metrics import install_metrics
+from shared.tracing import TracingMiddleware
 
 # Recreate database tables with new schema
 # init_db()
@@ -24,9 +31,40 @@ app = FastAPI(
     version="1.0.0",
 )
 
+# Trace IDs, Server-Timing headers and sampled access logs
+app.add_middleware(TracingMiddleware, service="task_service")
+
+# Honour the caller's X-Request-Deadline; the task service sets no budget of its own
+app.add_middleware(DeadlineMiddleware, service="task_service")
+
+# Compress responses according to Accept-Encoding (gzip, or zstd when available)
+app.add_middleware(CompressionMiddleware)
+
 # Include API router
 app.include_router(api_router)
 
+# Prometheus /metrics endpoint and per-route latency histograms
+install_metrics(app, service="task_service")
+
+@app.on_event("startup")
+async def startup_event():
+    if "tasks.urgency_score" in migrate_db():
+        # Existing rows were added with a score of 0
+        await urgency_refresher.rescore_all()
+    priority_sweeper.start()
+    urgency_refresher.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await priority_sweeper.stop()
+    await urgency_refresher.stop()
+    await task_events.stop()
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="localhost", port=8001, reload=True)
+    if len(sys.argv) > 1:
+        # Production: python main.py --workers 4 [--mode reuseport] ..., see shared/serve.py
+        from shared.serve import cli
+        cli("main:app", os.path.dirname(os.path.abspath(__file__)), 8001)
+    else:
+        uvicorn.run("main:app", host="localhost", port=8001, reload=True)
 
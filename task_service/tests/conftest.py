@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+TASK_SERVICE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, TASK_SERVICE)
+sys.path.insert(0, os.path.dirname(TASK_SERVICE))
+# Before app.core.config is imported, so the tests never touch a real database
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test_tasks.db')}"
+
+@pytest.fixture
+def db():
+    from app.db.database import Base, SessionLocal, engine
+    from app.db import models  # noqa: F401  Registers the tables
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
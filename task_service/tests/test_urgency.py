@@ -0,0 +1,117 @@
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.api.tasks import smart_order
+from app.core.priority_sweeper import PrioritySweeper
+from app.core.urgency import (
+    URGENCY_DEADLINE_POINTS, URGENCY_HORIZON, URGENCY_MAX_DURATION, URGENCY_OVERDUE_POINTS,
+    URGENCY_OVERDUE_SPAN, URGENCY_PRIORITY_STEP, urgency_score,
+)
+from app.db.models import Task
+
+NOW = datetime(2030, 6, 1, 12, 0, 0)
+MEDIUM = URGENCY_PRIORITY_STEP
+
+def score(deadline, duration=None, priority="medium"):
+    return urgency_score(priority, deadline, duration, NOW)
+
+def test_no_deadline_is_priority_only():
+    assert [score(None, priority=p) for p in ("low", "medium", "high", "urgent")] == [
+        0, URGENCY_PRIORITY_STEP, 2 * URGENCY_PRIORITY_STEP, 3 * URGENCY_PRIORITY_STEP]
+
+def test_horizon_boundary():
+    assert score(NOW + URGENCY_HORIZON) == MEDIUM
+    assert score(NOW + URGENCY_HORIZON + timedelta(days=30)) == MEDIUM
+    assert score(NOW + URGENCY_HORIZON - timedelta(hours=1)) > MEDIUM
+
+def test_zero_slack_has_every_deadline_point():
+    assert score(NOW) == MEDIUM + URGENCY_DEADLINE_POINTS
+    # The estimated duration eats into the slack
+    assert score(NOW + timedelta(hours=2), 2 * 3600) == MEDIUM + URGENCY_DEADLINE_POINTS
+    assert score(NOW + timedelta(hours=2), 3600) < MEDIUM + URGENCY_DEADLINE_POINTS
+
+def test_overdue_points_are_capped():
+    assert MEDIUM + URGENCY_DEADLINE_POINTS < score(NOW - timedelta(hours=1)) < (
+        MEDIUM + URGENCY_DEADLINE_POINTS + URGENCY_OVERDUE_POINTS)
+    capped = MEDIUM + URGENCY_DEADLINE_POINTS + URGENCY_OVERDUE_POINTS
+    assert score(NOW - URGENCY_OVERDUE_SPAN) == capped
+    assert score(NOW - URGENCY_OVERDUE_SPAN - timedelta(days=100)) == capped
+
+def test_duration_is_capped():
+    deadline = NOW + URGENCY_HORIZON
+    assert score(deadline, 30 * 86400) == score(deadline, int(URGENCY_MAX_DURATION.total_seconds()))
+
+def test_aware_deadline_is_read_as_utc():
+    aware = (NOW + timedelta(days=2)).replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=5)))
+    assert score(aware) == score(NOW + timedelta(days=2))
+
+def add_tasks(db, user_id, count, rng):
+    tasks = []
+    for i in range(count):
+        deadline = datetime.utcnow() + timedelta(hours=rng.randint(-400, 600)) if rng.random() < 0.8 else None
+        tasks.append(Task(
+            user_id=user_id, title=f"Task {i}",
+            status=rng.choice(("pending", "in_progress", "done")),
+            priority=rng.choice(("low", "medium", "high", "urgent")),
+            estimated_duration=rng.choice((None, 1800, 4 * 3600)),
+            deadline=deadline,
+        ))
+    db.add_all(tasks)
+    db.commit()
+    return tasks
+
+@pytest.mark.parametrize("status,priority,descending,limit", [
+    ("pending,in_progress", None, True, 15),
+    ("pending,in_progress", "high", True, 5),
+    ("pending,in_progress", None, False, 15),
+    (None, None, True, 40),
+    ("pending", None, True, None),
+])
+def test_smart_order_matches_python_sort(db, status, priority, descending, limit):
+    rng = random.Random(11)
+    user_id, other = uuid.uuid4(), uuid.uuid4()
+    tasks = add_tasks(db, user_id, 120, rng)
+    add_tasks(db, other, 30, rng)
+
+    query = db.query(Task).filter(Task.user_id == user_id)
+    if priority:
+        query = query.filter(Task.priority == priority)
+    got = smart_order(query, status, priority, descending, limit)
+
+    statuses = status.split(",") if status else ("pending", "in_progress", "done")
+    reference = sorted((t.urgency_score for t in tasks
+                        if t.status in statuses and (priority is None or t.priority == priority)),
+                       reverse=descending)
+    assert [t.urgency_score for t in got] == reference[:limit]
+    assert all(t.user_id == user_id and t.status in statuses for t in got)
+
+def test_sweeper_update_raises_score_like_the_orm_hook(db):
+    user_id = uuid.uuid4()
+    soon = datetime.utcnow() + timedelta(hours=6)
+    tasks = [
+        Task(user_id=user_id, title="low", priority="low", deadline=soon),
+        Task(user_id=user_id, title="medium", priority="medium", deadline=soon, estimated_duration=3600),
+        Task(user_id=user_id, title="urgent", priority="urgent", deadline=soon),
+        Task(user_id=user_id, title="done", priority="low", status="done", deadline=soon),
+    ]
+    db.add_all(tasks)
+    db.commit()
+    before = {t.id: (t.priority, t.urgency_score) for t in tasks}
+
+    updated = PrioritySweeper()._apply({"high": [t.id for t in tasks]}, datetime.utcnow())
+
+    assert updated == 2
+    db.expire_all()
+    after = {t.id: (t.priority, t.urgency_score) for t in db.query(Task).filter(Task.user_id == user_id)}
+    low, medium, urgent, done = tasks
+    assert after[low.id] == ("high", before[low.id][1] + 2 * URGENCY_PRIORITY_STEP)
+    assert after[medium.id] == ("high", before[medium.id][1] + URGENCY_PRIORITY_STEP)
+    assert after[urgent.id] == before[urgent.id]
+    assert after[done.id] == before[done.id]
+    # What the ORM hook would have stored for the new priority, give or take the seconds since
+    for task in (low, medium):
+        expected = urgency_score("high", task.deadline, task.estimated_duration, datetime.utcnow())
+        assert abs(after[task.id][1] - expected) <= 2